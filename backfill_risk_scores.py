@@ -0,0 +1,10 @@
+# backfill_risk_scores.py
+from riskapp.app import create_app
+from riskapp.models import backfill_risk_last_eval, backfill_risk_ps_histogram
+
+app = create_app()
+with app.app_context():
+    n = backfill_risk_last_eval()
+    print(f"Son değerlendirme kolonları güncellendi: {n} risk.")
+    h = backfill_risk_ps_histogram()
+    print(f"Konsensüs histogramı yeniden kuruldu: {h} satır.")
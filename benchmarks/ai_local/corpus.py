@@ -0,0 +1,116 @@
+# benchmarks/ai_local/corpus.py
+# -*- coding: utf-8 -*-
+"""
+Sentetik Türkçe risk korpusu (AI benchmark'ları için).
+
+Satırlar uygulamadaki fetch_corpus çıktısına benzer: risk açıklaması gibi
+kurulmuş bir metin + kanonik kategori etiketi. Kaynaklar:
+  - sentence_bank.CATEGORY_ALIASES : kategori ve o kategorinin anahtar kelimeleri
+  - sentence_bank.PHRASES          : anahtara bağlı öneri cümleleri
+  - engine.DEFAULT_PAPER_FACTS     : makale kuralları (label="paper_rule", bir kez)
+Aynı tohumla (seed) aynı korpus üretilir; böylece commit'ler arası sonuçlar
+karşılaştırılabilir.
+
+Kullanım:
+    python benchmarks/ai_local/corpus.py --n 10000 --out /tmp/corpus.jsonl
+    python benchmarks/ai_local/corpus.py --n 5 --queries 5      # örnekleri yazdır
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import sys
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from riskapp.ai_local.sentence_bank import CATEGORY_ALIASES, PHRASES  # noqa: E402
+from riskapp.ai_local.engine import DEFAULT_PAPER_FACTS  # noqa: E402
+
+PROJECTS = [
+    "Liman genişletme", "Rıhtım rehabilitasyonu", "Viyadük", "Metro tüneli", "Arıtma tesisi",
+    "Hastane kampüsü", "Konut sitesi", "Enerji nakil hattı", "Dolgu alanı", "Mendirek",
+]
+PHASES = ["mobilizasyon", "kazı", "temel", "kazık imalatı", "üstyapı", "montaj", "devreye alma", "kabul"]
+EFFECTS = [
+    "iş programında gecikme", "maliyet artışı", "kalite uygunsuzluğu", "iş kazası",
+    "sözleşme uyuşmazlığı", "çevresel ceza", "yeniden imalat (rework)", "hakediş kesintisi",
+]
+TEMPLATES = [
+    "{proj} projesinde {phase} aşamasında {a1} kaynaklı risk; {effect} olasılığı yüksek. {phrase}",
+    "{a1} ve {a2} konularında yetersiz planlama {effect} doğurabilir ({proj}, {phase}). {phrase}",
+    "{phase} sırasında {a1} ile ilgili uygunsuzluk tespit edildi; {effect} beklenir. {phrase}",
+    "{proj}: {a1}/{a2} arayüzünde koordinasyon eksikliği, {effect} riski. {phrase}",
+    "{a1} kaynaklı {effect} riski — {proj} {phase} paketinde ölçülmeli. {phrase}",
+]
+QUERY_TEMPLATES = [
+    "{a1} riski nasıl azaltılır",
+    "{a1} ve {a2} kaynaklı {effect}",
+    "{phase} aşamasında {a1} sorunu",
+    "{proj} {a1} önlem önerisi",
+]
+
+_CATS = list(CATEGORY_ALIASES)
+# Alias'ların PHRASES'te karşılığı yoksa cümle tüm havuzdan seçilir
+_ALL_PHRASES = [p for arr in PHRASES.values() for p in arr]
+
+
+def _phrase_for(aliases: List[str], rnd: random.Random) -> str:
+    pool = [p for a in aliases for p in PHRASES.get(a, [])]
+    return rnd.choice(pool or _ALL_PHRASES)
+
+
+def _fill(template: str, cat: str, rnd: random.Random) -> str:
+    keys = CATEGORY_ALIASES[cat]
+    a1, a2 = rnd.sample(keys, 2) if len(keys) > 1 else (keys[0], keys[0])
+    return template.format(
+        proj=rnd.choice(PROJECTS), phase=rnd.choice(PHASES), effect=rnd.choice(EFFECTS),
+        a1=a1, a2=a2, phrase=_phrase_for([a1, a2], rnd),
+    )
+
+
+def generate(n: int, seed: int = 0, paper_facts: bool = True) -> List[Dict[str, Any]]:
+    """n satır {id, text, label}; paper_facts=True ise DEFAULT_PAPER_FACTS de eklenir."""
+    if n >= 900_000:
+        raise ValueError("n < 900000 olmalı (DEFAULT_PAPER_FACTS id aralığı)")
+    rnd = random.Random(seed)
+    rows: List[Dict[str, Any]] = []
+    for i in range(1, n + 1):
+        cat = rnd.choice(_CATS)
+        text = _fill(rnd.choice(TEMPLATES), cat, rnd)
+        rows.append({"id": i, "text": f"{text} (R-{i:06d})", "label": cat})
+    if paper_facts:
+        rows.extend(dict(f) for f in DEFAULT_PAPER_FACTS)
+    return rows
+
+
+def queries(n: int, seed: int = 1) -> List[str]:
+    """Kısa, kullanıcı sorusu benzeri sorgular (korpustan farklı kalıplarla)."""
+    rnd = random.Random(seed)
+    return [_fill(rnd.choice(QUERY_TEMPLATES), rnd.choice(_CATS), rnd) for _ in range(n)]
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--n", type=int, default=1000)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--queries", type=int, default=0, help="ayrıca bu kadar sorgu yazdır")
+    ap.add_argument("--out", help="JSONL çıktı (yoksa stdout)")
+    args = ap.parse_args()
+
+    rows = generate(args.n, args.seed)
+    out = open(args.out, "w", encoding="utf-8") if args.out else sys.stdout
+    try:
+        for r in rows:
+            out.write(json.dumps(r, ensure_ascii=False) + "\n")
+    finally:
+        if args.out:
+            out.close()
+    for q in queries(args.queries, args.seed + 1):
+        print(f"# sorgu: {q}")
+
+
+if __name__ == "__main__":
+    main()
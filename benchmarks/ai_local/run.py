@@ -0,0 +1,319 @@
+# benchmarks/ai_local/run.py
+# -*- coding: utf-8 -*-
+"""
+AI alt sistemi benchmark paketi (riskapp.ai_local).
+
+Her (arka uç, boyut) çifti ayrı bir alt süreçte ölçülür; böylece tepe RSS
+(ru_maxrss) yalnızca o çalıştırmaya aittir. Ölçülenler:
+  - build_seconds     : AILocal.build_from_tables (kodlama + indeks + BM25)
+  - save_seconds      : Storage.save_index (yeni sürüm yayını)
+  - load_seconds      : Storage.load_index + load_lexical
+  - search_ms         : AILocal.search p50/p95/p99 (hibrit, sorgu önbelleği kapalı)
+  - vector_search_ms  : EmbIndex.search p50/p95/p99 (önceden kodlanmış sorgu)
+  - answer_ms         : AILocal.answer p50/p95
+  - recall@k          : vektör aşamasının kaba kuvvet (tam iç çarpım) top-k'ya göre isabeti
+  - peak_rss_mb       : alt sürecin tepe RSS'i (import sonrası taban ayrıca yazılır)
+
+Arka uçlar:
+  tfidf          : TF-IDF, seyrek (CSR) tam arama
+  numpy          : yoğun float32, NumPy tam arama (eski sklearn NearestNeighbors'ın yerini aldı)
+  numpy-float16  : AI_QUANT=float16 + float32 yeniden sıralama
+  numpy-int8     : AI_QUANT=int8 + float32 yeniden sıralama
+  faiss          : USE_FAISS=1 (faiss yüklü değilse "skipped")
+Yoğun arka uçlar sentence-transformers varsa MiniLM'i, yoksa TF-IDF + TruncatedSVD
+vekilini (LsaEncoder) kullanır; kullanılan encoder sonuçta "encoder" alanındadır.
+
+Sonuçlar JSON'a yazılır; iki dosya --compare ile karşılaştırılır:
+    python benchmarks/ai_local/run.py                                   # 1k, 10k, 100k
+    python benchmarks/ai_local/run.py --sizes 1000 10000 --backends tfidf numpy-int8 --out a.json
+    python benchmarks/ai_local/run.py --compare eski.json yeni.json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(os.path.dirname(HERE))
+sys.path.insert(0, ROOT)
+
+BACKENDS = ["tfidf", "numpy", "numpy-float16", "numpy-int8", "faiss"]
+QUANT = {"numpy-float16": "float16", "numpy-int8": "int8"}
+
+
+# -------------------------------
+#  Yoğun encoder vekili
+# -------------------------------
+class LsaEncoder:
+    """SBERT yoksa yoğun arka uçlar için: TF-IDF + TruncatedSVD (ilk encode çağrısında fit)."""
+    backend = "lsa"
+
+    def __init__(self, dim: int = 256, seed: int = 0):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        self.model_name = f"lsa-{dim}"
+        self._dim = dim
+        self._seed = seed
+        self.tfidf = TfidfVectorizer(lowercase=True, ngram_range=(1, 2), max_features=50_000)
+        self.svd = None
+
+    def dim(self) -> int:
+        return self._dim
+
+    def fit_tfidf(self, corpus: List[str]) -> None:
+        return None
+
+    def tfidf_state(self) -> None:
+        return None
+
+    def encode(self, texts: List[str], sparse: bool = False, batch_size: Optional[int] = None) -> np.ndarray:
+        if self.svd is None:
+            from sklearn.decomposition import TruncatedSVD
+            Xt = self.tfidf.fit_transform(texts)
+            self.svd = TruncatedSVD(n_components=min(self._dim, Xt.shape[1] - 1), random_state=self._seed)
+            return self.svd.fit_transform(Xt).astype(np.float32)
+        return self.svd.transform(self.tfidf.transform(texts)).astype(np.float32)
+
+
+def _make_encoder(backend: str):
+    from riskapp.ai_local import engine
+    if backend == "tfidf":
+        return engine.LocalEncoder(backend="tfidf")
+    if engine.SentenceTransformer is not None:
+        enc = engine.LocalEncoder()
+        if enc.backend != "tfidf":
+            return enc
+    return LsaEncoder()
+
+
+# -------------------------------
+#  Ölçüm (alt süreç)
+# -------------------------------
+def _pct(ms: List[float], qs=(50, 95, 99)) -> Dict[str, float]:
+    arr = np.asarray(ms, dtype=np.float64)
+    return {f"p{q}": round(float(np.percentile(arr, q)), 3) for q in qs}
+
+
+def _rss_mb() -> float:
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1)  # Linux: KB
+
+
+def _brute_force(idx, Q, k: int) -> List[List[int]]:
+    """Normlanmış tüm satırlarla tam iç çarpım (dilimli) -> top-k id listeleri."""
+    from riskapp.ai_local import engine
+    import scipy.sparse as sp
+    Qn = engine._l2_normalize_sparse(Q) if sp.issparse(Q) else engine._l2_normalize(np.asarray(Q, np.float32))
+    X = idx._X
+    ids = np.asarray(idx.ids)
+    best_s = np.full((Q.shape[0], 0), -np.inf, dtype=np.float32)
+    best_i = np.empty((Q.shape[0], 0), dtype=np.int64)
+    for a in range(0, X.shape[0], 65536):
+        S = Qn @ X[a:a + 65536].T
+        S = S.toarray() if sp.issparse(S) else np.asarray(S)
+        S = np.asarray(S, dtype=np.float32)
+        best_s = np.hstack([best_s, S])
+        best_i = np.hstack([best_i, np.broadcast_to(np.arange(a, a + S.shape[1]), S.shape)])
+        if best_s.shape[1] > k:
+            part = np.argpartition(-best_s, k - 1, axis=1)[:, :k]
+            best_s = np.take_along_axis(best_s, part, 1)
+            best_i = np.take_along_axis(best_i, part, 1)
+    order = np.argsort(-best_s, axis=1)
+    return [[int(ids[j]) for j in row] for row in np.take_along_axis(best_i, order, 1)]
+
+
+def measure(backend: str, n: int, nq: int, ks: List[int], seed: int) -> Dict[str, Any]:
+    os.environ["AI_EMB_CACHE"] = "0"  # kodlama süresi ölçülür, önbellek değil
+    os.environ["USE_FAISS"] = "1" if backend == "faiss" else "0"
+    import corpus
+    from riskapp.ai_local import engine
+    from riskapp.ai_local.storage import Storage
+
+    res: Dict[str, Any] = {"backend": backend, "n": n, "queries": nq}
+    if backend == "faiss" and engine.faiss is None:
+        res["skipped"] = "faiss yüklü değil"
+        return res
+    engine.QUANT_MODE = QUANT.get(backend, "")
+    base_rss = _rss_mb()
+
+    rows = corpus.generate(n, seed)
+    qs = corpus.queries(nq, seed + 1)
+    enc = _make_encoder(backend)
+    res["encoder"] = enc.backend
+    res["rows"] = len(rows)
+
+    ai = engine.AILocal(enc, None, {})
+    t0 = time.perf_counter()
+    ai.build_from_tables(rows, include_paper_facts=False, include_sentence_bank=False)
+    res["build_seconds"] = round(time.perf_counter() - t0, 3)
+
+    tmp = tempfile.mkdtemp(prefix="ai_bench_")
+    try:
+        st = Storage(tmp)
+        t0 = time.perf_counter()
+        st.save_index(ai.idx, ai.meta, encoder=enc)
+        res["save_seconds"] = round(time.perf_counter() - t0, 3)
+        del ai
+
+        t0 = time.perf_counter()
+        st = Storage(tmp)
+        idx, meta = st.load_index()
+        lex = st.load_lexical(idx)
+        res["load_seconds"] = round(time.perf_counter() - t0, 3)
+        res["index_backend"] = idx.backend
+
+        eng = engine.AILocal(enc, idx, meta, lex)
+        eng.cache = engine.SearchCache(size=0)
+        k = max(ks)
+        eng.search(qs[0], k=k)  # ısınma
+
+        lat = []
+        for q in qs:
+            t0 = time.perf_counter()
+            eng.search(q, k=k)
+            lat.append((time.perf_counter() - t0) * 1e3)
+        res["search_ms"] = _pct(lat)
+
+        Q = enc.encode(qs, sparse=idx.sparse)
+        lat = []
+        for i in range(nq):
+            t0 = time.perf_counter()
+            idx.search(Q[i], k=k)
+            lat.append((time.perf_counter() - t0) * 1e3)
+        res["vector_search_ms"] = _pct(lat)
+
+        lat = []
+        for q in qs[:min(nq, 50)]:
+            t0 = time.perf_counter()
+            eng.answer(q, k=5)
+            lat.append((time.perf_counter() - t0) * 1e3)
+        res["answer_ms"] = _pct(lat, (50, 95))
+
+        got = idx.search_many(Q, k=k)
+        ref = _brute_force(idx, Q, k)
+        for kk in ks:
+            hit = [len({h[0] for h in got[i][:kk]} & set(ref[i][:kk])) / kk for i in range(nq)]
+            res[f"recall@{kk}"] = round(float(np.mean(hit)), 4)
+        del eng, idx, meta, lex
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    res["base_rss_mb"] = base_rss
+    res["peak_rss_mb"] = _rss_mb()
+    return res
+
+
+# -------------------------------
+#  Yönetici süreç
+# -------------------------------
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def _run_child(backend: str, n: int, args) -> Dict[str, Any]:
+    cmd = [sys.executable, os.path.abspath(__file__), "--worker", backend, str(n),
+           "--queries", str(args.queries), "--seed", str(args.seed), "--k", *map(str, args.k)]
+    proc = subprocess.run(cmd, capture_output=True, text=True, cwd=HERE)
+    if proc.returncode != 0:
+        return {"backend": backend, "n": n, "error": proc.stderr.strip().splitlines()[-1:] or ["?"]}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def _print_row(r: Dict[str, Any]) -> None:
+    if "skipped" in r or "error" in r:
+        print(f"{r['backend']:<14} {r['n']:>7,}  {r.get('skipped') or r.get('error')}")
+        return
+    rec = " ".join(f"r@{k.split('@')[1]}={v:.3f}" for k, v in r.items() if k.startswith("recall@"))
+    print(f"{r['backend']:<14} {r['n']:>7,}  build {r['build_seconds']:7.2f}s  save {r['save_seconds']:6.2f}s  "
+          f"load {r['load_seconds']:6.2f}s  search p50/p99 {r['search_ms']['p50']:7.2f}/{r['search_ms']['p99']:7.2f}ms  "
+          f"answer p50 {r['answer_ms']['p50']:7.2f}ms  {rec}  rss {r['peak_rss_mb']:.0f}MB")
+
+
+def _flatten(r: Dict[str, Any]) -> Dict[str, float]:
+    out: Dict[str, float] = {}
+    for key, v in r.items():
+        if isinstance(v, dict):
+            out.update({f"{key}.{kk}": vv for kk, vv in v.items()})
+        elif isinstance(v, (int, float)) and key not in ("n", "queries", "rows"):
+            out[key] = v
+    return out
+
+
+def compare(old_path: str, new_path: str) -> None:
+    """İki sonuç dosyasında aynı (arka uç, n) için metrik oranları (yeni / eski)."""
+    with open(old_path, encoding="utf-8") as f:
+        old = {(r["backend"], r["n"]): r for r in json.load(f)["results"]}
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)["results"]
+    for r in new:
+        o = old.get((r["backend"], r["n"]))
+        if o is None or "skipped" in r or "error" in r or "skipped" in o or "error" in o:
+            continue
+        a, b = _flatten(o), _flatten(r)
+        print(f"\n{r['backend']} n={r['n']:,}")
+        for key in sorted(set(a) & set(b)):
+            ratio = b[key] / a[key] if a[key] else float("nan")
+            flag = ""
+            if not key.startswith("recall") and ratio > 1.2:
+                flag = "  << yavaşladı"
+            elif key.startswith("recall") and b[key] < a[key] - 0.01:
+                flag = "  << isabet düştü"
+            print(f"  {key:<26} {a[key]:>10} -> {b[key]:>10}  ({ratio:5.2f}x){flag}")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    ap.add_argument("--backends", nargs="+", default=BACKENDS, choices=BACKENDS)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int, nargs="+", default=[1, 5, 10])
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", default="ai_local_bench.json")
+    ap.add_argument("--compare", nargs=2, metavar=("ESKI", "YENI"))
+    ap.add_argument("--worker", nargs=2, metavar=("BACKEND", "N"), help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    if args.worker:
+        print(json.dumps(measure(args.worker[0], int(args.worker[1]), args.queries, args.k, args.seed)))
+        return
+
+    results = []
+    for n in args.sizes:
+        for backend in args.backends:
+            r = _run_child(backend, n, args)
+            _print_row(r)
+            results.append(r)
+
+    report = {
+        "commit": _git_commit(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "args": {"sizes": args.sizes, "queries": args.queries, "k": args.k, "seed": args.seed},
+        "results": results,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nSonuçlar: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
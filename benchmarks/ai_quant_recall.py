@@ -0,0 +1,114 @@
+# benchmarks/ai_quant_recall.py
+# -*- coding: utf-8 -*-
+"""
+Sıkıştırılmış (float16 / int8) AI indeksi için recall@k raporu.
+
+float32 tam arama referans alınır; her mod için Storage ile geçici bir dizine
+yazılıp mmap ile geri yüklenen indekste arama yapılır. Raporlanan:
+  - recall@k              : float32 top-k ile kesişim / k
+  - taranan matris (MB)   : aday taramasında okunan sayfalar (RSS'e giren kısım)
+  - sorgu süresi (ms)     : tek sorgu ortalaması
+Yeniden sıralama çarpanı (k × R) için birden çok değer verilebilir; R=1
+sıkıştırılmış skorların kendi sıralamasına yakındır.
+
+Vektörler varsayılan olarak MiniLM benzeri sentetik kümelerdir (384 boyut);
+--vectors ile gerçek bir vectors.npy (L2-normlu, float32) verilebilir.
+
+Kullanım:
+    python benchmarks/ai_quant_recall.py
+    python benchmarks/ai_quant_recall.py --sizes 10000 100000 --k 5 10 --rerank 1 4
+    python benchmarks/ai_quant_recall.py --vectors ai_data/vectors.npy
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from riskapp.ai_local import engine  # noqa: E402
+from riskapp.ai_local.storage import Storage  # noqa: E402
+
+
+def synthetic(n: int, dim: int, seed: int = 0) -> np.ndarray:
+    """Kümelenmiş, normlanmış float32 vektörler (cümle embedding'lerine benzer dağılım)."""
+    rng = np.random.default_rng(seed)
+    n_clusters = max(8, n // 200)
+    centers = rng.standard_normal((n_clusters, dim)).astype(np.float32)
+    X = centers[rng.integers(0, n_clusters, n)] + 0.8 * rng.standard_normal((n, dim)).astype(np.float32)
+    return engine._l2_normalize(X).astype(np.float32)
+
+
+def queries_from(X: np.ndarray, nq: int, seed: int = 1) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    base = X[rng.integers(0, X.shape[0], nq)]
+    return engine._l2_normalize(base + 0.3 * rng.standard_normal(base.shape).astype(np.float32))
+
+
+def build(X: np.ndarray, quant: str, data_dir: str):
+    ids = list(range(X.shape[0]))
+    rows = [{"text": "", "label": ""} for _ in ids]
+    st = Storage(data_dir)
+    st._write_v2(X, ids, rows, quant=quant)
+    idx, _ = st.load_index()
+    return idx
+
+
+def run(X: np.ndarray, ks, reranks, nq: int) -> None:
+    Q = queries_from(X, nq)
+    k_max = max(ks)
+    exact = engine._l2_normalize(Q) @ X.T
+    ref = np.argsort(-exact, axis=1)[:, :k_max]
+
+    print(f"\nN={X.shape[0]:,}  dim={X.shape[1]}  sorgu={nq}")
+    print(f"{'mod':<8} {'R':>3} {'MB':>8} " + " ".join(f"{'recall@' + str(k):>10}" for k in ks) + f" {'ms/sorgu':>9}")
+    tmp = tempfile.mkdtemp(prefix="ai_quant_")
+    try:
+        for quant in ("", "float16", "int8"):
+            d = os.path.join(tmp, quant or "float32")
+            idx = build(X, quant, d)
+            scanned = idx._Xq if idx._Xq is not None else idx._X
+            mb = scanned.nbytes / 1e6
+            for r in (reranks if quant else [0]):
+                engine.RERANK_FACTOR = max(r, 1)
+                recalls = []
+                res = idx.search_many(Q, k=k_max)
+                for k in ks:
+                    hit = [len({h[0] for h in res[i][:k]} & set(ref[i, :k].tolist())) / k for i in range(nq)]
+                    recalls.append(float(np.mean(hit)))
+                t0 = time.perf_counter()
+                for i in range(min(nq, 50)):
+                    idx.search(Q[i], k=k_max)
+                ms = (time.perf_counter() - t0) / min(nq, 50) * 1e3
+                print(f"{quant or 'float32':<8} {r if quant else '-':>3} {mb:8.1f} "
+                      + " ".join(f"{v:10.4f}" for v in recalls) + f" {ms:9.2f}")
+            del idx
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--k", type=int, nargs="+", default=[1, 5, 10])
+    ap.add_argument("--rerank", type=int, nargs="+", default=[1, 4])
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--vectors", help="gerçek vectors.npy (varsa --sizes yok sayılır)")
+    args = ap.parse_args()
+
+    if args.vectors:
+        run(np.load(args.vectors).astype(np.float32), args.k, args.rerank, args.queries)
+        return
+    for n in args.sizes:
+        run(synthetic(n, args.dim), args.k, args.rerank, args.queries)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# benchmarks/keyword_match_bench.py
+# -*- coding: utf-8 -*-
+"""
+KEYSETS eşleşmesi karşılaştırması: eski döngü (her küme için metni yeniden
+normalize edip her kelimeyi `k in text` ile arar) vs derlenmiş KeywordMatcher
+(tek normalize + tek regex geçişi).
+
+Metinler sentetik risk korpusundan (benchmarks/ai_local/corpus.py) istenen
+uzunluğa kadar birleştirilir; her uzunlukta iki yolun aynı anahtarları
+döndürdüğü doğrulanır.
+
+Kullanım:
+    python benchmarks/keyword_match_bench.py
+    python benchmarks/keyword_match_bench.py --lengths 200 5000 --texts 100 --repeat 5
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from typing import Callable, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "ai_local"))
+
+from corpus import generate  # noqa: E402
+from riskapp.ai_local.commenter import KEYSETS, KEY_MATCHER, _normalize  # noqa: E402
+
+# Eski döngü kelimeleri ham haliyle arıyordu; sonuç karşılaştırması için normalize edilir
+_LEGACY_KEYSETS = {k: [_normalize(w) for w in kw] for k, kw in KEYSETS.items()}
+
+
+def _legacy_match_keys(text: str) -> List[str]:
+    hits = []
+    for key, kw in _LEGACY_KEYSETS.items():
+        t = _normalize(text)
+        if any(k in t for k in kw):
+            hits.append(key)
+    return hits
+
+
+def _texts(n: int, length: int) -> List[str]:
+    rows = generate(n * max(length // 80, 1), seed=length, paper_facts=False)
+    out, buf = [], ""
+    for r in rows:
+        buf = f"{buf} {r['text']}" if buf else r["text"]
+        if len(buf) >= length:
+            out.append(buf[:length])
+            buf = ""
+            if len(out) == n:
+                break
+    return out
+
+
+def _measure(fn: Callable[[str], List[str]], texts: List[str], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for t in texts:
+            fn(t)
+        best = min(best, time.perf_counter() - t0)
+    return best / len(texts)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--lengths", type=int, nargs="+", default=[80, 500, 2000, 10_000])
+    ap.add_argument("--texts", type=int, default=200)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    print(f"{len(KEYSETS)} anahtar kümesi, {len(KEY_MATCHER)} normalize kelime")
+    print(f"{'uzunluk':>8} | {'eski (µs)':>10} | {'derlenmiş (µs)':>14} | {'hızlanma':>8}")
+    print("-" * 50)
+    for length in args.lengths:
+        texts = _texts(args.texts, length)
+        for t in texts:
+            if _legacy_match_keys(t) != KEY_MATCHER.match(t):
+                print(f"  ! {length}: eşleşmeler farklı: {t[:60]}...")
+                break
+        old = _measure(_legacy_match_keys, texts, args.repeat)
+        new = _measure(KEY_MATCHER.match, texts, args.repeat)
+        print(f"{length:>8} | {old * 1e6:>10.1f} | {new * 1e6:>14.1f} | {old / new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# benchmarks/ps_fit_bench.py
+# -*- coding: utf-8 -*-
+"""
+PSEstimator.fit karşılaştırması: eski satır-satır Python ortalaması vs
+SQL GROUP BY toplamları (ORM ve raw SQL fallback).
+
+Geçici bir SQLite dosyasına sentetik risk/değerlendirme yazar, her yol için
+süre ve tepe Python belleğini (tracemalloc) ölçer, sonuçların aynı olduğunu
+doğrular.
+
+Kullanım:
+    python benchmarks/ps_fit_bench.py                 # 10k, 100k, 1M
+    python benchmarks/ps_fit_bench.py --sizes 10000 50000 --repeat 5
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+
+from riskapp.models import db, Risk, Evaluation  # noqa: E402
+from riskapp.ai_local.ps_estimator import (  # noqa: E402
+    PSEstimator, _aggregate_orm, _aggregate_raw,
+)
+
+CATEGORIES = [
+    "Tedarik", "Hava Koşulları", "Legal / Regülasyon", "İSG", "Finansal",
+    "Tasarım", "Saha Lojistiği", "İzin Süreçleri", "Kalite", "Çevre",
+]
+N_RISKS = 2000
+
+
+def _legacy_fit(est: PSEstimator, session) -> None:
+    """Eski fit: tüm satırları çekip Python listelerinde ortalama."""
+    rows = (
+        session.query(Risk.category, Evaluation.probability, Evaluation.severity)
+        .join(Evaluation, Evaluation.risk_id == Risk.id)
+        .filter(Evaluation.probability.isnot(None))
+        .filter(Evaluation.severity.isnot(None))
+        .all()
+    )
+    p_all, s_all = [], []
+    by_cat_p, by_cat_s = defaultdict(list), defaultdict(list)
+    for cat, p, s in rows:
+        p_all.append(float(p))
+        s_all.append(float(s))
+        if cat:
+            by_cat_p[str(cat)].append(float(p))
+            by_cat_s[str(cat)].append(float(s))
+    g_p = round(sum(p_all) / len(p_all), est.round_to) if p_all else 3.0
+    g_s = round(sum(s_all) / len(s_all), est.round_to) if s_all else 3.0
+    est.global_p, est.global_s = g_p, g_s
+    est.cat_p = {c: round(est._bayes_blend(sum(v) / len(v), len(v), g_p), est.round_to)
+                 for c, v in by_cat_p.items()}
+    est.cat_s = {c: round(est._bayes_blend(sum(v) / len(v), len(v), g_s), est.round_to)
+                 for c, v in by_cat_s.items()}
+
+
+def _grouped_fit(est: PSEstimator, session, aggregate) -> None:
+    est._reset_sums()
+    for cat, n, sp, ss in aggregate(session):
+        est._add_group(cat, n, sp, ss)
+    est._recompute()
+
+
+def _populate(n_evals: int) -> None:
+    rnd = random.Random(42)
+    db.session.execute(Evaluation.__table__.delete())
+    db.session.execute(Risk.__table__.delete())
+    db.session.execute(Risk.__table__.insert(), [
+        {"id": i + 1, "title": f"Risk {i + 1}", "category": rnd.choice(CATEGORIES)}
+        for i in range(N_RISKS)
+    ])
+    batch = 50_000
+    for start in range(0, n_evals, batch):
+        db.session.execute(Evaluation.__table__.insert(), [
+            {"risk_id": rnd.randint(1, N_RISKS), "evaluator": "bench",
+             "probability": rnd.randint(1, 5), "severity": rnd.randint(1, 5)}
+            for _ in range(start, min(n_evals, start + batch))
+        ])
+    db.session.commit()
+
+
+def _measure(fn, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="ps_fit_bench_")
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        print(f"{'evals':>9} | {'yol':<12} | {'süre (ms)':>10} | {'tepe bellek (KB)':>16}")
+        print("-" * 58)
+        for n in args.sizes:
+            _populate(n)
+            results = {}
+            paths = {
+                "legacy-rows": lambda e: _legacy_fit(e, db.session),
+                "groupby-orm": lambda e: _grouped_fit(e, db.session, _aggregate_orm),
+                "groupby-raw": lambda e: _grouped_fit(e, db.session, _aggregate_raw),
+            }
+            for name, run in paths.items():
+                est = PSEstimator(alpha=5.0)
+                secs, peak = _measure(lambda: run(est), args.repeat)
+                results[name] = (est.global_p, est.global_s, est.cat_p, est.cat_s)
+                print(f"{n:>9} | {name:<12} | {secs * 1000:>10.1f} | {peak / 1024:>16.1f}")
+            ref = results["legacy-rows"]
+            for name, res in results.items():
+                if res != ref:
+                    print(f"  ! {name} sonucu legacy yoldan farklı")
+            print("-" * 58)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,9 +4,9 @@ from datetime import date, timedelta
 from typing import Dict, Any, List, Optional, Tuple
 import re as _re
 
-from .ps_estimator import PSEstimator
+from .ps_estimator import get_shared_estimator
 from .engine import (
-    AILocal,
+    get_engine,
     KEYSETS,                 # alan anahtar kümeleri
     ACTION_TEMPLATES,        # alan -> aksiyon şablonları
     _kpis_default as _kpis_by_text,   # metne göre KPI önericisi
@@ -187,9 +187,8 @@ def make_ai_risk_comment(risk_id: int, style: str = "oz") -> str:
     description = risk.description or ""
 
     # 1) P/S tahmini (veri tabanından)
-    ps = PSEstimator(alpha=5.0)
     try:
-        ps.fit(db.session)
+        ps = get_shared_estimator(db.session)
         hint = ps.suggest(category or None)
     except Exception:
         hint = {"p": None, "s": None, "source": "veri"}
@@ -200,9 +199,9 @@ def make_ai_risk_comment(risk_id: int, style: str = "oz") -> str:
     # 2) Bağlam (opsiyonel) — makale kuralları
     rule_sources: List[str] = []
     try:
-        ai = AILocal.load_or_create()
-        hits = ai.search(f"{category} {title} {description}", k=5)
-        rule_sources = [h.get("source","") for h in hits if h.get("label") == "paper_rule" and h.get("source")]
+        ai = get_engine()
+        hits = ai.search(f"{category} {title} {description}", k=5, labels=["paper_rule"])
+        rule_sources = [h.get("source","") for h in hits if h.get("source")]
         rule_sources = list(dict.fromkeys(rule_sources))[:2]  # uniq + ilk 2
     except Exception:
         rule_sources = []
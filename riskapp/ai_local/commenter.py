@@ -7,8 +7,10 @@ import re as _re
 
 from flask import current_app
 
-from .ps_estimator import PSEstimator
-from .engine import AILocal          # ⬅️ DİKKAT: sadece AILocal, ai_complete YOK
+from .ps_estimator import get_shared_estimator
+from .engine import get_engine       # ⬅️ DİKKAT: sadece paylaşılan AILocal, ai_complete YOK
+from .keymatch import KeywordMatcher
+from .paper_rules import PaperRules
 from ..models import db, Risk
 
 
@@ -31,11 +33,6 @@ def _normalize(s: str) -> str:
     return s.translate(tr_map).lower()
 
 
-def _any_in(text: str, keywords) -> bool:
-    t = _normalize(text)
-    return any(k in t for k in keywords)
-
-
 def _unique(seq: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     seen = set()
     out = []
@@ -427,13 +424,13 @@ ACTION_TEMPLATES = {
 }
 
 
+# Tüm KEYSETS kelimeleri import anında tek regex'e derlenir (commenter + app ortak)
+KEY_MATCHER = KeywordMatcher(KEYSETS, normalize=_normalize)
+
+
 def _match_keys(text: str) -> List[str]:
-    """Metni KEYSETS'e göre tarar ve eşleşen anahtar listesini döndürür."""
-    hits: List[str] = []
-    for key, kw in KEYSETS.items():
-        if _any_in(text, kw):
-            hits.append(key)
-    return hits
+    """Metni KEYSETS'e göre tek geçişte tarar ve eşleşen anahtarları (KEYSETS sırasıyla) döndürür."""
+    return KEY_MATCHER.match(text)
 
 
 # ============================
@@ -790,141 +787,122 @@ def _propose_actions(risk: "Risk") -> List[Dict[str, Any]]:
 # 5) KPI varsayılanları
 # ============================
 
-def _kpis_default(cat_lower: str) -> List[str]:
-    cat_lower_norm = _normalize(cat_lower or "")
-
-    common = [
+# Ortak KPI'lar + ilk eşleşen anahtarın KPI'ları (sıra önceliktir)
+KPI_COMMON: List[str] = [
         "Aylık uygunsuzluk (NCR) sayısı 0 olmalıdır.",
         "Yeniden işleme (rework) süresi, toplam işçilik süresinin %2’sini aşmamalıdır.",
-    ]
+]
+
+KPI_TEMPLATES: List[tuple] = [
+    ("insaat", [
+        "Beton basınç testi başarısızlık oranı %1’i aşmamalıdır.",
+        "Slump ve sıcaklık tolerans dışı oranı %2’yi aşmamalıdır.",
+    ]),
+    ("satinalma", [
+        "Zamanında teslimat oranı (OTD) en az %95 olmalıdır.",
+        "Aylık emniyet stoğu altına düşme olayı 0 olmalıdır.",
+    ]),
+    ("sozlesme", [
+        "Kritik izin ve onay süreçlerinde gecikme olmamalıdır.",
+        "Sözleşme ihlali veya NCR sayısı 0 olmalıdır.",
+    ]),
+    ("isg_cevre", [
+        "Toz ve gürültü limit aşımı olmamalıdır.",
+        "Atık bertarafında uygunsuzluk olmamalıdır.",
+    ]),
+    ("geoteknik", [
+        "Şev stabilitesi tetik değer aşımı olmamalıdır.",
+        "Zemin parametrelerinin güncellenmesinde gecikme olmamalıdır.",
+    ]),
+    ("kalite", [
+        "NCR kapama ortalama süresi 10 günü aşmamalıdır.",
+        "ITP adımlarına uyum oranı en az %98 olmalıdır.",
+    ]),
+    ("planlama", [
+        "Kritik faaliyetlerde gecikme oranı %3’ü aşmamalıdır.",
+        "Gantt/P6 haftalık güncelleme tamamlama oranı %100 olmalıdır.",
+    ]),
+    ("mep_elektrik", [
+        "İzolasyon (megger) test başarı oranı en az %99 olmalıdır.",
+        "Elektrik test ve devreye alma sürecinde alan başına punch sayısı 5’i aşmamalıdır.",
+    ]),
+    ("mep_mekanik", [
+        "Hidrostatik ve basınç test başarı oranı en az %99 olmalıdır.",
+        "HVAC balancing sapması %5’i aşmamalıdır.",
+    ]),
+    ("marine", [
+        "Metocean çalışma penceresi dışında çalışma yapılmamalıdır.",
+        "Barge ve rigging planlarında uygunsuzluk olmamalıdır.",
+    ]),
+    ("tasarim", [
+        "RFI ortalama kapanma süresi 7 günü aşmamalıdır.",
+        "Shop drawing onaylarının zamanında tamamlanma oranı en az %95 olmalıdır.",
+    ]),
+    ("teknik_ofis", [
+        "Metraj ve BOQ fark oranı %1’i aşmamalıdır.",
+        "Hakediş tesliminde gecikme olmamalıdır.",
+    ]),
+    ("finans", [
+        "Planlanan ve gerçekleşen nakit akışı arasındaki sapma %5’i aşmamalıdır.",
+        "Fatura gecikme oranı %2’yi aşmamalıdır.",
+    ]),
+    ("makine_bakim", [
+        "Aylık MTBF artışı en az %5 olmalıdır.",
+        "Planlı bakım gerçekleşme oranı en az %95 olmalıdır.",
+    ]),
+    ("bim_bt", [
+        "Haftalık kritik clash sayısı belirlenen hedefin altında tutulmalıdır.",
+        "Model versiyonlarının yedekleme uyumu %100 olmalıdır.",
+    ]),
+    ("izin_ruhsat", [
+        "Kritik izinlerde gecikme olmamalıdır.",
+        "Resmi yazışma SLA uyum oranı en az %95 olmalıdır.",
+    ]),
+    ("laboratuvar", [
+        "Numune izlenebilirlik hatası olmamalıdır.",
+        "Kalibrasyon süreçlerinde gecikme olmamalıdır.",
+    ]),
+    ("depo", [
+        "Stok sayım uyumsuzluk oranı %1’i aşmamalıdır.",
+        "Lot ve seri izlenebilirlik hatası olmamalıdır.",
+    ]),
+    ("trafik_lojistik", [
+        "Plan dışı sevkiyat gecikmesi haftalık 0 olmalıdır.",
+        "Saha giriş-çıkış kayıt uyumu %100 olmalıdır.",
+    ]),
+    ("paydas_iletisim", [
+        "Paydaş şikâyetlerine ilk dönüş süresi 2 iş gününü aşmamalıdır.",
+        "Açık paydaş aksiyonu sayısı haftalık olarak azaltılmalıdır.",
+    ]),
+    ("taseron_yonetimi", [
+        "Taşeron haftalık iş tamamlama oranı en az %95 olmalıdır.",
+        "Taşeron kaynaklı tekrar iş oranı %2’yi aşmamalıdır.",
+    ]),
+    ("saha_erisim", [
+        "Alan teslimi veya erişim kaynaklı program sapması haftalık izlenmelidir.",
+        "Erişim engeli nedeniyle duran iş sayısı 0 olmalıdır.",
+    ]),
+    ("maliyet_artisi", [
+        "Maliyet sapması aylık %5’i aşmamalıdır.",
+        "Kritik maliyet kalemlerinde güncel teklif kontrolü %100 tamamlanmalıdır.",
+    ]),
+    ("test_devreye_alma", [
+        "Punch list kapanış oranı haftalık en az %90 olmalıdır.",
+        "Test tekrar oranı %5’i aşmamalıdır.",
+    ]),
+    ("dokumantasyon", [
+        "Eksik doküman sayısı haftalık olarak azaltılmalıdır.",
+        "Güncel revizyon kullanım uyumu %100 olmalıdır.",
+    ]),
+]
 
-    if "beton" in cat_lower_norm or "kalip" in cat_lower_norm or "donati" in cat_lower_norm or _any_in(cat_lower_norm, KEYSETS["insaat"]):
-        return common + [
-            "Beton basınç testi başarısızlık oranı %1’i aşmamalıdır.",
-            "Slump ve sıcaklık tolerans dışı oranı %2’yi aşmamalıdır.",
-        ]
-    if _any_in(cat_lower_norm, KEYSETS["satinalma"]):
-        return common + [
-            "Zamanında teslimat oranı (OTD) en az %95 olmalıdır.",
-            "Aylık emniyet stoğu altına düşme olayı 0 olmalıdır.",
-        ]
-    if _any_in(cat_lower_norm, KEYSETS["sozlesme"]):
-        return common + [
-            "Kritik izin ve onay süreçlerinde gecikme olmamalıdır.",
-            "Sözleşme ihlali veya NCR sayısı 0 olmalıdır.",
-        ]
-    if _any_in(cat_lower_norm, KEYSETS["isg_cevre"]):
-        return common + [
-            "Toz ve gürültü limit aşımı olmamalıdır.",
-            "Atık bertarafında uygunsuzluk olmamalıdır.",
-        ]
-    if _any_in(cat_lower_norm, KEYSETS["geoteknik"]):
-        return common + [
-            "Şev stabilitesi tetik değer aşımı olmamalıdır.",
-            "Zemin parametrelerinin güncellenmesinde gecikme olmamalıdır.",
-        ]
-    if _any_in(cat_lower_norm, KEYSETS["kalite"]):
-        return common + [
-            "NCR kapama ortalama süresi 10 günü aşmamalıdır.",
-            "ITP adımlarına uyum oranı en az %98 olmalıdır.",
-        ]
-    if _any_in(cat_lower_norm, KEYSETS["planlama"]):
-        return common + [
-            "Kritik faaliyetlerde gecikme oranı %3’ü aşmamalıdır.",
-            "Gantt/P6 haftalık güncelleme tamamlama oranı %100 olmalıdır.",
-        ]
-    if _any_in(cat_lower_norm, KEYSETS["mep_elektrik"]):
-        return common + [
-            "İzolasyon (megger) test başarı oranı en az %99 olmalıdır.",
-            "Elektrik test ve devreye alma sürecinde alan başına punch sayısı 5’i aşmamalıdır.",
-        ]
-    if _any_in(cat_lower_norm, KEYSETS["mep_mekanik"]):
-        return common + [
-            "Hidrostatik ve basınç test başarı oranı en az %99 olmalıdır.",
-            "HVAC balancing sapması %5’i aşmamalıdır.",
-        ]
-    if _any_in(cat_lower_norm, KEYSETS["marine"]):
-        return common + [
-            "Metocean çalışma penceresi dışında çalışma yapılmamalıdır.",
-            "Barge ve rigging planlarında uygunsuzluk olmamalıdır.",
-        ]
-    if _any_in(cat_lower_norm, KEYSETS["tasarim"]):
-        return common + [
-            "RFI ortalama kapanma süresi 7 günü aşmamalıdır.",
-            "Shop drawing onaylarının zamanında tamamlanma oranı en az %95 olmalıdır.",
-        ]
-    if _any_in(cat_lower_norm, KEYSETS["teknik_ofis"]):
-        return common + [
-            "Metraj ve BOQ fark oranı %1’i aşmamalıdır.",
-            "Hakediş tesliminde gecikme olmamalıdır.",
-        ]
-    if _any_in(cat_lower_norm, KEYSETS["finans"]):
-        return common + [
-            "Planlanan ve gerçekleşen nakit akışı arasındaki sapma %5’i aşmamalıdır.",
-            "Fatura gecikme oranı %2’yi aşmamalıdır.",
-        ]
-    if _any_in(cat_lower_norm, KEYSETS["makine_bakim"]):
-        return common + [
-            "Aylık MTBF artışı en az %5 olmalıdır.",
-            "Planlı bakım gerçekleşme oranı en az %95 olmalıdır.",
-        ]
-    if _any_in(cat_lower_norm, KEYSETS["bim_bt"]):
-        return common + [
-            "Haftalık kritik clash sayısı belirlenen hedefin altında tutulmalıdır.",
-            "Model versiyonlarının yedekleme uyumu %100 olmalıdır.",
-        ]
-    if _any_in(cat_lower_norm, KEYSETS["izin_ruhsat"]):
-        return common + [
-            "Kritik izinlerde gecikme olmamalıdır.",
-            "Resmi yazışma SLA uyum oranı en az %95 olmalıdır.",
-        ]
-    if _any_in(cat_lower_norm, KEYSETS["laboratuvar"]):
-        return common + [
-            "Numune izlenebilirlik hatası olmamalıdır.",
-            "Kalibrasyon süreçlerinde gecikme olmamalıdır.",
-        ]
-    if _any_in(cat_lower_norm, KEYSETS["depo"]):
-        return common + [
-            "Stok sayım uyumsuzluk oranı %1’i aşmamalıdır.",
-            "Lot ve seri izlenebilirlik hatası olmamalıdır.",
-        ]
-    if _any_in(cat_lower_norm, KEYSETS["trafik_lojistik"]):
-        return common + [
-            "Plan dışı sevkiyat gecikmesi haftalık 0 olmalıdır.",
-            "Saha giriş-çıkış kayıt uyumu %100 olmalıdır.",
-        ]
-    if _any_in(cat_lower_norm, KEYSETS["paydas_iletisim"]):
-        return common + [
-            "Paydaş şikâyetlerine ilk dönüş süresi 2 iş gününü aşmamalıdır.",
-            "Açık paydaş aksiyonu sayısı haftalık olarak azaltılmalıdır.",
-        ]
-    if _any_in(cat_lower_norm, KEYSETS["taseron_yonetimi"]):
-        return common + [
-            "Taşeron haftalık iş tamamlama oranı en az %95 olmalıdır.",
-            "Taşeron kaynaklı tekrar iş oranı %2’yi aşmamalıdır.",
-        ]
-    if _any_in(cat_lower_norm, KEYSETS["saha_erisim"]):
-        return common + [
-            "Alan teslimi veya erişim kaynaklı program sapması haftalık izlenmelidir.",
-            "Erişim engeli nedeniyle duran iş sayısı 0 olmalıdır.",
-        ]
-    if _any_in(cat_lower_norm, KEYSETS["maliyet_artisi"]):
-        return common + [
-            "Maliyet sapması aylık %5’i aşmamalıdır.",
-            "Kritik maliyet kalemlerinde güncel teklif kontrolü %100 tamamlanmalıdır.",
-        ]
-    if _any_in(cat_lower_norm, KEYSETS["test_devreye_alma"]):
-        return common + [
-            "Punch list kapanış oranı haftalık en az %90 olmalıdır.",
-            "Test tekrar oranı %5’i aşmamalıdır.",
-        ]
-    if _any_in(cat_lower_norm, KEYSETS["dokumantasyon"]):
-        return common + [
-            "Eksik doküman sayısı haftalık olarak azaltılmalıdır.",
-            "Güncel revizyon kullanım uyumu %100 olmalıdır.",
-        ]
 
-    return common
+def _kpis_default(cat_lower: str) -> List[str]:
+    found = KEY_MATCHER.scan(cat_lower or "")
+    for key, kpis in KPI_TEMPLATES:
+        if key in found:
+            return KPI_COMMON + kpis
+    return list(KPI_COMMON)
 
 
 # ============================
@@ -937,161 +915,22 @@ def _risk_text_blob(risk: "Risk") -> str:
     return _normalize(" ".join(parts))
 
 
+# Kurallar ai_data/paper_rules.json'da (AI_PAPER_RULES_FILE); dosya değişince yeniden yüklenir
+PAPER_RULES = PaperRules(normalize=_normalize)
+
+
 def _paper_rule_summaries(risk: "Risk") -> List[str]:
     """
-    Yüklediğin makalelerden çıkarılmış bazı sabit kuralları,
-    risk metniyle eşleşirse döndürür.
+    Yüklediğin makalelerden çıkarılmış sabit kuralları (paper_rules.json),
+    risk metniyle eşleşirse döndürür. Hiçbiri eşleşmezse metodoloji notları döner.
     Tamamen lokalde, AILocal'den bağımsız çalışır.
     """
-    t = _risk_text_blob(risk)
-    out: List[str] = []
-
-    # --- Genc 2021: Turkish construction sector, RII/EFA ---
-
-    # Kalifiye olmayan taşeron / işçi / personel
-    if any(k in t for k in [
-        "alt yuklenici", "altyuklenici", "tasaron", "tasaron", "subcontractor",
-        "vasifsiz", "niteliksiz", "unqualified", "yetersiz personel"
-    ]):
-        out.append(
-            "Genc 2021 çalışması, kalifiye olmayan taşeron/işçi/personel kullanımını "
-            "Türk inşaat sektöründe en yüksek olasılıklı risklerden biri olarak değerlendirmektedir; "
-            "bu nedenle taşeron seçimi, oryantasyon ve düzenli denetim süreçleri kritik önem taşır."
-        )
-
-    # Ödeme gecikmeleri / hakediş
-    if any(k in t for k in [
-        "odeme gecikmesi", "geciken odeme", "gecikmis odeme",
-        "hak edis", "hakedis", "payment delay", "delayed payment"
-    ]):
-        out.append(
-            "Aynı çalışmada, ödemelerde gecikme ve hakediş sorunları en olası riskler arasında; "
-            "bu nedenle sözleşmede net ödeme takvimi, gecikme faizi ve nakit akış planı tanımlanmalıdır."
-        )
-
-    # Enflasyon / fiyat spekülasyonu / kur riski
-    if any(k in t for k in [
-        "enflasyon", "fiyat artis", "fiyat artis", "fiyat spekulasyon",
-        "speku", "kur riski", "doviz", "price escalation", "inflation"
-    ]):
-        out.append(
-            "Genc 2021 sonuçlarına göre enflasyon ve fiyat dalgalanmaları yüksek olasılıklı "
-            "dışsal riskler arasında; fiyat farkı maddeleri, kısa vadeli alım sözleşmeleri "
-            "ve kur riskini azaltacak finansal araçlar önerilmektedir."
-        )
-
-    # Geç change-order / son dakika revizyon
-    if any(k in t for k in [
-        "change order", "degisiklik emri", "revizyon talebi", "gec gelen revizyon",
-        "late change", "gecikmis change"
-    ]):
-        out.append(
-            "Çalışma, geç gelen change-order/değişiklik taleplerinin hem süre hem maliyet "
-            "üzerinde kritik etki yaptığını vurguluyor; onaylı değişiklik prosedürü ve "
-            "kapsam dondurma tarihleri tanımlanmalıdır."
-        )
-
-    # Bütçe aşımı / cost overrun
-    if any(k in t for k in [
-        "butce asimi", "maliyet artisi", "cost overrun", "budget overrun",
-        "butce disi", "butceyi asmasi"
-    ]):
-        out.append(
-            "Genc 2021'de işin beklenen bütçe sınırları içinde tamamlanamaması, en olası "
-            "üst seviye risklerden biri; erken aşamada ayrıntılı maliyet kırılımı ve "
-            "kontenjan bütçe yönetimi önerilmektedir."
-        )
-
-    # --- Satpal 2022: Kurumsal bina projeleri, risk tahsisi ---
-
-    # İş kazası / zayıf İSG
-    if any(k in t for k in [
-        "is kazasi", "kaza", "safety", "guvenlik", "isg", "poor safety"
-    ]):
-        out.append(
-            "Satpal 2022, kurumsal bina işlerinde iş kazaları ve zayıf iş güvenliğini "
-            "ağırlıklı olarak yüklenicinin yönetmesi gereken riskler olarak sınıflandırıyor; "
-            "sistematik İSG planı, kısa saha eğitimleri ve düzenli saha denetimleri kritik önem taşır."
-        )
-
-    # Malzeme kalitesi / kusurlu malzeme
-    if any(k in t for k in [
-        "kusurlu malzeme", "defolu malzeme", "malzeme hatasi", "defective material"
-    ]):
-        out.append(
-            "Aynı çalışmada kusurlu malzeme tedariki, tedarik zinciri ve yüklenici "
-            "sorumluluğu altında ele alınıyor; tedarikçi onay süreci ve giriş kalite kontrolü "
-            "önemli azaltıcı tedbirler olarak belirtilmektedir."
-        )
-
-    # İşgücü / ekipman / malzeme bulunabilirliği
-    if any(k in t for k in [
-        "iscinin bulunmamasi", "iscinin yetersizligi", "isgucu eksikligi", "labour shortage",
-        "equipment", "ekipman yok", "malzeme yok", "unavailability of labour", "unavailability of material"
-    ]):
-        out.append(
-            "Satpal 2022, işgücü/ekipman/malzeme bulunabilirliğini yüklenici tarafında "
-            "yoğunlaşan önemli bir üretim riski olarak veriyor; alternatif tedarikçiler ve "
-            "yedek kapasite planı önerilmektedir."
-        )
-
-    # Hava koşulları
-    if any(k in t for k in [
-        "hava muhalefeti", "unpredictable weather", "siddetli hava", "yagis", "storm", "firtina"
-    ]):
-        out.append(
-            "Çalışmada öngörülemeyen hava koşulları, iş programı ve maliyet üzerinde "
-            "önemli etkiye sahip; süre tamponları ve mevsimsellik analizi ile yönetilmesi önerilmektedir."
-        )
-
-    # --- Shelake 2022: Tünel projeleri ---
+    return PAPER_RULES.summaries(_risk_text_blob(risk), normalized=True)
 
-    if any(k in t for k in [
-        "tunel", "tunnel", "metro tünel", "tbm", "delgi tünel", "shaft", "lining"
-    ]):
-        out.append(
-            "Shelake 2022, tünel projelerinde jeoteknik belirsizlikler ve yeraltı koşullarının "
-            "yetersiz analizinin ciddi süre ve maliyet aşımlarına yol açtığını gösteriyor; "
-            "erken jeoteknik kampanya, kademeli tasarım ve senaryo bazlı programlama tavsiye ediliyor."
-        )
-
-    # --- Ke et al. 2010: PPP risk allocation ---
-
-    if any(k in t for k in [
-        "ppp", "public private", "yap islet devret", "bot", "concession",
-        "imtiyaz sozlesmesi", "ozel finansman"
-    ]):
-        out.append(
-            "Ke vd. 2010, PPP projelerinde politik/hukuki makro risklerin genelde kamu "
-            "tarafında tutulduğunu, proje-özel meso risklerin daha çok özel sektöre "
-            "aktarılabildiğini, operasyonel mikro risklerin ise çoğunlukla yüklenicide "
-            "toplandığını raporlamaktadır; bu risk için taraflara göre adil paylaşım kurgulanmalı."
-        )
-
-    # --- Genel metodoloji makaleleri: Akintoye 1997, Dziadosz 2015 vs. ---
-
-    # Eğer hiçbir spesifik tetik yoksa ya da çok genel bir riskse, metodoloji notları ekle
-    if not out:
-        out.append(
-            "Akintoye & MacLeod 1997, inşaat projelerinde risklerin çoğunlukla maliyet, süre "
-            "ve kalite hedeflerine etkisi üzerinden algılandığını ve yönetimin çoğu zaman "
-            "sezgiye bırakıldığını belirtiyor; yapılandırılmış risk analizi (senaryo, hassasiyet, "
-            "olasılık-etki matrisleri) ile daha sağlam kararlar alınabiliyor."
-        )
-        out.append(
-            "Dziadosz & Rejment 2015, risk yönetim sürecini üç çekirdeğe indiriyor: tanımla, "
-            "nicelleştir, tepki ver; projede hem nitel uzman görüşü hem RII gibi nicel araçların "
-            "beraber kullanılması önerilmektedir."
-        )
 
-    # Aynı cümleleri tekrar yazmamak için uniq yap
-    seen: set[str] = set()
-    uniq: List[str] = []
-    for s in out:
-        if s not in seen:
-            seen.add(s)
-            uniq.append(s)
-    return uniq
+def _paper_rule_summaries_many(risks: List["Risk"]) -> List[List[str]]:
+    """_paper_rule_summaries'in toplu hali (tek kural seti, tek geçişli tarama)."""
+    return PAPER_RULES.summaries_many([_risk_text_blob(r) for r in risks], normalized=True)
 
 
 # ============================
@@ -1106,8 +945,7 @@ def make_ai_risk_comment(risk_id: int) -> str:
     # 1) P/S (DB + Excel priors + makale heuristikleri) — HATALARA DAYANIKLI
     hint: Optional[Dict[str, Any]] = None
     try:
-        ps = PSEstimator(alpha=5.0)
-        ps.fit(db.session)
+        ps = get_shared_estimator(db.session)
         hint = ps.suggest(r.category or None)
     except Exception as e:
         current_app.logger.exception("PSEstimator hata verdi: %s", e)
@@ -1116,10 +954,10 @@ def make_ai_risk_comment(risk_id: int) -> str:
     # 2) Benzer kayıtlar / makale kuralları (bağlam) — lokal AI yoksa sessizce devam et
     rules: List[Dict[str, Any]] = []
     try:
-        ai = AILocal.load_or_create()
+        ai = get_engine()
         query = f"{r.category or ''} {r.title or ''} {r.description or ''}"
-        hits = ai.search(query, k=5)
-        rules = [h for h in hits if h.get("label") == "paper_rule"]
+        # yalnızca paper_rule bölümü: karışık top-5'te kurallar kaybolmasın
+        rules = ai.search(query, k=5, labels=["paper_rule"])
     except Exception as e:
         current_app.logger.exception("AILocal.search hata verdi: %s", e)
         rules = []
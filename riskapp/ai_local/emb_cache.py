@@ -0,0 +1,220 @@
+# riskapp/ai_local/emb_cache.py
+# -*- coding: utf-8 -*-
+"""
+İçerik-özetli (content-hash) embedding önbelleği.
+
+Anahtar: sha256(model_name + "\\0" + normalize(text)). Vektörler model başına
+yalnızca sona eklenen (append-only) ham float32 dosyada tutulur; i. satırın
+ofseti i * dim * 4'tür. Anahtarlar aynı sırayla keys.txt'ye yazılır
+(satır no = vektör satırı), böylece ayrı bir ofset tablosu gerekmez.
+
+  ai_data/emb_cache/<model>/
+      cache_info.json  {model_name, dim}
+      vectors.f32      (M, dim) float32 — encoder'ın ham (normlanmamış) çıktısı
+      keys.txt         M satır hex özet
+
+Yalnızca SBERT (yoğun) encoder için kullanılır: TF-IDF vektörleri her kurulumda
+yeniden fit edilen sözlüğe bağlıdır ve kodlaması zaten ucuzdur.
+"""
+from __future__ import annotations
+
+import os
+import re
+import json
+import time
+import hashlib
+import contextlib
+import unicodedata
+from typing import Any, Dict, List, Optional, Tuple, TYPE_CHECKING
+
+import numpy as np
+
+try:
+    import fcntl  # POSIX dosya kilidi (Windows'ta yok)
+except Exception:
+    fcntl = None
+
+if TYPE_CHECKING:
+    from .engine import LocalEncoder  # pragma: no cover
+
+DATA_DIR = os.getenv("AI_DATA_DIR", "ai_data")
+CACHE_DIRNAME = "emb_cache"
+
+INFO_NAME = "cache_info.json"
+VECS_NAME = "vectors.f32"
+KEYS_NAME = "keys.txt"
+LOCK_NAME = "cache.lock"
+
+
+def cache_enabled() -> bool:
+    return (os.getenv("AI_EMB_CACHE", "1") or "").strip().lower() in ("1", "true", "yes")
+
+
+def normalize_text(text: str) -> str:
+    """Anahtar için: NFC + boşlukları tek boşluğa indir (büyük/küçük harf korunur)."""
+    return " ".join(unicodedata.normalize("NFC", text or "").split())
+
+
+def _slug(model_name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", model_name).strip("_") or "model"
+
+
+class EmbeddingCache:
+    """Tek bir model için kalıcı vektör önbelleği (bkz. modül açıklaması)."""
+
+    def __init__(self, model_name: str, data_dir: str = DATA_DIR):
+        self.model_name = model_name
+        self.root = os.path.join(data_dir, CACHE_DIRNAME, _slug(model_name))
+        self.info_path = os.path.join(self.root, INFO_NAME)
+        self.vecs_path = os.path.join(self.root, VECS_NAME)
+        self.keys_path = os.path.join(self.root, KEYS_NAME)
+        self.lock_path = os.path.join(self.root, LOCK_NAME)
+        self.dim: Optional[int] = None
+        self._rows: Dict[str, int] = {}
+        self._keys_pos = 0  # keys.txt'de okunan bayt
+        self._n = 0         # okunan satır (= vektör satırı) sayısı
+        self._reload()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(
+            (self.model_name + "\0" + normalize_text(text)).encode("utf-8")
+        ).hexdigest()
+
+    # ---------- Disk ----------
+    @contextlib.contextmanager
+    def _lock(self):
+        os.makedirs(self.root, exist_ok=True)
+        if fcntl is None:
+            yield
+            return
+        with open(self.lock_path, "a") as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _reload(self) -> None:
+        """Başka süreçlerin eklediği anahtarları da okur (yalnızca yeni kısım)."""
+        if self.dim is None and os.path.exists(self.info_path):
+            with open(self.info_path, "r", encoding="utf-8") as f:
+                self.dim = int((json.load(f) or {}).get("dim") or 0) or None
+        if self.dim is None or not os.path.exists(self.keys_path):
+            return
+        # Yarım kalmış yazımda vektör dosyası kısa olabilir: tam satırlara güven
+        n_vecs = os.path.getsize(self.vecs_path) // (self.dim * 4) if os.path.exists(self.vecs_path) else 0
+        with open(self.keys_path, "rb") as f:
+            f.seek(self._keys_pos)
+            chunk = f.read()
+        for line in chunk.splitlines(keepends=True):
+            if not line.endswith(b"\n") or self._n >= n_vecs:
+                break
+            self._rows.setdefault(line[:-1].decode("ascii"), self._n)
+            self._n += 1
+            self._keys_pos += len(line)
+
+    def _append(self, keys: List[str], X: np.ndarray) -> None:
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        with self._lock():
+            if self.dim is None:
+                self.dim = int(X.shape[1])
+                with open(self.info_path, "w", encoding="utf-8") as f:
+                    json.dump({"model_name": self.model_name, "dim": self.dim}, f, ensure_ascii=False)
+            if X.shape[1] != self.dim:
+                raise ValueError(f"Önbellek boyutu uyuşmuyor: {X.shape[1]} != {self.dim}")
+            self._reload()
+            todo = [i for i, k in enumerate(keys) if k not in self._rows]
+            if not todo:
+                return
+            # Sıra önemli: önce vektörler, sonra anahtarlar (anahtar varsa vektör de vardır)
+            with open(self.vecs_path, "ab") as f:
+                f.write(X[todo].tobytes())
+            with open(self.keys_path, "a", encoding="ascii") as f:
+                f.write("".join(keys[i] + "\n" for i in todo))
+            self._reload()
+
+    def _read(self, rows: np.ndarray) -> np.ndarray:
+        n = os.path.getsize(self.vecs_path) // (self.dim * 4)
+        V = np.memmap(self.vecs_path, dtype=np.float32, mode="r", shape=(n, self.dim))
+        return np.asarray(V[rows])
+
+    # ---------- Kodlama ----------
+    def lookup(self, texts: List[str]) -> Tuple[List[str], List[Optional[int]], Dict[str, int]]:
+        """
+        -> (anahtarlar, önbellek satırları (yoksa None), {eksik anahtar: ilk metin sırası}).
+        Eksik metinler kodlanıp add() ile eklenir, ardından assemble() ile birleştirilir.
+        """
+        self._reload()
+        keys = [self.key(t) for t in texts]
+        rows = [self._rows.get(k) for k in keys]
+        uniq: Dict[str, int] = {}
+        for i, r in enumerate(rows):
+            if r is None:
+                uniq.setdefault(keys[i], i)
+        return keys, rows, uniq
+
+    def add(self, keys: List[str], X: np.ndarray) -> None:
+        self._append(keys, X)
+
+    def assemble(self, keys: List[str], rows: List[Optional[int]], uniq: Dict[str, int],
+                 fresh: Optional[np.ndarray]) -> np.ndarray:
+        """Önbellekteki satırlar + yeni kodlananlar (fresh, uniq sırasıyla) -> (N, dim)."""
+        dim = self.dim or (int(fresh.shape[1]) if fresh is not None else 0)
+        X = np.empty((len(keys), dim), dtype=np.float32)
+        hit = [i for i, r in enumerate(rows) if r is not None]
+        if hit:
+            X[hit] = self._read(np.asarray([rows[i] for i in hit], dtype=np.int64))
+        if fresh is not None:
+            pos = {k: j for j, k in enumerate(uniq)}
+            for i, r in enumerate(rows):
+                if r is None:
+                    X[i] = fresh[pos[keys[i]]]
+        return X
+
+    def encode(self, encoder: "LocalEncoder", texts: List[str]) -> Tuple[np.ndarray, Dict[str, Any]]:
+        """
+        Önce önbelleğe bakar, yalnızca eksik (aynı metin bir kez) metinleri kodlar.
+        Dönen: (X (N, dim) float32, {"hits", "misses", "encoded", "encode_seconds", "seconds"})
+        """
+        t0 = time.perf_counter()
+        keys, rows, uniq = self.lookup(texts)
+
+        enc_s = 0.0
+        fresh: Optional[np.ndarray] = None
+        if uniq:
+            te = time.perf_counter()
+            fresh = np.asarray(encoder.encode([texts[i] for i in uniq.values()]), dtype=np.float32)
+            enc_s = time.perf_counter() - te
+            self._append(list(uniq), fresh)
+
+        X = self.assemble(keys, rows, uniq, fresh)
+        n_hit = sum(r is not None for r in rows)
+        stats = {
+            "hits": n_hit,
+            "misses": len(rows) - n_hit,
+            "encoded": len(uniq),
+            "encode_seconds": round(enc_s, 4),
+            "seconds": round(time.perf_counter() - t0, 4),
+        }
+        return X, stats
+
+
+def encode_with_cache(encoder: "LocalEncoder", texts: List[str], sparse: bool = False,
+                      data_dir: str = DATA_DIR) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Kurulumlar için ortak giriş: SBERT modunda önbellekten, TF-IDF modunda
+    (ya da AI_EMB_CACHE=0 ise) doğrudan encoder ile kodlar.
+    Dönen: (X, istatistik) — istatistikte "cached" önbelleğin kullanılıp kullanılmadığıdır.
+    """
+    if encoder.backend != "tfidf" and cache_enabled() and texts:
+        X, stats = EmbeddingCache(encoder.model_name, data_dir).encode(encoder, texts)
+        stats["cached"] = True
+        return X, stats
+    t0 = time.perf_counter()
+    X = encoder.encode(texts, sparse=sparse)
+    sec = round(time.perf_counter() - t0, 4)
+    return X, {"hits": 0, "misses": len(texts), "encoded": len(texts),
+               "encode_seconds": sec, "seconds": sec, "cached": False}
@@ -0,0 +1,450 @@
+# riskapp/ai_local/encoder_service.py
+# -*- coding: utf-8 -*-
+"""
+Paylaşılan encoder servisi (opsiyonel, Unix soketi).
+
+Her gunicorn worker'ı kendi SentenceTransformer kopyasını yüklerse bellek
+worker sayısıyla çarpılır. Bu servis modeli (ve indeksi) tek süreçte yükler;
+worker'lar AILocal içinde RemoteEncoder ile buna bağlanır:
+
+    AI_ENCODER_SOCKET=/run/riskapp/encoder.sock python -m riskapp.ai_local.encoder_service
+    AI_ENCODER_SOCKET=/run/riskapp/encoder.sock gunicorn ...
+
+  - encode : eşzamanlı isteklerdeki metinler en fazla COALESCE_WAIT_MS
+             beklenerek tek bir ileri geçişte (en fazla COALESCE_MAX metin)
+             kodlanır, sonuçlar isteklere bölünür
+  - search : servisin kendi motorunda AILocal.search (sorgu kodlaması da
+             aynı birleştirmeden geçer)
+  - info   : backend / model / boyut
+
+Soket yoksa ya da servis yanıt vermezse worker'lar modeli kendi süreçlerinde
+yükleyip kodlamaya devam eder (RemoteEncoder yedeği); RETRY_SECONDS sonra
+servis yeniden denenir. TF-IDF indekslerinde istemci kullanılmaz (paylaşılacak
+model yok, sözlük indeksle birlikte yüklenir).
+
+Çerçeve: 4 bayt (big-endian) başlık uzunluğu + JSON başlık + başlıktaki
+"nbytes" kadar ikili yük (yoğun: float32 satırlar; seyrek: CSR data/indices/indptr).
+"""
+from __future__ import annotations
+
+import os
+import sys
+import json
+import queue
+import socket
+import struct
+import argparse
+import threading
+import time
+import socketserver
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+
+from .engine import DATA_DIR, MODEL_NAME, LocalEncoder, get_engine
+
+SOCKET_PATH = os.getenv("AI_ENCODER_SOCKET", "")  # boş: servis/istemci kapalı
+COALESCE_MAX = int(os.getenv("AI_ENCODER_COALESCE_MAX", "256"))        # bir ileri geçişteki en fazla metin
+COALESCE_WAIT_MS = float(os.getenv("AI_ENCODER_COALESCE_WAIT_MS", "5"))  # ilk istekten sonra bekleme
+TIMEOUT = float(os.getenv("AI_ENCODER_TIMEOUT", "10"))
+RETRY_SECONDS = 30.0
+
+_HDR = struct.Struct(">I")
+_MAX_HEADER = 64 * 1024 * 1024
+_serving = False  # servis sürecinde: kendi motoru istemciye bağlanmasın
+
+
+# -------------------------------
+#  Çerçeveleme
+# -------------------------------
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        part = sock.recv(n - len(buf))
+        if not part:
+            raise ConnectionError("Bağlantı kapandı")
+        buf += part
+    return bytes(buf)
+
+
+def _send(sock: socket.socket, header: Dict[str, Any], payload: bytes = b"") -> None:
+    header = dict(header, nbytes=len(payload))
+    data = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    sock.sendall(_HDR.pack(len(data)) + data + payload)
+
+
+def _recv(sock: socket.socket) -> Tuple[Dict[str, Any], bytes]:
+    (n,) = _HDR.unpack(_recv_exact(sock, _HDR.size))
+    if n > _MAX_HEADER:
+        raise ValueError(f"Başlık çok büyük: {n}")
+    header = json.loads(_recv_exact(sock, n).decode("utf-8"))
+    nbytes = int(header.get("nbytes") or 0)
+    return header, (_recv_exact(sock, nbytes) if nbytes else b"")
+
+
+def _pack_matrix(X: Any) -> Tuple[Dict[str, Any], bytes]:
+    if sp.issparse(X):
+        X = X.tocsr()
+        data = np.ascontiguousarray(X.data, dtype=np.float32)
+        indices = np.ascontiguousarray(X.indices, dtype=np.int32)
+        indptr = np.ascontiguousarray(X.indptr, dtype=np.int64)
+        return ({"kind": "sparse", "shape": list(X.shape), "nnz": int(data.shape[0])},
+                data.tobytes() + indices.tobytes() + indptr.tobytes())
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    return {"kind": "dense", "shape": list(X.shape)}, X.tobytes()
+
+
+def _unpack_matrix(header: Dict[str, Any], payload: bytes) -> Any:
+    n, d = (int(v) for v in header["shape"])
+    if header.get("kind") == "sparse":
+        nnz = int(header["nnz"])
+        data = np.frombuffer(payload, dtype=np.float32, count=nnz)
+        indices = np.frombuffer(payload, dtype=np.int32, count=nnz, offset=nnz * 4)
+        indptr = np.frombuffer(payload, dtype=np.int64, count=n + 1, offset=nnz * 8)
+        return sp.csr_matrix((data, indices, indptr), shape=(n, d))
+    return np.frombuffer(payload, dtype=np.float32).reshape(n, d)
+
+
+# -------------------------------
+#  Servis
+# -------------------------------
+class _Job:
+    __slots__ = ("texts", "sparse", "done", "result", "error")
+
+    def __init__(self, texts: List[str], sparse: bool):
+        self.texts = texts
+        self.sparse = sparse
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class Coalescer:
+    """
+    Bağlantı thread'lerinden gelen kodlama işlerini tek thread'de toplar:
+    ilk işten sonra en fazla wait_ms beklenir ya da max_texts dolunca
+    aynı türdeki (yoğun/seyrek) işler tek encode() çağrısında kodlanır.
+    """
+    def __init__(self, data_dir: str, max_texts: int = COALESCE_MAX, wait_ms: float = COALESCE_WAIT_MS):
+        self.data_dir = data_dir
+        self.max_texts = max(int(max_texts), 1)
+        self.wait = max(float(wait_ms), 0.0) / 1000.0
+        self._q: "queue.Queue[_Job]" = queue.Queue()
+        self.stats = {"requests": 0, "passes": 0, "texts": 0}
+        threading.Thread(target=self._run, name="ai-encoder-coalesce", daemon=True).start()
+
+    def encode(self, texts: List[str], sparse: bool = False) -> Any:
+        job = _Job(list(texts), bool(sparse))
+        self._q.put(job)
+        job.done.wait()
+        if job.error is not None:
+            raise job.error
+        return job.result
+
+    def _collect(self) -> List[_Job]:
+        jobs = [self._q.get()]
+        n = len(jobs[0].texts)
+        deadline = time.monotonic() + self.wait
+        while n < self.max_texts:
+            left = deadline - time.monotonic()
+            try:
+                job = self._q.get(timeout=left) if left > 0 else self._q.get_nowait()
+            except queue.Empty:
+                break
+            jobs.append(job)
+            n += len(job.texts)
+        return jobs
+
+    def _run(self) -> None:
+        while True:
+            jobs = self._collect()
+            for sparse in (False, True):
+                group = [j for j in jobs if j.sparse == sparse]
+                if group:
+                    self._encode_group(group, sparse)
+
+    def _encode_group(self, group: List[_Job], sparse: bool) -> None:
+        try:
+            enc = get_engine(self.data_dir).enc
+            if isinstance(enc, _CoalescedEncoder):
+                enc = enc._enc  # asıl encoder (sarmalayıcı bu kuyruğa geri yazar)
+            texts = [t for j in group for t in j.texts]
+            X = enc.encode(texts, sparse=sparse) if texts else None
+            a = 0
+            for j in group:
+                b = a + len(j.texts)
+                j.result = X[a:b] if X is not None else np.zeros((0, enc.dim()), dtype=np.float32)
+                a = b
+            self.stats["requests"] += len(group)
+            self.stats["passes"] += 1
+            self.stats["texts"] += len(texts)
+        except BaseException as exc:  # istek sahibine iletilir, thread ölmez
+            for j in group:
+                j.error = exc
+        finally:
+            for j in group:
+                j.done.set()
+
+
+class _CoalescedEncoder:
+    """Servis motorunun encoder'ı: search() içindeki sorgu kodlaması da birleştirilir."""
+    def __init__(self, enc: LocalEncoder, coalescer: Coalescer):
+        self._enc = enc
+        self._co = coalescer
+
+    def encode(self, texts: List[str], sparse: bool = False, batch_size: Optional[int] = None):
+        return self._co.encode(texts, sparse=sparse)
+
+    def __getattr__(self, name: str):
+        return getattr(self._enc, name)
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    server: "EncoderServer"
+
+    def handle(self) -> None:
+        sock = self.request
+        while True:
+            try:
+                header, payload = _recv(sock)
+            except (ConnectionError, OSError):
+                return
+            try:
+                reply, data = self.server.dispatch(header)
+            except Exception as exc:
+                reply, data = {"ok": False, "error": str(exc)}, b""
+            try:
+                _send(sock, reply, data)
+            except OSError:
+                return
+
+
+class EncoderServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str = SOCKET_PATH, data_dir: str = DATA_DIR,
+                 max_texts: int = COALESCE_MAX, wait_ms: float = COALESCE_WAIT_MS):
+        global _serving
+        if not path:
+            raise ValueError("Soket yolu gerekli (AI_ENCODER_SOCKET ya da --socket).")
+        _serving = True
+        self.data_dir = data_dir
+        _claim_socket(path)
+        super().__init__(path, _Handler)
+        os.chmod(path, 0o660)
+        self.coalescer = Coalescer(data_dir, max_texts=max_texts, wait_ms=wait_ms)
+
+    def engine(self):
+        """Paylaşılan motor; sıcak yeniden yüklenen yeni motorun encoder'ı da sarmalanır."""
+        eng = get_engine(self.data_dir)
+        if not isinstance(eng.enc, _CoalescedEncoder):
+            eng.enc = _CoalescedEncoder(eng.enc, self.coalescer)  # type: ignore[assignment]
+        return eng
+
+    def dispatch(self, header: Dict[str, Any]) -> Tuple[Dict[str, Any], bytes]:
+        op = header.get("op")
+        if op == "encode":
+            X = self.coalescer.encode([str(t) for t in header.get("texts") or []],
+                                      sparse=bool(header.get("sparse")))
+            meta, data = _pack_matrix(X)
+            return dict(meta, ok=True), data
+        if op == "search":
+            labels = header.get("labels")
+            hits = self.engine().search(str(header.get("text") or ""), k=int(header.get("k") or 5),
+                                        labels=list(labels) if labels is not None else None)
+            return {"ok": True, "hits": hits}, b""
+        if op == "info":
+            enc = self.engine().enc
+            return {"ok": True, "backend": enc.backend, "model_name": enc.model_name,
+                    "dim": enc.dim(), "lowercase": enc.lowercase,
+                    "pid": os.getpid(), "stats": dict(self.coalescer.stats)}, b""
+        return {"ok": False, "error": f"Bilinmeyen işlem: {op}"}, b""
+
+    def server_close(self) -> None:
+        super().server_close()
+        try:
+            os.unlink(self.server_address)  # type: ignore[arg-type]
+        except OSError:
+            pass
+
+
+def _claim_socket(path: str) -> None:
+    """Eski (ölü servisten kalan) soket dosyasını siler; canlı bir servis varsa hata verir."""
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except OSError:
+        os.unlink(path)
+        return
+    finally:
+        probe.close()
+    raise RuntimeError(f"Encoder servisi zaten çalışıyor: {path}")
+
+
+# -------------------------------
+#  İstemci
+# -------------------------------
+class EncoderClient:
+    """
+    Thread başına kalıcı bağlantı. Yalnızca bağlantı kurulamadığında ya da
+    kalıcı bağlantı kopmuşsa (ConnectionError: broken pipe / reset / kapandı)
+    bir kez yeniden bağlanır. Zaman aşımında yeniden denenmez: servis meşgul
+    demektir, ikinci deneme çağıranı 2×timeout bekletir; soket atılır (yarım
+    yanıt sonraki çağrıya karışmasın) ve hata yükselir, RemoteEncoder yerel
+    yedeğe düşer.
+    """
+    def __init__(self, path: str = SOCKET_PATH, timeout: float = TIMEOUT):
+        self.path = path
+        self.timeout = float(timeout)
+        self._local = threading.local()
+
+    def _sock(self) -> socket.socket:
+        s = getattr(self._local, "sock", None)
+        if s is None:
+            s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            s.settimeout(self.timeout)
+            try:
+                s.connect(self.path)
+            except OSError:
+                s.close()
+                raise
+            self._local.sock = s
+        return s
+
+    def _drop(self) -> None:
+        s = getattr(self._local, "sock", None)
+        self._local.sock = None
+        if s is not None:
+            try:
+                s.close()
+            except OSError:
+                pass
+
+    def call(self, header: Dict[str, Any]) -> Tuple[Dict[str, Any], bytes]:
+        for attempt in (0, 1):
+            try:
+                s = self._sock()
+            except OSError:
+                if attempt:
+                    raise
+                continue
+            try:
+                _send(s, header)
+                reply, payload = _recv(s)
+                break
+            except ConnectionError:
+                self._drop()
+                if attempt:
+                    raise
+            except Exception:
+                self._drop()  # zaman aşımı / bozuk çerçeve: yeniden deneme yok
+                raise
+        if not reply.get("ok"):
+            raise RuntimeError(reply.get("error") or "Encoder servisi hata döndü")
+        return reply, payload
+
+    def info(self) -> Dict[str, Any]:
+        return self.call({"op": "info"})[0]
+
+    def encode(self, texts: List[str], sparse: bool = False) -> Any:
+        reply, payload = self.call({"op": "encode", "texts": list(texts), "sparse": bool(sparse)})
+        return _unpack_matrix(reply, payload)
+
+    def search(self, text: str, k: int = 5, labels: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        return self.call({"op": "search", "text": text, "k": int(k), "labels": labels})[0]["hits"]
+
+
+class RemoteEncoder:
+    """
+    AILocal için LocalEncoder yerine geçen istemci (yalnızca SBERT). Servis
+    ulaşılamazsa model bu süreçte yüklenir ve RETRY_SECONDS boyunca o kullanılır.
+    """
+    def __init__(self, client: EncoderClient, info: Dict[str, Any]):
+        self.client = client
+        self.model_name = str(info.get("model_name") or MODEL_NAME)
+        self._dim = int(info.get("dim") or 384)
+        self.lowercase = bool(info.get("lowercase"))  # SearchCache anahtarı; bilinmiyorsa duyarlı
+        self._local: Optional[LocalEncoder] = None
+        self._retry_at = 0.0
+        self._fallback_lock = threading.Lock()
+        self.remote_calls = 0
+        self.fallback_calls = 0
+
+    @property
+    def backend(self) -> str:
+        return "sentence-transformers"
+
+    def dim(self) -> int:
+        return self._dim
+
+    def fit_tfidf(self, corpus: List[str]) -> None:
+        return None
+
+    def tfidf_state(self) -> None:
+        return None
+
+    def _fallback(self) -> LocalEncoder:
+        with self._fallback_lock:
+            if self._local is None:
+                self._local = LocalEncoder(self.model_name)
+            return self._local
+
+    def encode(self, texts: List[str], sparse: bool = False, batch_size: Optional[int] = None) -> np.ndarray:
+        if time.monotonic() >= self._retry_at:
+            try:
+                X = self.client.encode(texts, sparse=False)
+                self.remote_calls += 1
+                return np.asarray(X, dtype=np.float32)
+            except (OSError, ConnectionError, RuntimeError, ValueError):
+                self._retry_at = time.monotonic() + RETRY_SECONDS
+        self.fallback_calls += 1
+        return self._fallback().encode(texts, sparse=sparse, batch_size=batch_size)
+
+
+def connect_encoder(model_name: Optional[str] = None, backend: Optional[str] = None,
+                    path: Optional[str] = None) -> Optional[RemoteEncoder]:
+    """
+    Servis varsa ve aynı SBERT modelini sunuyorsa RemoteEncoder, aksi halde None
+    (çağıran encoder'ı kendi sürecinde kurar). backend: indeksin encoder türü.
+    """
+    path = SOCKET_PATH if path is None else path
+    if _serving or not path or backend == "tfidf" or not os.path.exists(path):
+        return None
+    client = EncoderClient(path)
+    try:
+        info = client.info()
+    except (OSError, ConnectionError, RuntimeError, ValueError):
+        return None
+    if info.get("backend") != "sentence-transformers":
+        return None
+    if model_name and info.get("model_name") != model_name:
+        return None
+    return RemoteEncoder(client, info)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Paylaşılan AI encoder servisi (Unix soketi)")
+    ap.add_argument("--socket", default=SOCKET_PATH, help="soket yolu (varsayılan: AI_ENCODER_SOCKET)")
+    ap.add_argument("--data-dir", default=DATA_DIR)
+    ap.add_argument("--max-batch", type=int, default=COALESCE_MAX)
+    ap.add_argument("--wait-ms", type=float, default=COALESCE_WAIT_MS)
+    args = ap.parse_args()
+
+    server = EncoderServer(args.socket, args.data_dir, max_texts=args.max_batch, wait_ms=args.wait_ms)
+    eng = server.engine()
+    print(f"Encoder servisi hazır: {args.socket} ({eng.enc.backend}, {len(eng.meta)} kayıt)",
+          file=sys.stderr, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
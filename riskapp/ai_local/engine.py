@@ -3,10 +3,15 @@
 from __future__ import annotations
 import os
 import json
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
 from dataclasses import dataclass
 from typing import List, Dict, Optional, Tuple, Any, TYPE_CHECKING
 
 import numpy as np
+import scipy.sparse as sp
 
 # ---- Opsiyonel bağımlılıklar (runtime)
 try:
@@ -18,9 +23,11 @@ try:
 except Exception:
     faiss = None
 
-from sklearn.neighbors import NearestNeighbors
 from sklearn.feature_extraction.text import TfidfVectorizer
 
+from .lexical import rrf_fuse
+from sklearn.preprocessing import normalize as _sk_normalize
+
 # ---- Tip denetimi için güvenli import (Pylance hatasını önler)
 if TYPE_CHECKING:
     from sentence_transformers import SentenceTransformer as _SentenceTransformer
@@ -32,8 +39,32 @@ MODEL_NAME = os.getenv("EMB_LOCAL_MODEL", "sentence-transformers/all-MiniLM-L6-v
 DATA_DIR   = os.getenv("AI_DATA_DIR", "ai_data")  # vektör ve meta dosyaları
 
 # İndeks dosya adları (storage ile uyumlu)
-VEC_FILE   = "embeddings.npy"
-META_FILE  = "meta.json"
+VEC_FILE   = "vectors.npy"        # v2 (storage.DENSE_VEC_NAME)
+META_FILE  = "index_header.json"  # v2 (storage.HEADER_NAME)
+
+# NumPy tam aramada bir seferde skorlanan satır sayısı (bellek üst sınırı: sorgu × dilim)
+SEARCH_CHUNK = int(os.getenv("AI_SEARCH_CHUNK", "65536"))
+
+# Sıkıştırılmış (quantized) yoğun vektörler: "float16" | "int8" (boş/none: kapalı).
+# Aday taraması sıkıştırılmış matriste, son sıralama float32 satırlarla yapılır.
+QUANT_MODES = ("float16", "int8")
+QUANT_MODE = (os.getenv("AI_QUANT", "") or "").strip().lower()
+if QUANT_MODE not in QUANT_MODES:
+    QUANT_MODE = ""
+RERANK_FACTOR = int(os.getenv("AI_RERANK_FACTOR", "4"))  # aday sayısı = k × bu çarpan
+
+# Hibrit arama: vektör + BM25 (lexical.BM25Index) sonuçları RRF ile birleştirilir
+HYBRID_SEARCH = (os.getenv("AI_HYBRID", "1") or "").strip().lower() in ("1", "true", "yes")
+RRF_K = int(os.getenv("AI_RRF_K", "60"))
+QUANT_CHUNK = 4096  # sıkıştırılmış satırlar bu boyda, önbellekte kalan bir tampona açılır
+
+# SBERT ileri geçişinde bir grupta kodlanan metin sayısı (kütüphane varsayılanı 32)
+ENCODE_BATCH = int(os.getenv("AI_ENCODE_BATCH", "64"))
+
+# Sorgu sonucu önbelleği (AILocal.search): aynı soru tekrarında encoder çalışmaz.
+# Anahtar: (normalize sorgu, k, etiketler, indeks sürümü). Boyut 0: kapalı.
+SEARCH_CACHE_SIZE = int(os.getenv("AI_SEARCH_CACHE_SIZE", "1024"))
+SEARCH_CACHE_TTL = float(os.getenv("AI_SEARCH_CACHE_TTL", "600"))  # sn; 0: süresiz
 
 
 # ============================
@@ -168,70 +199,398 @@ def _l2_normalize(x: np.ndarray) -> np.ndarray:
     return x / n
 
 
+def _l2_normalize_sparse(x) -> "sp.csr_matrix":
+    """CSR satırlarını yerinde yoğunlaştırmadan L2-normlar (boş satır 0 kalır)."""
+    return _sk_normalize(sp.csr_matrix(x, dtype=np.float32), norm="l2", axis=1, copy=False)
+
+
+def quantize_rows(X: np.ndarray, mode: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Normlanmış float32 satırları sıkıştırır -> (Xq, scales).
+      float16 : Xq = X.astype(float16), scales None
+      int8    : satır başına ölçek = max|x| / 127, Xq = round(x / ölçek) (skor = Xq·q × ölçek)
+    """
+    X = np.asarray(X, dtype=np.float32)
+    if mode == "float16":
+        return X.astype(np.float16), None
+    if mode == "int8":
+        scales = np.abs(X).max(axis=1) / 127.0 if X.shape[0] else np.empty(0, np.float32)
+        scales = np.where(scales > 0, scales, 1.0).astype(np.float32)
+        Xq = np.clip(np.rint(X / scales[:, None]), -127, 127).astype(np.int8)
+        return Xq, scales
+    raise ValueError(f"Bilinmeyen sıkıştırma: {mode}")
+
+
+def topk_inner(X, Q, k: int, mask: Optional[np.ndarray] = None,
+               chunk: Optional[int] = None,
+               scales: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Kaba kuvvet (tam) top-k: normlanmış X (N,d) ile normlanmış Q (nq,d) arasında
+    iç çarpım = kosinüs. X yoğun (ndarray / np.memmap; float32, float16 ya da
+    int8 + satır ölçekleri `scales`) ya da CSR olabilir.
+
+    - X satırları `chunk`'lık dilimlerle taranır: bellek (nq × chunk) skorla sınırlı,
+      memmap'te yalnızca o dilimin sayfaları okunur.
+    - mask (N,) bool: False olan satırlar elenir (etiket filtresi / silinmiş satır).
+    Dönen: (S (nq,k), I (nq,k)) skora göre azalan; yetersiz aday varsa I=-1, S=-inf.
+    """
+    N = int(X.shape[0])
+    nq = int(Q.shape[0])
+    k = max(0, min(int(k), N))
+    chunk = int(chunk or SEARCH_CHUNK)
+    buf = None
+    if not sp.issparse(X) and X.dtype != np.float32:
+        chunk = min(chunk, QUANT_CHUNK)
+        buf = np.empty((chunk, X.shape[1]), dtype=np.float32)
+    best_s = np.full((nq, 0), -np.inf, dtype=np.float32)
+    best_i = np.empty((nq, 0), dtype=np.int64)
+    if k == 0 or nq == 0:
+        return best_s, best_i
+
+    for start in range(0, N, chunk):
+        stop = min(N, start + chunk)
+        Xc = X[start:stop]
+        if sp.issparse(Xc):
+            S = (Xc @ Q.T).T
+            S = S.toarray() if sp.issparse(S) else np.asarray(S)
+        elif buf is not None:
+            Xf = buf[:stop - start]
+            np.copyto(Xf, Xc, casting="unsafe")
+            S = Q @ Xf.T
+        else:
+            S = Q @ np.asarray(Xc, dtype=np.float32).T
+        S = S.astype(np.float32, copy=False)
+        if scales is not None:
+            S *= scales[start:stop]
+        if mask is not None:
+            m = mask[start:stop]
+            if not m.any():
+                continue
+            S[:, ~m] = -np.inf
+        kk = min(k, S.shape[1])
+        if kk < S.shape[1]:
+            part = np.argpartition(-S, kk - 1, axis=1)[:, :kk]
+        else:
+            part = np.broadcast_to(np.arange(S.shape[1]), S.shape)
+        best_s = np.concatenate([best_s, np.take_along_axis(S, part, axis=1)], axis=1)
+        best_i = np.concatenate([best_i, part + start], axis=1)
+        if best_s.shape[1] > k:
+            keep = np.argpartition(-best_s, k - 1, axis=1)[:, :k]
+            best_s = np.take_along_axis(best_s, keep, axis=1)
+            best_i = np.take_along_axis(best_i, keep, axis=1)
+
+    order = np.argsort(-best_s, axis=1, kind="stable")
+    best_s = np.take_along_axis(best_s, order, axis=1)
+    best_i = np.take_along_axis(best_i, order, axis=1)
+    best_i[~np.isfinite(best_s)] = -1
+    return best_s, best_i
+
+
 class EmbIndex:
     """
     Metinleri embed edip yakın komşu araması yapar.
-    FAISS varsa onu, yoksa sklearn KNN kullanır.
+    FAISS varsa (USE_FAISS=1) onu, yoksa NumPy ile tam arama (topk_inner:
+    tek matris çarpımı + argpartition) kullanır. quant="float16"/"int8" ile
+    adaylar sıkıştırılmış matriste taranır, ilk k×RERANK_FACTOR aday float32
+    satırlarla (mmap) yeniden skorlanır. fit'e seyrek (CSR, TF-IDF)
+    matris verilirse yoğunlaştırmadan seyrek nokta çarpımıyla arar (sparse=True).
+
+    search_many() (Q, dim) sorguyu tek seferde arar; labels=[...] verilirse
+    yalnızca o etiketlerin bölümleri (partition) taranır. Storage satırları
+    etikete göre gruplu yazar; bu durumda her bölüm mmap üzerinde kopyasız
+    bir dilimdir (aksi halde satır listesiyle toplanır).
+
+    Artımlı güncelleme: apply_changes() ana matrise dokunmadan küçük bir
+    delta segmenti tutar; değişen/silinen ana satırlar "ölü" (tombstone)
+    işaretlenir ve aramada elenir. Sıkıştırma Storage.compact() ile yapılır.
     """
-    def __init__(self, dim: int, use_faiss: bool = False):
+    def __init__(self, dim: int, use_faiss: bool = False, sparse: bool = False,
+                 quant: Optional[str] = None):
         self.dim = int(dim)
-        self.use_faiss = bool(use_faiss and (faiss is not None))
+        self.sparse = bool(sparse)
+        self.use_faiss = bool(use_faiss and (faiss is not None)) and not self.sparse
+        self.quant = quant if (quant in QUANT_MODES and not self.sparse) else None
         self.ids: List[int] = []
         self.texts: List[str] = []
         self.labels: List[str] = []
         self._X: Optional[np.ndarray] = None
+        self._Xq: Optional[np.ndarray] = None          # sıkıştırılmış kopya (quant)
+        self._q_scales: Optional[np.ndarray] = None    # int8 satır ölçekleri
+
+        # Delta segmenti (X, ids, texts, labels) ve geçersiz ana satır id'leri.
+        # Tek atamayla değiştirilir: eşzamanlı aramalar tutarlı bir görüntü okur.
+        self._delta: Optional[Tuple[Any, List[int], List[str], List[str]]] = None
+        self._dead: frozenset = frozenset()
+        self._dead_mask: Optional[np.ndarray] = None
+        self._base_ids: Optional[frozenset] = None
+        self._parts: Optional[Dict[str, Any]] = None  # etiket -> slice | satır dizisi
 
         if self.use_faiss:
             # cosine ~ inner product (normlanmış vektörler)
             self.index = faiss.IndexFlatIP(self.dim)
         else:
-            self.index = NearestNeighbors(n_neighbors=10, metric="cosine")
+            self.index = None  # NumPy / CSR matris üzerinde doğrudan skor
+
+    @property
+    def backend(self) -> str:
+        return "sparse" if self.sparse else ("faiss" if self.use_faiss else "numpy")
+
+    def _reset_state(self) -> None:
+        self._delta, self._dead, self._dead_mask = None, frozenset(), None
+        self._base_ids, self._parts = None, None
 
     def fit(self, X: np.ndarray, ids: List[int], texts: List[str], labels: List[str]):
         if X.ndim != 2 or X.shape[1] != self.dim:
             raise ValueError(f"Boyut uyuşmazlığı: beklenen {self.dim}, gelen {X.shape}")
         self.ids, self.texts, self.labels = list(ids), list(texts), list(labels)
-        X = _l2_normalize(X.astype("float32"))
+        self._reset_state()
+        if self.sparse or sp.issparse(X):
+            if not self.sparse:
+                # seyrek girdi: yoğun arka ucu bırak
+                self.sparse, self.use_faiss, self.index, self.quant = True, False, None, None
+            self._X = _l2_normalize_sparse(X)
+            return
+        self._X = _l2_normalize(X.astype("float32"))
+        if self.quant:
+            self._Xq, self._q_scales = quantize_rows(self._X, self.quant)
         if self.use_faiss:
-            self.index.add(X)
-        else:
-            self._X = X
-            self.index.fit(X)
+            self.index.add(self._X)
 
-    def search(self, q: np.ndarray, k: int = 5) -> List[Tuple[int, float]]:
-        if q.ndim == 1:
-            q = q.reshape(1, -1)
-        q = _l2_normalize(q.astype("float32"))
+    def load_normalized(self, X, ids, texts, labels,
+                        quantized: Optional[Tuple[np.ndarray, Optional[np.ndarray]]] = None) -> None:
+        """
+        Diskten gelen, önceden L2-normlanmış matrisi kopyalamadan bağlar
+        (yoğun: np.memmap, seyrek: CSR). Storage.load_index kullanır.
+        quantized: (Xq, scales) — quant modunda aday taraması için (mmap).
+        """
+        self.ids, self.texts, self.labels = ids, texts, labels
+        self._X = X
+        if self.quant:
+            if quantized is None:
+                quantized = quantize_rows(np.asarray(X), self.quant)
+            self._Xq, self._q_scales = quantized
+        self._reset_state()
         if self.use_faiss:
-            D, I = self.index.search(q, k)  # (1,k)
-            out: List[Tuple[int, float]] = []
-            for j in range(I.shape[1]):
-                i = int(I[0, j])
-                if i == -1:
-                    continue
-                out.append((int(self.ids[i]), float(D[0, j])))
-            return out
+            self.index.add(np.ascontiguousarray(X, dtype=np.float32))
+
+    # ---------- Artımlı güncelleme ----------
+    def _normalize_rows(self, X):
+        if self.sparse or sp.issparse(X):
+            return _l2_normalize_sparse(X)
+        return _l2_normalize(np.asarray(X, dtype=np.float32))
+
+    def base_ids(self) -> frozenset:
+        if self._base_ids is None:
+            self._base_ids = frozenset(int(x) for x in self.ids)
+        return self._base_ids
+
+    def delta_size(self) -> int:
+        return len(self._delta[1]) if self._delta else 0
+
+    def has_changes(self) -> bool:
+        return bool(self._dead) or self.delta_size() > 0
+
+    def apply_changes(self, X, ids: List[int], texts: List[str], labels: List[str],
+                      deleted: List[int] = (), normalized: bool = False) -> None:
+        """
+        ids satırlarını ekler/değiştirir (X: bu satırların vektörleri), deleted'i siler.
+        Yalnızca verilen satırlar işlenir; ana matris yeniden kurulmaz.
+        """
+        ids = [int(x) for x in ids]
+        changed = set(ids) | {int(x) for x in deleted}
+        if not changed:
+            return
+        old = self._delta
+        parts, d_ids, d_texts, d_labels = [], [], [], []
+        if old is not None:
+            keep = [i for i, rid in enumerate(old[1]) if rid not in changed]
+            if keep:
+                parts.append(old[0][keep])
+                d_ids += [old[1][i] for i in keep]
+                d_texts += [old[2][i] for i in keep]
+                d_labels += [old[3][i] for i in keep]
+        if ids:
+            parts.append(X if normalized else self._normalize_rows(X))
+            d_ids += ids
+            d_texts += list(texts)
+            d_labels += list(labels)
+
+        if parts:
+            Xd = sp.vstack(parts, format="csr") if self.sparse else np.vstack(parts).astype(np.float32)
+            new_delta = (Xd, d_ids, d_texts, d_labels)
         else:
-            k = min(k, len(self.ids)) if self.ids else 0
-            if k == 0:
-                return []
-            dist, idx = self.index.kneighbors(q, n_neighbors=k)
-            sim = 1.0 - dist[0]  # cosine distance -> similarity
-            return [(int(self.ids[int(i)]), float(sim[j])) for j, i in enumerate(idx[0])]
+            new_delta = None
+        dead = frozenset(self._dead | (changed & self.base_ids()))
+        dead_mask = None
+        if dead:
+            dead_mask = ~np.isin(np.asarray(self.ids, dtype=np.int64),
+                                 np.fromiter(dead, dtype=np.int64, count=len(dead)))
+        self._delta, self._dead, self._dead_mask = new_delta, dead, dead_mask
+
+    def merged(self) -> Tuple[Any, List[int], List[str], List[str]]:
+        """Ana + delta (ölü satırlar hariç) birleşik görünüm — kaydetme/sıkıştırma için."""
+        dead, delta = self._dead, self._delta
+        alive = [i for i, rid in enumerate(self.ids) if int(rid) not in dead]
+        X = self._X[alive] if self._X is not None else None
+        ids = [int(self.ids[i]) for i in alive]
+        texts = [self.texts[i] for i in alive]
+        labels = [self.labels[i] for i in alive]
+        if delta is not None:
+            X = delta[0] if X is None else (
+                sp.vstack([X, delta[0]], format="csr") if self.sparse
+                else np.vstack([np.asarray(X), delta[0]])
+            )
+            ids += delta[1]
+            texts += delta[2]
+            labels += delta[3]
+        return X, ids, texts, labels
+
+    # ---------- Arama ----------
+    def _prep_queries(self, Q):
+        if self.sparse:
+            return _l2_normalize_sparse(Q if sp.issparse(Q) else np.atleast_2d(Q))
+        if sp.issparse(Q):
+            Q = Q.toarray()
+        return _l2_normalize(np.atleast_2d(np.asarray(Q, dtype=np.float32)))
+
+    def partitions(self) -> Dict[str, Any]:
+        """Etiket -> ana matristeki satırları (bitişikse slice, değilse int64 dizi)."""
+        if self._parts is None:
+            parts: Dict[str, Any] = {}
+            if len(self.labels):
+                names, inv = np.unique(np.asarray(list(self.labels), dtype=object), return_inverse=True)
+                order = np.argsort(inv, kind="stable")
+                bounds = np.cumsum(np.bincount(inv, minlength=len(names)))
+                start = 0
+                for j, name in enumerate(names):
+                    rows = order[start:bounds[j]]
+                    start = int(bounds[j])
+                    lo, hi = int(rows[0]), int(rows[-1]) + 1
+                    parts[str(name)] = slice(lo, hi) if hi - lo == rows.shape[0] else rows
+            self._parts = parts
+        return self._parts
+
+    def label_names(self) -> List[str]:
+        """Ana + delta segmentindeki etiketler."""
+        names = dict.fromkeys(self.partitions())
+        if self._delta is not None:
+            names.update(dict.fromkeys(self._delta[3]))
+        return list(names)
+
+    def has_label(self, label: str) -> bool:
+        return label in self.partitions() or (self._delta is not None and label in self._delta[3])
+
+    def search(self, q: np.ndarray, k: int = 5,
+               labels: Optional[List[str]] = None) -> List[Tuple[int, float]]:
+        """Tek sorgu: [(id, skor), ...] (q (dim,) ya da (1, dim))."""
+        res = self.search_many(q, k=k, labels=labels)
+        return res[0] if res else []
+
+    def search_many(self, Q, k: int = 5,
+                    labels: Optional[List[str]] = None) -> List[List[Tuple[int, float]]]:
+        """
+        Toplu arama: Q (nq, dim) -> nq adet [(id, skor), ...] (en fazla k).
+        labels verilirse yalnızca bu etiketlerdeki satırlar aranır.
+        """
+        Q = self._prep_queries(Q)
+        dead_mask, delta = self._dead_mask, self._delta
+        out = self._search_base(Q, k, labels=labels, dead_mask=dead_mask)
+        if delta is not None:
+            Xd, d_ids, _, d_labels = delta
+            mask = None
+            if labels is not None:
+                wanted = set(labels)
+                mask = np.fromiter((lab in wanted for lab in d_labels), dtype=bool, count=len(d_labels))
+            S, I = topk_inner(Xd, Q, k, mask=mask)
+            for qi, hits in enumerate(out):
+                hits += [(int(d_ids[int(i)]), float(s)) for s, i in zip(S[qi], I[qi]) if i >= 0]
+                hits.sort(key=lambda h: -h[1])
+                del hits[k:]
+        return out
+
+    def _search_base(self, Q, k: int, labels: Optional[List[str]] = None,
+                     dead_mask: Optional[np.ndarray] = None) -> List[List[Tuple[int, float]]]:
+        nq = int(Q.shape[0])
+        if self._X is None or len(self.ids) == 0:
+            return [[] for _ in range(nq)]
+
+        if labels is None:
+            D, I = self._scan(Q, k, None, dead_mask)
+        else:
+            parts = self.partitions()
+            found = [parts[lab] for lab in dict.fromkeys(labels) if lab in parts]
+            if not found:
+                return [[] for _ in range(nq)]
+            res = [self._scan(Q, k, sel, dead_mask) for sel in found]
+            D = np.concatenate([r[0] for r in res], axis=1)
+            I = np.concatenate([r[1] for r in res], axis=1)
+            if len(res) > 1:
+                order = np.argsort(-D, axis=1, kind="stable")[:, :int(k)]
+                D = np.take_along_axis(D, order, axis=1)
+                I = np.take_along_axis(I, order, axis=1)
+
+        ids = self.ids
+        return [
+            [(int(ids[int(i)]), float(d)) for d, i in zip(D[qi], I[qi]) if i >= 0]
+            for qi in range(nq)
+        ]
+
+    def _scan(self, Q, k: int, sel, dead_mask: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        sel (None: tüm matris, slice ya da satır dizisi) içindeki satırlarda top-k.
+        Dönen I ana matris satır numarasıdır (-1: yok).
+        """
+        X, Xq, scales, mask = self._X, self._Xq, self._q_scales, dead_mask
+        if sel is not None:
+            X = X[sel]
+            Xq = Xq[sel] if Xq is not None else None
+            scales = scales[sel] if scales is not None else None
+            mask = mask[sel] if mask is not None else None
+
+        if self.use_faiss and sel is None and mask is None:
+            D, I = self.index.search(Q, min(int(k), len(self.ids)))
+        elif Xq is not None:
+            _, cand = topk_inner(Xq, Q, int(k) * max(RERANK_FACTOR, 1), mask=mask, scales=scales)
+            D, I = self._rerank(Q, cand, k, X)
+        else:
+            D, I = topk_inner(X, Q, k, mask=mask)
+
+        if sel is not None and I.size:
+            rows = np.arange(sel.start, sel.stop) if isinstance(sel, slice) else sel
+            I = np.where(I >= 0, rows[np.maximum(I, 0)], -1)
+        return D, I
+
+    def _rerank(self, Q: np.ndarray, cand: np.ndarray, k: int, X) -> Tuple[np.ndarray, np.ndarray]:
+        """Aday satırları (nq, c) float32 X'ten (mmap) okuyup tam skorla ilk k'yı seçer."""
+        valid = cand >= 0
+        uniq = np.unique(cand[valid])  # artan sıra: mmap'ten sıralı okuma
+        if uniq.size == 0:
+            return (np.full((Q.shape[0], 0), -np.inf, dtype=np.float32),
+                    np.empty((Q.shape[0], 0), dtype=np.int64))
+        exact = Q @ np.asarray(X[uniq], dtype=np.float32).T              # (nq, u)
+        pos = np.searchsorted(uniq, np.where(valid, cand, uniq[0]))
+        S = np.take_along_axis(exact, pos, axis=1)
+        S[~valid] = -np.inf
+        order = np.argsort(-S, axis=1, kind="stable")[:, :min(int(k), S.shape[1])]
+        S = np.take_along_axis(S, order, axis=1)
+        I = np.take_along_axis(cand, order, axis=1)
+        I[~np.isfinite(S)] = -1
+        return S, I
 
 
 class LocalEncoder:
     """
     Öncelik: SentenceTransformer. Yoksa TF-IDF fallback.
+    backend="tfidf" verilirse (indeks TF-IDF ile kurulduysa) SBERT hiç yüklenmez.
     """
-    def __init__(self, model_name: str = MODEL_NAME):
+    def __init__(self, model_name: str = MODEL_NAME, backend: Optional[str] = None):
         self.model_name = model_name
         self.st_model: Optional[_SentenceTransformer] = None  # <-- TYPE_CHECKING uyumlu
         self.tfidf: Optional[TfidfVectorizer] = None
         self.tfidf_fit = False
 
         # runtime'da varsa SBERT modelini dene
-        if SentenceTransformer is not None:
+        if SentenceTransformer is not None and backend != "tfidf":
             try:
                 self.st_model = SentenceTransformer(model_name)  # type: ignore[call-arg,assignment]
             except Exception:
@@ -255,20 +614,64 @@ class LocalEncoder:
             return int(len(self.tfidf.get_feature_names_out()))
         return 1024  # fit edilmeden önce yaklaşık
 
+    @property
+    def backend(self) -> str:
+        return "sentence-transformers" if self.st_model is not None else "tfidf"
+
+    @property
+    def lowercase(self) -> bool:
+        """
+        Encoder girdiyi küçük harfe katlıyor mu: TF-IDF (lowercase=True) evet;
+        SBERT'te tokenizer'ın do_lower_case bayrağı (bilinmiyorsa büyük/küçük harf duyarlı).
+        """
+        if self.st_model is None:
+            return True
+        tok = getattr(self.st_model, "tokenizer", None)
+        flag = getattr(tok, "do_lower_case", None)
+        if flag is None:
+            flag = (getattr(tok, "init_kwargs", None) or {}).get("do_lower_case")
+        return bool(flag)
+
     def fit_tfidf(self, corpus: List[str]):
         if self.tfidf is None:
             return
         _ = self.tfidf.fit_transform(corpus)
         self.tfidf_fit = True
 
-    def encode(self, texts: List[str]) -> np.ndarray:
+    def tfidf_state(self) -> Optional[Tuple[List[str], np.ndarray]]:
+        """Fit edilmiş TF-IDF sözlüğü (indeks sırasına göre terimler) ve IDF ağırlıkları."""
+        if self.tfidf is None or not self.tfidf_fit:
+            return None
+        terms = [str(t) for t in self.tfidf.get_feature_names_out()]
+        return terms, np.asarray(self.tfidf.idf_, dtype=np.float64)
+
+    def set_tfidf_state(self, terms: List[str], idf: np.ndarray) -> None:
+        """Kaydedilmiş sözlük + IDF'i yükler; sorgular yeniden fit edilmeden indeks uzayında kodlanır."""
+        if self.tfidf is None:
+            return
+        if len(terms) != len(idf):
+            raise ValueError(f"TF-IDF sözlük/IDF uzunluğu uyuşmuyor: {len(terms)} != {len(idf)}")
+        self.tfidf.vocabulary_ = {t: i for i, t in enumerate(terms)}
+        self.tfidf.idf_ = np.asarray(idf, dtype=np.float64)
+        self.tfidf_fit = True
+
+    def encode(self, texts: List[str], sparse: bool = False,
+               batch_size: Optional[int] = None) -> np.ndarray:
+        """
+        sparse=True ve TF-IDF modunda CSR (float32) döner — 50k özellikli matris
+        yoğunlaştırılmaz. SBERT modunda her zaman yoğun; ileri geçiş
+        batch_size (varsayılan AI_ENCODE_BATCH) metinlik gruplarla yapılır.
+        """
         if self.st_model is not None:
-            # not: batch_size ayarlanabilir (örn. 512) — burada varsayılan kalsın
-            vecs = self.st_model.encode(texts, convert_to_numpy=True, normalize_embeddings=False)  # type: ignore[call-arg]
+            vecs = self.st_model.encode(texts, batch_size=int(batch_size or ENCODE_BATCH),  # type: ignore[call-arg]
+                                        convert_to_numpy=True, normalize_embeddings=False,
+                                        show_progress_bar=False)
             return vecs.astype("float32")
         if not self.tfidf_fit:
             self.fit_tfidf(texts)
         X = self.tfidf.transform(texts)  # type: ignore[union-attr]
+        if sparse:
+            return X.astype(np.float32).tocsr()
         return X.toarray().astype("float32")
 
 
@@ -283,6 +686,74 @@ class MetaItem:
     extra: Dict[str, Any]
 
 
+class SearchCache:
+    """
+    Thread-güvenli LRU + TTL. Değerler arama sonucu listeleridir; çağıranlar
+    sonuçları değiştirebildiği için hem yazarken hem okurken kopyalanır.
+    """
+    def __init__(self, size: int = SEARCH_CACHE_SIZE, ttl: float = SEARCH_CACHE_TTL):
+        self.size = max(int(size), 0)
+        self.ttl = float(ttl)
+        self._data: "OrderedDict[Tuple, Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expired = 0
+
+    @staticmethod
+    def normalize(text: str, lower: bool = False) -> str:
+        """
+        NFC + boşluk sadeleştirme. lower=True yalnızca encoder da küçük harfe
+        katlıyorsa (encoder.lowercase) verilir; büyük/küçük harf duyarlı modelde
+        "ÇED" ile "çed" ayrı anahtardır.
+        """
+        text = " ".join(unicodedata.normalize("NFC", text or "").split())
+        return text.lower() if lower else text
+
+    def get(self, key: Tuple) -> Optional[List[Dict[str, Any]]]:
+        if not self.size:
+            return None
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            if self.ttl > 0 and item[0] < time.monotonic():
+                del self._data[key]
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+        return [dict(h) for h in item[1]]
+
+    def put(self, key: Tuple, value: List[Dict[str, Any]]) -> None:
+        if not self.size:
+            return
+        expires = time.monotonic() + self.ttl if self.ttl > 0 else float("inf")
+        with self._lock:
+            self._data[key] = (expires, [dict(h) for h in value])
+            self._data.move_to_end(key)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expired": self.expired,
+            "hit_rate": round(self.hits / total, 4) if total else None,
+        }
+
+
 class AILocal:
     """
     - risks / suggestions / paper_rule metinlerinden arama indeksi
@@ -290,10 +761,21 @@ class AILocal:
     """
     def __init__(self, enc: Optional[LocalEncoder] = None,
                  idx: Optional[EmbIndex] = None,
-                 meta: Optional[Dict[int, Dict]] = None):
+                 meta: Optional[Dict[int, Dict]] = None,
+                 lex: Any = None):
         self.enc = enc or LocalEncoder(MODEL_NAME)
         self.idx = idx
         self.meta = meta or {}  # {id: {text, label, ...}}
+        self.lex = lex          # lexical.BM25Index (idx ile aynı satırlar) ya da None
+        self.last_build_stats: Dict[str, Any] = {}  # build_from_tables kodlama raporu
+        self.version: Any = None  # yüklendiği indeksin storage.index_token() imzası
+        self.cache = SearchCache()
+        self._generation = 0      # bellek içi indeks değişiklik sayacı (önbellek anahtarına girer)
+
+    def invalidate_cache(self) -> None:
+        """İndeks yerinde değiştiğinde (build / artımlı güncelleme) çağrılır."""
+        self._generation += 1
+        self.cache.clear()
 
     # ---------- Persistence (Storage üzerinden) ----------
     @classmethod
@@ -302,18 +784,25 @@ class AILocal:
         st = Storage(data_dir)
         try:
             idx, meta = st.load_index()
-            enc = LocalEncoder(MODEL_NAME)
-            return cls(enc, idx, meta)
+            # AI_ENCODER_SOCKET: model paylaşılan servisteyse bu süreçte yüklenmez
+            from .encoder_service import connect_encoder
+            enc = connect_encoder(MODEL_NAME, backend=st.encoder_info().get("backend")) \
+                or st.load_encoder(MODEL_NAME)
         except Exception:
             # boş motor—kullanıcı build_from_tables çağıracak
             return cls(LocalEncoder(MODEL_NAME), None, {})
+        try:
+            lex = st.load_lexical(idx)
+        except Exception:
+            lex = None  # sözcüksel aşama opsiyonel: yalnızca vektör araması
+        return cls(enc, idx, meta, lex)
 
     def save(self, data_dir: str = DATA_DIR):
         from .storage import Storage
         if not self.idx or not self.meta:
             raise RuntimeError("Kaydedilecek indeks yok.")
         st = Storage(data_dir)
-        st.save_index(self.idx, self.meta)
+        st.save_index(self.idx, self.meta, encoder=self.enc)
 
     # ---------- Build / Rebuild ----------
     def ingest_paper_facts(self, facts: List[Dict[str, Any]]):
@@ -351,31 +840,68 @@ class AILocal:
         texts = [str(r["text"] or "") for r in rows]
         labels = [str(r.get("label", "")) for r in rows]
 
-        # TF-IDF ise önce fit
-        if self.enc.st_model is None:
+        # TF-IDF ise önce fit; seyrek kalır (yoğunlaştırma yok)
+        is_sparse = self.enc.backend == "tfidf"
+        if is_sparse:
             self.enc.fit_tfidf(texts)
-        X = self.enc.encode(texts)
+        from .emb_cache import encode_with_cache
+        X, self.last_build_stats = encode_with_cache(self.enc, texts, sparse=is_sparse)
         dim = X.shape[1]
         use_faiss = bool(int(os.getenv("USE_FAISS", "0")) == 1)
-        self.idx = EmbIndex(dim=dim, use_faiss=use_faiss)
+        self.idx = EmbIndex(dim=dim, use_faiss=use_faiss, sparse=is_sparse, quant=QUANT_MODE)
         self.idx.fit(X, ids, texts, labels)
+        from .lexical import BM25Index
+        self.lex = BM25Index.build(texts).bind(ids, labels)
         # meta
         self.meta = {int(r["id"]): {k: v for k, v in r.items() if k != "id"} for r in rows}
+        self.invalidate_cache()
 
     # ---------- Query ----------
-    def search(self, text: str, k: int = 5):
+    def search(self, text: str, k: int = 5, labels: Optional[List[str]] = None):
+        """
+        labels verilirse yalnızca o etiketlerin bölümlerinde arar (örn. ["paper_rule"]).
+        BM25 indeksi varsa (AI_HYBRID=1) vektör ve sözcüksel listeler RRF ile
+        birleştirilir; sıra RRF'e göredir. "score" her modda vektör benzerliğidir
+        (kosinüs; yalnızca BM25 ile gelen satırda 0.0), birleşik değer "rrf",
+        bileşenler "cosine" / "bm25" anahtarlarındadır.
+        Sonuçlar SearchCache'te tutulur; tekrar eden sorguda encoder çalışmaz.
+        """
         if not self.idx or not self.meta:
             return []
-        q = self.enc.encode([text])
-        hits = self.idx.search(q, k=k)
+        if labels is not None and not any(self.idx.has_label(lab) for lab in labels):
+            return []
+        key = (SearchCache.normalize(text, getattr(self.enc, "lowercase", False)), int(k),
+               tuple(sorted(labels)) if labels is not None else None,
+               self.version, self._generation)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        out = self._search(text, k, labels)
+        self.cache.put(key, out)
+        return out
+
+    def _search(self, text: str, k: int, labels: Optional[List[str]]):
+        hybrid = HYBRID_SEARCH and self.lex is not None
+        depth = max(int(k) * 4, 20) if hybrid else k
+        q = self.enc.encode([text], sparse=getattr(self.idx, "sparse", False))
+        vec = self.idx.search(q, k=depth, labels=labels)
+        if hybrid:
+            lex = self.lex.search(text, k=depth, labels=labels)
+            vec = [(rid, sc) for rid, sc in vec if sc > 0.0]  # benzerliği olmayan satır sıra puanı almasın
+            cos, bm25 = dict(vec), dict(lex)
+            hits = [(rid, cos.get(rid, 0.0), {"rrf": fused, "cosine": cos.get(rid), "bm25": bm25.get(rid)})
+                    for rid, fused in rrf_fuse([vec, lex], k, RRF_K)]
+        else:
+            hits = [(rid, score, {}) for rid, score in vec]
         out = []
-        for rid, score in hits:
+        for rid, score, parts in hits:
             m = self.meta.get(int(rid), {})
             out.append({
                 "id": int(rid),
                 "text": m.get("text", ""),
                 "label": m.get("label", ""),
                 "score": float(score),
+                **parts,
                 **{k: v for k, v in m.items() if k not in ("text", "label")}
             })
         return out
@@ -386,15 +912,21 @@ class AILocal:
           - "full": bölümlü detaylı çıktı
           - "mini": sade 3-5 madde (eko/ayraç yok)
         """
-        hits = self.search(prompt, k=k)
-        if not hits:
+        if not self.idx or not self.meta:
             return ""
 
-        # Basit label gruplama
-        parts = {"risk": [], "suggestion": [], "paper_rule": [], "other": []}
-        for h in hits:
-            lbl = h.get("label") or "other"
-            parts.get(lbl, parts["other"]).append(h)
+        # Etiket grupları ayrı bölümlerden aranır: karışık top-k'da bir grup
+        # (örn. paper_rule) kaybolmaz; toplamda her satır bir kez taranır.
+        parts: Dict[str, List[Dict[str, Any]]] = {"risk": [], "suggestion": [], "paper_rule": [], "other": []}
+        names = self.idx.label_names()
+        for grp in ("risk", "suggestion", "paper_rule"):
+            if grp in names:
+                parts[grp] = self.search(prompt, k=k, labels=[grp])
+        others = [lbl for lbl in names if lbl not in parts]
+        if others:
+            parts["other"] = self.search(prompt, k=k, labels=others)
+        if not any(parts.values()):
+            return ""
 
         if style == "mini":
             # yalnızca en anlamlı 3-5 madde, tekrarları azaltmak için kısa çeşitlendirme
@@ -441,3 +973,151 @@ class AILocal:
         body = "\n".join([s for s in sections if s])
 
         return body.strip() if body else ""
+
+
+# -------------------------------
+#  Süreç geneli motor (worker başına tek örnek)
+# -------------------------------
+# load_or_create() her çağrıda embeddings.npy + meta.json okur, KNN'i yeniden
+# fit eder ve SentenceTransformer'ı yeniden kurar. Worker başına tek örnek
+# tutulur; create_app() açılışta arka planda ısıtır.
+#
+# Sıcak yeniden yükleme: get_engine() en fazla RELOAD_CHECK_SECONDS'ta bir
+# storage.index_token()'ı yoklar (CURRENT + delta damgası). İmza değiştiyse
+# yeni indeks arka planda yüklenir ve tek atamayla devreye alınır; o sırada
+# süren aramalar ellerindeki eski motorla tamamlanır.
+RELOAD_CHECK_SECONDS = float(os.getenv("AI_RELOAD_CHECK", "5"))  # 0: kapalı
+
+_engine: Optional[AILocal] = None
+_engine_lock = threading.Lock()
+_last_check = 0.0
+_engine_status: Dict[str, Any] = {
+    "ready": False,
+    "loading": False,
+    "load_seconds": None,
+    "loaded_at": None,
+    "items": 0,
+    "encoder": None,
+    "encoder_remote": False,
+    "version": None,
+    "reloads": 0,
+    "error": None,
+}
+
+
+def _load_engine(data_dir: str, reload: bool = False) -> AILocal:
+    """
+    Kilit altında çağrılır: motoru yükler ve durum metriklerini doldurur.
+    reload=True iken yükleme başarısızsa eski motor yerinde kalır.
+    """
+    global _engine
+    from .storage import index_token
+    _engine_status.update(loading=True, error=None)
+    t0 = time.perf_counter()
+    token = index_token(data_dir)  # yüklemeden ÖNCE: arada yayın olursa tekrar yüklenir
+    try:
+        eng = AILocal.load_or_create(data_dir)
+        if eng.enc.backend != "tfidf":
+            # ilk gerçek sorguda model/tokenizer ısınması beklenmesin
+            eng.enc.encode(["ısınma"])
+        if reload and eng.idx is None and _engine is not None and _engine.idx is not None:
+            raise RuntimeError("Yeni indeks yüklenemedi")
+    except Exception as exc:
+        _engine_status.update(loading=False, error=str(exc))
+        if reload and _engine is not None:
+            _engine.version = token  # aynı sürümü her yoklamada yeniden denemeyelim
+            return _engine
+        # Güvenli fallback: boş indeksli basit motor
+        eng = AILocal()
+    eng.version = token
+    _engine = eng  # tek atama: süren aramalar eski nesneyle devam eder
+    _engine_status.update(
+        ready=True,
+        loading=False,
+        load_seconds=round(time.perf_counter() - t0, 3),
+        loaded_at=time.time(),
+        items=len(eng.meta),
+        encoder=eng.enc.backend,
+        encoder_remote=not isinstance(eng.enc, LocalEncoder),
+        version=token[0],
+    )
+    if reload:
+        _engine_status["reloads"] += 1
+    return eng
+
+
+def _reload_engine(data_dir: str, token: Any) -> None:
+    with _engine_lock:
+        if _engine is not None and _engine.version != token:
+            _load_engine(data_dir, reload=True)
+
+
+def _maybe_reload(eng: AILocal, data_dir: str) -> None:
+    """Hızlı yol: oran sınırlı imza kontrolü; değiştiyse arka planda yeniden yükle."""
+    global _last_check
+    if RELOAD_CHECK_SECONDS <= 0:
+        return
+    now = time.monotonic()
+    if now - _last_check < RELOAD_CHECK_SECONDS:
+        return
+    _last_check = now
+    from .storage import index_token
+    token = index_token(data_dir)
+    if token == eng.version or _engine_status.get("loading"):
+        return
+    threading.Thread(target=_reload_engine, args=(data_dir, token),
+                     name="ai-local-reload", daemon=True).start()
+
+
+def get_engine(data_dir: str = DATA_DIR) -> AILocal:
+    """
+    Worker'ın paylaşılan AILocal örneği. İlk çağrıda (ısınma bitmediyse)
+    yükleme tamamlanana kadar bekler; sonraki çağrılar kilitsiz döner ve
+    yayınlanan yeni indeksi arka planda devreye alır.
+    """
+    eng = _engine
+    if eng is not None:
+        _maybe_reload(eng, data_dir)
+        return eng
+    with _engine_lock:
+        if _engine is not None:
+            return _engine
+        return _load_engine(data_dir)
+
+
+def warmup_engine(data_dir: str = DATA_DIR, background: bool = True) -> None:
+    """Motoru önceden yükler (varsayılan: arka plan thread'i, açılışı bloklamaz)."""
+    if background:
+        threading.Thread(target=get_engine, args=(data_dir,),
+                         name="ai-local-warmup", daemon=True).start()
+    else:
+        get_engine(data_dir)
+
+
+def reset_engine() -> None:
+    """İndeks yeniden kurulduğunda: bir sonraki get_engine() diskten yeniden yükler."""
+    global _engine
+    with _engine_lock:
+        _engine = None
+        _engine_status.update(ready=False, loading=False)
+
+
+def engine_status() -> Dict[str, Any]:
+    """Hazır olma durumu + yükleme süresi + sorgu önbelleği sayaçları (health/izleme için)."""
+    status = dict(_engine_status)
+    eng = _engine
+    if eng is not None:
+        status["search_cache"] = eng.cache.stats()
+    return status
+
+
+def _reset_after_fork() -> None:
+    # gunicorn --preload: ebeveynde tutulan kilit/yarım yükleme çocukta kalmasın
+    global _engine_lock
+    _engine_lock = threading.Lock()
+    if _engine_status.get("loading"):
+        _engine_status.update(loading=False)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
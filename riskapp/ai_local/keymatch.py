@@ -0,0 +1,101 @@
+# riskapp/ai_local/keymatch.py
+# -*- coding: utf-8 -*-
+"""
+Derlenmiş çoklu anahtar kelime eşleyici (KEYSETS / RACI kuralları için).
+
+Eski yol her anahtar kümesi için metni yeniden normalize edip her kelimeyi
+ayrı ayrı `k in text` ile arıyordu (≈ küme sayısı × kelime sayısı tarama).
+KeywordMatcher tüm kelimelerden import anında tek bir regex kurar:
+
+  - kelimeler bir önek ağacına (trie) katlanır; ortak önekler bir kez denenir
+  - desen (?=(...)) ileri bakışına sarılır; finditer her konumda en uzun
+    kelimeyi yakalar, böylece iç içe / çakışan kelimeler de kaçmaz
+  - yakalanan kelimenin, aynı konumda başlayan tüm kelime öneklerinin
+    kümeleri birleştirilmiş olarak önceden tabloya yazılır
+
+Sonuç eski alt-dizgi (substring) anlamıyla birebir aynıdır; metin bir kez
+normalize edilir ve tek geçişte taranır. Anahtarlar tanım sırasıyla döner.
+"""
+from __future__ import annotations
+
+import re
+from typing import Callable, Dict, FrozenSet, Hashable, Iterable, List, Mapping, Optional, Tuple
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    """Kelimelerden önek ağacına göre katlanmış regex (uzun eşleşme önce denenir)."""
+    trie: Dict[str, dict] = {}
+    for w in words:
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node: Dict[str, dict]) -> str:
+        end = "" in node
+        alts = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        if end:
+            body = "(?:" + body + ")?" if len(alts) > 1 or len(alts[0]) > 1 else body + "?"
+        return body
+
+    return build(trie)
+
+
+class KeywordMatcher:
+    """
+    keysets   : {anahtar: [kelime, ...]} (sıra korunur)
+    normalize : metne ve kelimelere uygulanacak fonksiyon; None ise ham
+                (büyük/küçük harfe duyarlı) alt-dizgi araması yapılır
+    """
+    def __init__(self, keysets: Mapping[Hashable, Iterable[str]],
+                 normalize: Optional[Callable[[str], str]] = None):
+        self.normalize = normalize
+        self.keys: Tuple[Hashable, ...] = tuple(keysets)
+        self._rank = {k: i for i, k in enumerate(self.keys)}
+
+        owners: Dict[str, set] = {}
+        for key, words in keysets.items():
+            for w in words:
+                w = normalize(w) if normalize is not None else w
+                if w:
+                    owners.setdefault(w, set()).add(key)
+
+        # yakalanan (en uzun) kelime -> aynı konumdaki tüm önek kelimelerin anahtarları
+        self._hits: Dict[str, FrozenSet[Hashable]] = {}
+        for w in owners:
+            acc: set = set()
+            for i in range(1, len(w) + 1):
+                acc |= owners.get(w[:i], set())
+            self._hits[w] = frozenset(acc)
+
+        self._re = re.compile("(?=(" + _trie_pattern(owners) + "))") if owners else None
+
+    def __len__(self) -> int:
+        return len(self._hits)
+
+    def scan(self, text: str, normalized: bool = False) -> FrozenSet[Hashable]:
+        """Metinde en az bir kelimesi geçen anahtarlar (sırasız)."""
+        if not text or self._re is None:
+            return frozenset()
+        if not normalized and self.normalize is not None:
+            text = self.normalize(text)
+        found: set = set()
+        hits = self._hits
+        for m in self._re.finditer(text):
+            found |= hits[m.group(1)]
+            if len(found) == len(self.keys):
+                break
+        return frozenset(found)
+
+    def match(self, text: str, normalized: bool = False) -> List[Hashable]:
+        """Eşleşen anahtarlar, keysets'teki tanım sırasıyla."""
+        found = self.scan(text, normalized)
+        return sorted(found, key=self._rank.__getitem__)
+
+    def first(self, text: str, normalized: bool = False) -> Optional[Hashable]:
+        """Tanım sırasına göre ilk eşleşen anahtar (yoksa None)."""
+        found = self.scan(text, normalized)
+        return min(found, key=self._rank.__getitem__) if found else None
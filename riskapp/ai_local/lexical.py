@@ -0,0 +1,192 @@
+# riskapp/ai_local/lexical.py
+# -*- coding: utf-8 -*-
+"""
+BM25 ters indeks (sözcüksel arama).
+
+Metinler sentence_bank._norm ile katlanır (ç->c, ı/İ->i, küçük harf, boşluk
+sadeleştirme); böylece "ÇED", "çed", "CED" ve "kazık"/"kazik" aynı terime düşer.
+MiniLM'in zayıf kaldığı teknik terimler (WPS/PQR, hakediş, kazık) tam eşleşir
+ve sentence-transformers olmadan da çalışan hızlı bir ilk aşama sağlar.
+
+Ağırlıklar kurulumda hesaplanıp (doküman × terim) CSC matriste tutulur:
+  w(d,t) = idf(t) · tf·(k1+1) / (tf + k1·(1 - b + b·|d|/avgdl))
+Sorgu skoru yalnızca sorgu terimlerinin sütunları (posting listeleri) toplanarak
+bulunur. Satır sırası EmbIndex'in ana matrisiyle aynıdır (Storage._write_v2).
+Artımlı değişiklikler EmbIndex'teki gibi küçük bir delta + ölü satırlarla tutulur.
+"""
+from __future__ import annotations
+
+import os
+import re
+import json
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+
+from .sentence_bank import _norm
+
+BM25_K1 = float(os.getenv("AI_BM25_K1", "1.2"))
+BM25_B = float(os.getenv("AI_BM25_B", "0.75"))
+
+LEX_MATRIX_NAME = "bm25.npz"        # (N, V) CSC float32 BM25 ağırlıkları
+LEX_VOCAB_NAME  = "bm25_vocab.json" # {terms: [...], idf: [...], avgdl, k1, b}
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Türkçe katlanmış terimler; tek harfli parçalar (sayılar hariç) atılır."""
+    return [t for t in _TOKEN_RE.findall(_norm(text)) if len(t) > 1 or t.isdigit()]
+
+
+class BM25Index:
+    def __init__(self, W: sp.csc_matrix, terms: List[str], idf: np.ndarray, avgdl: float,
+                 k1: float = BM25_K1, b: float = BM25_B):
+        self.W = W
+        self.terms = terms
+        self.vocab: Dict[str, int] = {t: i for i, t in enumerate(terms)}
+        self.idf = np.asarray(idf, dtype=np.float32)
+        self.avgdl = float(avgdl) or 1.0
+        self.k1, self.b = float(k1), float(b)
+        self.n_docs = int(W.shape[0])
+        self._idf_unseen = float(np.log(1.0 + (self.n_docs + 0.5) / 0.5))
+        self.ids: Sequence[int] = []
+        self.labels: Sequence[str] = []
+        # artımlı: id -> (terim sayıları, uzunluk, etiket); ölü ana satır maskesi
+        self._delta: Dict[int, Tuple[Counter, int, str]] = {}
+        self._dead: frozenset = frozenset()
+        self._alive: Optional[np.ndarray] = None
+        self._base_ids: Optional[frozenset] = None
+
+    # ---------- Kurulum / kalıcılık ----------
+    @classmethod
+    def build(cls, texts: Iterable[str], k1: float = BM25_K1, b: float = BM25_B) -> "BM25Index":
+        # posting'ler tipli dizilerde birikir (100k doküman × ~30 terim: int listesine göre ~4x az bellek)
+        vocab: Dict[str, int] = {}
+        rows, cols, tfs, lengths = array("q"), array("q"), array("f"), array("q")
+        for i, text in enumerate(texts):
+            toks = tokenize(text)
+            lengths.append(len(toks))
+            for term, n in Counter(toks).items():
+                rows.append(i)
+                cols.append(vocab.setdefault(term, len(vocab)))
+                tfs.append(n)
+        n_docs, n_terms = len(lengths), len(vocab)
+        dl = np.frombuffer(lengths, dtype=np.int64).astype(np.float32)
+        avgdl = float(dl.mean()) if n_docs and dl.mean() > 0 else 1.0
+        r = np.frombuffer(rows, dtype=np.int64)
+        c = np.frombuffer(cols, dtype=np.int64)
+        tf = np.frombuffer(tfs, dtype=np.float32)
+        df = np.bincount(c, minlength=n_terms).astype(np.float32)
+        idf = np.log(1.0 + (n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        w = idf[c] * tf * (k1 + 1) / (tf + k1 * (1 - b + b * dl[r] / avgdl)) if r.size else tf
+        W = sp.csc_matrix((w.astype(np.float32), (r, c)), shape=(n_docs, n_terms))
+        terms = [""] * n_terms
+        for t, j in vocab.items():
+            terms[j] = t
+        return cls(W, terms, idf, avgdl, k1, b)
+
+    def save(self, directory: str) -> None:
+        from .storage import _save_npz, _save_json  # atomik yazım
+        _save_npz(os.path.join(directory, LEX_MATRIX_NAME), self.W.tocsc())
+        _save_json(os.path.join(directory, LEX_VOCAB_NAME), {
+            "terms": self.terms, "idf": self.idf.tolist(),
+            "avgdl": self.avgdl, "k1": self.k1, "b": self.b,
+        })
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["BM25Index"]:
+        mpath = os.path.join(directory, LEX_MATRIX_NAME)
+        vpath = os.path.join(directory, LEX_VOCAB_NAME)
+        if not (os.path.exists(mpath) and os.path.exists(vpath)):
+            return None
+        with open(vpath, "r", encoding="utf-8") as f:
+            info = json.load(f) or {}
+        W = sp.load_npz(mpath).tocsc()
+        return cls(W, list(info.get("terms") or []), np.asarray(info.get("idf") or [], dtype=np.float32),
+                   float(info.get("avgdl") or 1.0), float(info.get("k1", BM25_K1)), float(info.get("b", BM25_B)))
+
+    def bind(self, ids: Sequence[int], labels: Sequence[str]) -> "BM25Index":
+        """Satır -> id / etiket eşlemesi (EmbIndex ile aynı sıra)."""
+        if len(ids) != self.n_docs:
+            raise ValueError(f"BM25 satır sayısı ({self.n_docs}) ile id sayısı ({len(ids)}) uyuşmuyor.")
+        self.ids, self.labels = ids, labels
+        self._base_ids = None
+        return self
+
+    # ---------- Artımlı güncelleme ----------
+    def apply_changes(self, ids: List[int], texts: List[str], labels: List[str],
+                      deleted: Iterable[int] = ()) -> None:
+        ids = [int(x) for x in ids]
+        changed = set(ids) | {int(x) for x in deleted}
+        if not changed:
+            return
+        delta = {rid: v for rid, v in self._delta.items() if rid not in changed}
+        for rid, text, lab in zip(ids, texts, labels):
+            toks = tokenize(text)
+            delta[rid] = (Counter(toks), len(toks), str(lab))
+        if self._base_ids is None:
+            self._base_ids = frozenset(int(x) for x in self.ids)
+        dead = frozenset(self._dead | (changed & self._base_ids))
+        alive = None
+        if dead:
+            alive = ~np.isin(np.asarray(self.ids, dtype=np.int64),
+                             np.fromiter(dead, dtype=np.int64, count=len(dead)))
+        self._delta, self._dead, self._alive = delta, dead, alive
+
+    # ---------- Arama ----------
+    def search(self, text: str, k: int = 5, labels: Optional[List[str]] = None) -> List[Tuple[int, float]]:
+        """[(id, bm25), ...] skora göre azalan; eşleşmeyen dokümanlar dönmez."""
+        q_terms = set(tokenize(text))
+        if not q_terms or k <= 0:
+            return []
+        wanted = set(labels) if labels is not None else None
+        hits: List[Tuple[int, float]] = []
+
+        cols = [self.vocab[t] for t in q_terms if t in self.vocab]
+        if cols and self.n_docs:
+            sub = self.W[:, cols].tocoo()
+            rows, inv = np.unique(sub.row, return_inverse=True)  # yalnızca posting'i olan satırlar
+            scores = np.bincount(inv, weights=sub.data).astype(np.float32)
+            keep = np.ones(rows.shape[0], dtype=bool)
+            if self._alive is not None:
+                keep &= self._alive[rows]
+            if wanted is not None:
+                keep &= np.fromiter((self.labels[int(i)] in wanted for i in rows), dtype=bool, count=rows.shape[0])
+            rows, scores = rows[keep], scores[keep]
+            if rows.size:
+                kk = min(int(k), rows.size)
+                top = np.argpartition(-scores, kk - 1)[:kk]
+                hits = [(int(self.ids[int(rows[i])]), float(scores[i])) for i in top]
+
+        for rid, (tf, dl, lab) in self._delta.items():
+            if wanted is not None and lab not in wanted:
+                continue
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * dl / self.avgdl)
+            for t in q_terms:
+                n = tf.get(t)
+                if n:
+                    j = self.vocab.get(t)
+                    idf = float(self.idf[j]) if j is not None else self._idf_unseen
+                    score += idf * n * (self.k1 + 1) / (n + norm)
+            if score > 0:
+                hits.append((rid, score))
+
+        hits.sort(key=lambda h: -h[1])
+        return hits[:k]
+
+
+def rrf_fuse(rankings: List[List[Tuple[int, float]]], k: int, k0: int = 60) -> List[Tuple[int, float]]:
+    """
+    Reciprocal-rank fusion: skor(d) = Σ 1 / (k0 + sıra). Skor ölçekleri farklı
+    (kosinüs / BM25) listeleri yalnızca sıralarıyla birleştirir.
+    """
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, (rid, _) in enumerate(ranking, 1):
+            fused[rid] = fused.get(rid, 0.0) + 1.0 / (k0 + rank)
+    return sorted(fused.items(), key=lambda h: -h[1])[:k]
@@ -0,0 +1,163 @@
+# riskapp/ai_local/paper_rules.py
+# -*- coding: utf-8 -*-
+"""
+Makale tabanlı manuel kurallar (commenter._paper_rule_summaries) için tablo
+güdümlü kural motoru.
+
+Kurallar koddan ayrı bir JSON dosyasında durur (AI_PAPER_RULES_FILE,
+varsayılan depo kökündeki ai_data/paper_rules.json; çalışma dizininden bağımsız):
+
+  {
+    "version": 1,
+    "rules": [
+      {"id": "genc2021-odeme", "source": "Genc 2021", "topic": "Ödeme gecikmeleri",
+       "triggers": ["hakedis", "payment delay", ...], "text": "..."},
+      ...
+    ],
+    "fallback": [{"id": "...", "source": "...", "text": "..."}]
+  }
+
+  - triggers normalize edilmiş risk metninde alt-dizgi olarak aranır
+  - notlar dosyadaki kural sırasıyla döner; aynı metin bir kez yazılır
+  - hiçbir kural tetiklenmezse "fallback" notları döner
+
+Tüm tetikler tek KeywordMatcher'a derlenir: bir risk metni tek geçişte taranır
+ve tetiklenen tüm kurallar birlikte raporlanır. Dosya en fazla
+AI_PAPER_RULES_CHECK saniyede bir stat'lanır; mtime/boyut değiştiyse yeniden
+yüklenir (yeni literatür kuralı için yeniden dağıtım gerekmez). Bozuk dosyada
+son geçerli kurallar kullanılmaya devam eder; dosya hiç yüklenemediyse en azından
+metodoloji notları (DEFAULT_FALLBACK) döner. Hata stats["error"]'a yazılır ve loglanır.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .keymatch import KeywordMatcher
+
+_REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+PAPER_RULES_FILE = os.getenv("AI_PAPER_RULES_FILE", os.path.join(_REPO_ROOT, "ai_data", "paper_rules.json"))
+PAPER_RULES_CHECK = float(os.getenv("AI_PAPER_RULES_CHECK", "2"))  # sn; 0: her çağrıda kontrol
+
+log = logging.getLogger(__name__)
+
+# Kural dosyası hiç yüklenemezse (yok / okunamıyor / bozuk) kullanılan metodoloji notları
+DEFAULT_FALLBACK: List[str] = [
+    "Akintoye & MacLeod 1997, inşaat projelerinde risklerin çoğunlukla maliyet, süre "
+    "ve kalite hedeflerine etkisi üzerinden algılandığını ve yönetimin çoğu zaman "
+    "sezgiye bırakıldığını belirtiyor; yapılandırılmış risk analizi (senaryo, hassasiyet, "
+    "olasılık-etki matrisleri) ile daha sağlam kararlar alınabiliyor.",
+    "Dziadosz & Rejment 2015, risk yönetim sürecini üç çekirdeğe indiriyor: tanımla, "
+    "nicelleştir, tepki ver; projede hem nitel uzman görüşü hem RII gibi nicel araçların "
+    "beraber kullanılması önerilmektedir.",
+]
+
+
+class RuleSet:
+    """Bir kural dosyasının derlenmiş hali (değişmez; yeniden yüklemede yenisi kurulur)."""
+    def __init__(self, data: Dict[str, Any], normalize: Optional[Callable[[str], str]] = None):
+        rules = data.get("rules") or []
+        if not isinstance(rules, list):
+            raise ValueError("'rules' bir liste olmalı")
+        self.rules: List[Dict[str, Any]] = []
+        for i, r in enumerate(rules):
+            text = (r.get("text") or "").strip()
+            triggers = [str(t) for t in (r.get("triggers") or []) if str(t).strip()]
+            if not text or not triggers:
+                continue  # eksik kural: atla
+            self.rules.append({**r, "id": r.get("id") or f"rule-{i}", "text": text, "triggers": triggers})
+        fallback = [(f.get("text") if isinstance(f, dict) else f) or "" for f in (data.get("fallback") or [])]
+        self.fallback: List[str] = [str(t).strip() for t in fallback if str(t).strip()]
+        self.version = data.get("version")
+        self.matcher = KeywordMatcher({r["id"]: r["triggers"] for r in self.rules}, normalize=normalize)
+        self._text = {r["id"]: r["text"] for r in self.rules}
+
+    def fired(self, text: str, normalized: bool = False) -> List[str]:
+        """Tetiklenen kural id'leri (dosya sırasıyla)."""
+        return self.matcher.match(text, normalized)
+
+    def summaries(self, text: str, normalized: bool = False) -> List[str]:
+        out: List[str] = []
+        for rid in self.fired(text, normalized):
+            note = self._text[rid]
+            if note not in out:
+                out.append(note)
+        return out or list(self.fallback)
+
+
+class PaperRules:
+    """
+    path      : kural dosyası
+    normalize : risk metnine ve tetiklere uygulanan normalizasyon
+    check     : dosya değişikliği yoklama aralığı (sn)
+    """
+    def __init__(self, path: str = PAPER_RULES_FILE,
+                 normalize: Optional[Callable[[str], str]] = None,
+                 check: float = PAPER_RULES_CHECK):
+        self.path = path
+        self.normalize = normalize
+        self.check = float(check)
+        self._lock = threading.Lock()
+        self._rules = RuleSet({"fallback": DEFAULT_FALLBACK}, normalize)
+        self._stamp: Optional[Tuple[int, int]] = None
+        self._last_check = float("-inf")
+        self.stats: Dict[str, Any] = {"loads": 0, "loaded_at": None, "rules": 0, "error": None}
+
+    def _file_stamp(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def current(self) -> RuleSet:
+        """Güncel kural seti; dosya değiştiyse (oran sınırlı) yeniden yükler."""
+        now = time.monotonic()
+        if now - self._last_check < self.check:
+            return self._rules
+        with self._lock:
+            self._last_check = now
+            stamp = self._file_stamp()
+            if stamp is None:
+                self._fail(f"kural dosyası bulunamadı: {self.path}")
+                self._stamp = None  # dosya geri gelince yeniden yüklensin
+            elif stamp != self._stamp:
+                self._load(stamp)
+            return self._rules
+
+    def _fail(self, error: str) -> None:
+        """Hatayı kaydeder; aynı hata her yoklamada yeniden loglanmaz."""
+        if self.stats["error"] != error:
+            log.error("Makale kuralları yüklenemedi (%s); %s", error,
+                      "son geçerli kurallar kullanılıyor" if self.stats["loads"] else "yalnızca metodoloji notları")
+        self.stats["error"] = error
+
+    def _load(self, stamp: Tuple[int, int]) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                rules = RuleSet(json.load(f), self.normalize)
+        except Exception as exc:
+            self._fail(f"{self.path}: {exc}")  # son geçerli kurallarla devam
+        else:
+            self._rules = rules  # tek atama: süren değerlendirmeler eski setle biter
+            self.stats.update(loads=self.stats["loads"] + 1, loaded_at=time.time(),
+                              rules=len(rules.rules), error=None)
+        self._stamp = stamp
+
+    def summaries(self, text: str, normalized: bool = False) -> List[str]:
+        return self.current().summaries(text, normalized)
+
+    def summaries_many(self, texts: Iterable[str], normalized: bool = False) -> List[List[str]]:
+        """Toplu değerlendirme: tek kural seti, aynı metin bir kez taranır."""
+        rules = self.current()
+        memo: Dict[str, List[str]] = {}
+        out: List[List[str]] = []
+        for t in texts:
+            if t not in memo:
+                memo[t] = rules.summaries(t, normalized)
+            out.append(list(memo[t]))
+        return out
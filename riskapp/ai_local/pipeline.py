@@ -0,0 +1,236 @@
+# riskapp/ai_local/pipeline.py
+# -*- coding: utf-8 -*-
+"""
+Akışlı (streaming) kodlama hattı — tam indeks kurulumu için.
+
+  1) Korpus satırları (trainer.iter_corpus, DB'den yield_per ile) geçici bir
+     dizine biriktirilir: metinler texts.bin'e, id/etiketler tipli dizilere.
+     100k metin Python listeleri yerine tek bir dosyada durur.
+  2) Biriktirilen metinler BUILD_CHUNK'lık dilimlerle thread havuzunda kodlanır
+     (SBERT ileri geçişi GIL'i bırakır). Aynı anda en fazla threads + 1 dilim
+     bellektedir; sonuçlar sırayla vectors.f32'ye eklenir ve ilerleme bildirilir.
+  3) vectors.f32 mmap ile açılıp Storage.write_index'e verilir; normlama /
+     sıkıştırma da dilim dilim yapılır (Storage._write_dense).
+
+TF-IDF modunda sözlük önce biriktirilmiş metinlerin tamamı üzerinde fit edilir,
+ardından dilimler CSR olarak kodlanıp birleştirilir (seyrek indeks zaten
+bellekte tutulur). Embedding önbelleği (emb_cache) yalnızca SBERT'te kullanılır;
+önbellek G/Ç'si ana thread'de kalır.
+"""
+from __future__ import annotations
+
+import os
+import time
+from array import array
+from collections import deque
+from collections.abc import Sequence
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple, TYPE_CHECKING
+
+import numpy as np
+import scipy.sparse as sp
+
+from .emb_cache import DATA_DIR, EmbeddingCache, cache_enabled
+from .storage import TextBlob, _open_blob
+
+if TYPE_CHECKING:
+    from .engine import LocalEncoder  # pragma: no cover
+
+BUILD_CHUNK = int(os.getenv("AI_BUILD_CHUNK", "4096"))     # DB yield_per + kodlama dilimi (satır)
+ENCODE_THREADS = int(os.getenv("AI_ENCODE_THREADS", "1"))  # eşzamanlı kodlanan dilim sayısı
+
+SPOOL_TEXTS_NAME = "texts.bin"
+SPOOL_VECS_NAME = "vectors.f32"
+
+# progress(aşama, yapılan, toplam): aşama "read" | "encode"; toplam bilinmiyorsa None
+ProgressFn = Callable[[str, int, Optional[int]], None]
+
+
+class SpooledCorpus(Sequence):
+    """
+    Diske biriktirilen korpus. append() ile doldurulur, close() sonrası
+    Storage.write_index'in beklediği satır dizisi gibi davranır:
+    corpus[i] -> {"text", "label"}; ids / texts görünümleri, label(i).
+    """
+    def __init__(self, directory: str):
+        self.dir = directory
+        self._blob_path = os.path.join(directory, SPOOL_TEXTS_NAME)
+        self._blob = open(self._blob_path, "wb")
+        self._ids = array("q")
+        self._codes = array("i")
+        self._offsets = array("q", [0])
+        self._label_pos: Dict[str, int] = {}
+        self.label_names: List[str] = []
+        self.texts: Optional[TextBlob] = None
+
+    def append(self, rid: int, text: str, label: str) -> None:
+        data = text.encode("utf-8")
+        self._blob.write(data)
+        self._offsets.append(self._offsets[-1] + len(data))
+        self._ids.append(int(rid))
+        lab = str(label or "")
+        code = self._label_pos.get(lab)
+        if code is None:
+            code = self._label_pos[lab] = len(self.label_names)
+            self.label_names.append(lab)
+        self._codes.append(code)
+
+    def close(self) -> "SpooledCorpus":
+        if self._blob is not None:
+            self._blob.close()
+            self._blob = None
+            self.texts = TextBlob(_open_blob(self._blob_path), np.frombuffer(self._offsets, dtype=np.int64))
+        return self
+
+    @property
+    def ids(self) -> np.ndarray:
+        return np.frombuffer(self._ids, dtype=np.int64)
+
+    def label(self, i: int) -> str:
+        return self.label_names[self._codes[i]]
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if not -len(self) <= i < len(self):
+            raise IndexError(i)
+        return {"text": self.texts[i], "label": self.label(i)}  # type: ignore[index]
+
+
+class EncodePipeline:
+    """
+    batch_size : SBERT ileri geçişindeki grup (None: engine.ENCODE_BATCH)
+    threads    : aynı anda kodlanan dilim sayısı
+    chunk      : bir dilimdeki metin sayısı (bellekteki üst sınır ≈ (threads + 1) × chunk)
+    """
+    def __init__(self, encoder: "LocalEncoder", batch_size: Optional[int] = None,
+                 threads: Optional[int] = None, chunk: Optional[int] = None,
+                 progress: Optional[ProgressFn] = None, data_dir: Optional[str] = None):
+        self.encoder = encoder
+        self.batch_size = batch_size
+        self.threads = max(int(threads or ENCODE_THREADS), 1)
+        self.chunk = max(int(chunk or BUILD_CHUNK), 1)
+        self.progress = progress
+        self.data_dir = data_dir
+        self.stats: Dict[str, Any] = {}
+
+    # ---------- Dış API ----------
+    def run(self, corpus: SpooledCorpus) -> Any:
+        """
+        Biriktirilmiş korpusu kodlar. Dönen: SBERT'te (N, dim) float32 mmap
+        (corpus.dir/vectors.f32), TF-IDF'te CSR. İstatistik self.stats'ta.
+        """
+        t0 = time.perf_counter()
+        self.stats = {"rows": len(corpus), "hits": 0, "misses": 0, "encoded": 0,
+                      "encode_seconds": 0.0, "chunks": 0, "threads": self.threads,
+                      "batch_size": self.batch_size, "cached": False}
+        if self.encoder.backend == "tfidf":
+            V = self._run_sparse(corpus)
+        else:
+            V = self._run_dense(corpus)
+        self.stats["encode_seconds"] = round(self.stats["encode_seconds"], 4)
+        self.stats["seconds"] = round(time.perf_counter() - t0, 4)
+        return V
+
+    # ---------- Ortak dilim döngüsü ----------
+    def _chunks(self, n: int):
+        for a in range(0, n, self.chunk):
+            yield a, min(a + self.chunk, n)
+
+    def _encode_job(self, texts: List[str], sparse: bool) -> Tuple[Any, float]:
+        t0 = time.perf_counter()
+        X = self.encoder.encode(texts, sparse=sparse, batch_size=self.batch_size)
+        return X, time.perf_counter() - t0
+
+    def _drive(self, corpus: SpooledCorpus, submit, finish) -> None:
+        """submit(pool, a, b) -> iş; finish(iş) sırayla çağrılır. Kuyrukta en fazla threads + 1 dilim."""
+        n = len(corpus)
+        done = 0
+        with ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="ai-encode") as pool:
+            inflight: deque = deque()
+            for a, b in self._chunks(n):
+                inflight.append((b - a, submit(pool, a, b)))
+                while len(inflight) > self.threads:
+                    size, job = inflight.popleft()
+                    finish(job)
+                    done += size
+                    self._report("encode", done, n)
+            while inflight:
+                size, job = inflight.popleft()
+                finish(job)
+                done += size
+                self._report("encode", done, n)
+
+    def _report(self, stage: str, done: int, total: Optional[int]) -> None:
+        self.stats["chunks"] += 1
+        if self.progress is not None:
+            self.progress(stage, done, total)
+
+    # ---------- SBERT (yoğun) ----------
+    def _run_dense(self, corpus: SpooledCorpus) -> np.ndarray:
+        cache = None
+        if cache_enabled():
+            cache = EmbeddingCache(self.encoder.model_name, self.data_dir or DATA_DIR)
+            self.stats["cached"] = True
+        path = os.path.join(corpus.dir, SPOOL_VECS_NAME)
+        dim = [0]
+
+        with open(path, "wb") as out:
+            def submit(pool, a, b):
+                texts = corpus.texts[a:b]  # type: ignore[index]
+                if cache is None:
+                    return None, None, None, pool.submit(self._encode_job, texts, False)
+                keys, rows, uniq = cache.lookup(texts)
+                fut: Optional[Future] = None
+                if uniq:
+                    fut = pool.submit(self._encode_job, [texts[i] for i in uniq.values()], False)
+                return keys, rows, uniq, fut
+
+            def finish(job):
+                keys, rows, uniq, fut = job
+                fresh = None
+                if fut is not None:
+                    fresh, sec = fut.result()
+                    fresh = np.asarray(fresh, dtype=np.float32)
+                    self.stats["encode_seconds"] += sec
+                if cache is None:
+                    X = fresh
+                    self.stats["misses"] += X.shape[0]
+                    self.stats["encoded"] += X.shape[0]
+                else:
+                    if fresh is not None:
+                        cache.add(list(uniq), fresh)
+                    X = cache.assemble(keys, rows, uniq, fresh)
+                    n_hit = sum(r is not None for r in rows)
+                    self.stats["hits"] += n_hit
+                    self.stats["misses"] += len(rows) - n_hit
+                    self.stats["encoded"] += len(uniq)
+                dim[0] = int(X.shape[1])
+                out.write(np.ascontiguousarray(X, dtype=np.float32).tobytes())
+
+            self._drive(corpus, submit, finish)
+
+        return np.memmap(path, dtype=np.float32, mode="r", shape=(len(corpus), dim[0]))
+
+    # ---------- TF-IDF (seyrek) ----------
+    def _run_sparse(self, corpus: SpooledCorpus) -> sp.csr_matrix:
+        t0 = time.perf_counter()
+        self.encoder.fit_tfidf(corpus.texts)  # type: ignore[arg-type]
+        self.stats["fit_seconds"] = round(time.perf_counter() - t0, 4)
+        parts: List[sp.csr_matrix] = []
+
+        def submit(pool, a, b):
+            return pool.submit(self._encode_job, corpus.texts[a:b], True)  # type: ignore[index]
+
+        def finish(fut):
+            X, sec = fut.result()
+            self.stats["encode_seconds"] += sec
+            self.stats["misses"] += X.shape[0]
+            self.stats["encoded"] += X.shape[0]
+            parts.append(X)
+
+        self._drive(corpus, submit, finish)
+        return sp.vstack(parts, format="csr").astype(np.float32)
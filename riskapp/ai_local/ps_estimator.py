@@ -3,13 +3,20 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 from typing import Dict, List, Optional, Tuple
-from collections import defaultdict
-import json, os
+from collections import Counter, OrderedDict, defaultdict
+import json, os, threading
+from functools import lru_cache
+
+import numpy as np
+
+from sqlalchemy import event, func, select, text, union
+from sqlalchemy.orm import Session, object_session
+from sqlalchemy.orm.attributes import get_history
 
 # Projedeki mevcut modeller (SQLAlchemy)
 # Not: import hatası olmaması için bu isimler korunuyor.
 # riskapp/ai_local/ps_estimator.py
-from riskapp.models import db, Risk, Evaluation
+from riskapp.models import db, Risk, Evaluation, RiskCategoryRef
  # type: ignore
 
 # -----------------------------
@@ -38,27 +45,37 @@ PRIORS_ENV = "PS_PRIORS_PATH"  # istersen özel yol ver
 PRIORS_DEFAULT_PATH = os.path.join(os.getenv("AI_DATA_DIR", "ai_data"), "category_ps_priors.json")
 
 
-def _apply_paper_rules(category: Optional[str], p: float, s: float) -> Tuple[float, float, List[str]]:
+@lru_cache(maxsize=4096)
+def _paper_rule_multipliers(category: Optional[str]) -> Tuple[float, float, Tuple[str, ...]]:
     """
-    Kategori adına göre hafif çarpanlar uygular (makale temelli heuristik).
-    Çıktı: (p_adj, s_adj, [uygulanan_kurallar])
+    Kategori adı için birleşik (p_mul, s_mul, uygulanan_kurallar).
+    Kategori kümesi küçük olduğundan sonuç önbelleklenir.
     """
     if not category:
-        return p, s, []
+        return 1.0, 1.0, ()
     cat_low = category.lower()
     applied: List[str] = []
-    p_adj, s_adj = p, s
+    p_mul_all, s_mul_all = 1.0, 1.0
     for key, muls in PAPER_RULE_ADJUSTMENTS.items():
         if key in cat_low:
             p_mul = muls.get("p_mul", 1.0)
             s_mul = muls.get("s_mul", 1.0)
-            p_adj *= p_mul
-            s_adj *= s_mul
+            p_mul_all *= p_mul
+            s_mul_all *= s_mul
             applied.append(f"{key}:p×{p_mul:.2f},s×{s_mul:.2f}")
+    return p_mul_all, s_mul_all, tuple(applied)
+
+
+def _apply_paper_rules(category: Optional[str], p: float, s: float) -> Tuple[float, float, List[str]]:
+    """
+    Kategori adına göre hafif çarpanlar uygular (makale temelli heuristik).
+    Çıktı: (p_adj, s_adj, [uygulanan_kurallar])
+    """
+    p_mul, s_mul, applied = _paper_rule_multipliers(category)
     # Puanları 1–5 aralığına “hafifçe” sıkıştır
-    p_adj = max(1.0, min(5.0, p_adj))
-    s_adj = max(1.0, min(5.0, s_adj))
-    return p_adj, s_adj, applied
+    p_adj = max(1.0, min(5.0, p * p_mul))
+    s_adj = max(1.0, min(5.0, s * s_mul))
+    return p_adj, s_adj, list(applied)
 
 
 @dataclass
@@ -77,6 +94,76 @@ class FitStats:
             self.n_by_cat_s = {}
 
 
+# -----------------------------
+#  Fit toplamları (SQL tarafında)
+# -----------------------------
+_FIT_SQL = """
+    SELECT rr.category, COUNT(*), SUM(e.probability), SUM(e.severity)
+    FROM evaluations e
+    JOIN risks rr ON rr.id = e.risk_id
+    WHERE e.probability IS NOT NULL AND e.severity IS NOT NULL
+    {project_filter}
+    GROUP BY rr.category
+"""
+
+
+def _aggregate_orm(session, project_id: Optional[int] = None) -> List[Tuple[Optional[str], int, float, float]]:
+    """[(category, adet, ΣP, ΣS), ...] — ORM ile tek GROUP BY (project_id verilirse projeye kilitli)."""
+    q = (
+        session.query(
+            Risk.category,
+            func.count(Evaluation.id),
+            func.sum(Evaluation.probability),
+            func.sum(Evaluation.severity),
+        )
+        .join(Evaluation, Evaluation.risk_id == Risk.id)
+        .filter(Evaluation.probability.isnot(None))
+        .filter(Evaluation.severity.isnot(None))
+    )
+    if project_id:
+        q = q.filter(Risk.project_id == project_id)
+    return [tuple(row) for row in q.group_by(Risk.category).all()]
+
+
+def _aggregate_raw(session, project_id: Optional[int] = None) -> List[Tuple[Optional[str], int, float, float]]:
+    """Raw SQL fallback — aynı GROUP BY."""
+    if project_id:
+        sql = _FIT_SQL.format(project_filter="AND rr.project_id = :pid")
+        return [tuple(row) for row in session.execute(text(sql), {"pid": project_id}).fetchall()]
+    sql = _FIT_SQL.format(project_filter="")
+    return [tuple(row) for row in session.execute(text(sql)).fetchall()]
+
+
+def _project_histograms(session, project_id: int):
+    """
+    Projede risk başına (P, S) frekansları ve etiket -> risk kümeleri:
+      hist   : [(risk_id, p, s, adet), ...]
+      labels : [(risk_id, etiket), ...]  — Risk.category ∪ RiskCategoryRef.name (UNION tekil)
+    mode_for() seçilen etiketlerin risklerini birleştirip her değerlendirmeyi bir kez sayar.
+    """
+    labels = union(
+        select(Risk.id.label("rid"), Risk.category.label("name"))
+        .where(Risk.project_id == project_id, Risk.category.isnot(None)),
+        select(RiskCategoryRef.risk_id.label("rid"), RiskCategoryRef.name.label("name"))
+        .join(Risk, Risk.id == RiskCategoryRef.risk_id)
+        .where(Risk.project_id == project_id),
+    )
+    hist = (
+        session.query(Evaluation.risk_id, Evaluation.probability, Evaluation.severity, func.count())
+        .join(Risk, Risk.id == Evaluation.risk_id)
+        .filter(Risk.project_id == project_id)
+        .group_by(Evaluation.risk_id, Evaluation.probability, Evaluation.severity)
+    )
+    return [tuple(row) for row in hist.all()], [tuple(row) for row in session.execute(labels).all()]
+
+
+def _mode(counter: Counter) -> Optional[int]:
+    """En sık değer; eşitlikte küçük değer (konsensüs ile aynı kural)."""
+    if not counter:
+        return None
+    return max(counter.items(), key=lambda kv: (kv[1], -kv[0]))[0]
+
+
 class PSEstimator:
     """
     P/S (Probability/Severity) için Bayes harmanlı tahmin.
@@ -99,14 +186,24 @@ class PSEstimator:
         self.global_s: float = 3.0
         self.stats = FitStats()
 
-    # --------- Yardımcılar ---------
-    @staticmethod
-    def _safe_mean(xs: List[float]) -> Optional[float]:
-        xs2 = [float(x) for x in xs if x is not None]
-        if not xs2:
-            return None
-        return sum(xs2) / len(xs2)
+        # Koşan toplamlar: kategori -> [n, toplam]  (artımlı güncelleme için)
+        self._sum_p: Dict[str, List[float]] = defaultdict(lambda: [0, 0.0])
+        self._sum_s: Dict[str, List[float]] = defaultdict(lambda: [0, 0.0])
+        self._all_p: List[float] = [0, 0.0]
+        self._all_s: List[float] = [0, 0.0]
+        self._priors: Optional[Dict[str, dict]] = None
+
+        # Fit edilen verinin sürümü: (max(evaluation.id), count) — None = fit edilmedi
+        self.data_version: Optional[Tuple[int, int]] = None
 
+        # Proje kapsamı (None = tüm projeler); mode_for için risk başına P/S
+        # frekansları ve etiket (kategori / kategori ref adı) -> risk id kümesi
+        self.project_id: Optional[int] = None
+        self.risk_hist_p: Dict[int, Counter] = {}
+        self.risk_hist_s: Dict[int, Counter] = {}
+        self.label_risks: Dict[str, set] = {}
+
+    # --------- Yardımcılar ---------
     def _bayes_blend(self, sample_mean: float, sample_n: int, global_mean: float) -> float:
         """(n*mean + alpha*global) / (n + alpha)"""
         return (sample_n * sample_mean + self.alpha * global_mean) / (sample_n + self.alpha)
@@ -115,13 +212,21 @@ class PSEstimator:
         """
         Excel'den ürettiğimiz kategori öncel değerlerini (P/S) yükler.
         Şema: { "KATEGORI_ADI": {"p_mean": 2.73, "s_mean": 3.91, "n": 35}, ... }
+        Dosya fit sırasında bir kez okunur; artımlı güncellemeler bellekteki kopyayı kullanır.
         """
         priors_path = path or os.getenv(PRIORS_ENV, PRIORS_DEFAULT_PATH)
         try:
             with open(priors_path, "r", encoding="utf-8") as f:
                 priors = json.load(f)
         except Exception:
-            return  # dosya yoksa sessizce geç
+            priors = None  # dosya yoksa sessizce geç
+        self._priors = priors if isinstance(priors, dict) else None
+        self._apply_priors()
+
+    def _apply_priors(self) -> None:
+        priors = self._priors
+        if not priors:
+            return
 
         # kategori bazlı override
         for cat, d in priors.items():
@@ -142,84 +247,144 @@ class PSEstimator:
         except Exception:
             pass
 
+    # --------- Koşan toplamlar ---------
+    def _reset_sums(self) -> None:
+        self._sum_p.clear()
+        self._sum_s.clear()
+        self._all_p = [0, 0.0]
+        self._all_s = [0, 0.0]
+
+    def _add(self, category: Optional[str], p, s, sign: int = 1) -> None:
+        """Tek değerlendirmeyi toplamlara ekler (sign=-1 ise çıkarır)."""
+        cat = str(category) if category else None
+        if p is not None:
+            self._all_p[0] += sign
+            self._all_p[1] += sign * float(p)
+            if cat:
+                acc = self._sum_p[cat]
+                acc[0] += sign
+                acc[1] += sign * float(p)
+                if acc[0] <= 0:
+                    del self._sum_p[cat]
+        if s is not None:
+            self._all_s[0] += sign
+            self._all_s[1] += sign * float(s)
+            if cat:
+                acc = self._sum_s[cat]
+                acc[0] += sign
+                acc[1] += sign * float(s)
+                if acc[0] <= 0:
+                    del self._sum_s[cat]
+
+    def _add_group(self, category: Optional[str], n, sum_p, sum_s) -> None:
+        """GROUP BY satırını (adet, ΣP, ΣS) toplamlara ekler."""
+        n = int(n or 0)
+        if n <= 0:
+            return
+        cat = str(category) if category else None
+        for all_acc, by_cat, total in ((self._all_p, self._sum_p, sum_p),
+                                       (self._all_s, self._sum_s, sum_s)):
+            all_acc[0] += n
+            all_acc[1] += float(total or 0.0)
+            if cat:
+                acc = by_cat[cat]
+                acc[0] += n
+                acc[1] += float(total or 0.0)
+
+    def _recompute(self) -> None:
+        """
+        Koşan toplamlardan global ve kategori bazlı Bayes ortalamalarını üretir.
+        Sözlükler yeni nesne olarak atanır; okuyan thread yarım sonuç görmez.
+        """
+        n_p, t_p = self._all_p
+        n_s, t_s = self._all_s
+        global_p = round(t_p / n_p, self.round_to) if n_p > 0 else 3.0
+        global_s = round(t_s / n_s, self.round_to) if n_s > 0 else 3.0
+
+        cat_p = {
+            cat: round(self._bayes_blend(tot / n, int(n), global_p), self.round_to)
+            for cat, (n, tot) in self._sum_p.items() if n > 0
+        }
+        cat_s = {
+            cat: round(self._bayes_blend(tot / n, int(n), global_s), self.round_to)
+            for cat, (n, tot) in self._sum_s.items() if n > 0
+        }
+
+        self.global_p, self.global_s = global_p, global_s
+        self.cat_p, self.cat_s = cat_p, cat_s
+        self.stats = FitStats(
+            global_p=global_p,
+            global_s=global_s,
+            n_all_p=int(n_p),
+            n_all_s=int(n_s),
+            n_by_cat_p={k: int(v[0]) for k, v in self._sum_p.items()},
+            n_by_cat_s={k: int(v[0]) for k, v in self._sum_s.items()},
+        )
+
+        # Excel/JSON öncel değerleri varsa uygula (override)
+        self._apply_priors()
+
     # --------- Eğitim ---------
-    def fit(self, session=None) -> None:
+    def fit(self, session=None, project_id: Optional[int] = None) -> None:
         """
-        Veritabanından probability/severity değerlerini okuyup
-        global ve kategori bazlı Bayes ortalamalarını hesaplar.
+        Veritabanından kategori bazlı (adet, ΣP, ΣS) toplamlarını TEK GROUP BY
+        sorgusuyla alıp global ve kategori bazlı Bayes ortalamalarını hesaplar.
+        Bellek kullanımı değerlendirme sayısından bağımsızdır (kategori sayısı kadar satır).
+        project_id verilirse yalnızca o projenin değerlendirmeleri kullanılır ve
+        mode_for() için kategori başına P/S frekansları da yüklenir.
         """
         sess = session or db.session
+        version = _db_version(sess, project_id)
+        self.project_id = project_id
 
         # ORM varsa kullan; yoksa raw SQL fallback
         try:
-            # ORM sorgusu
-            q = (
-                sess.query(Risk.category, Evaluation.probability, Evaluation.severity)
-                .join(Evaluation, Evaluation.risk_id == Risk.id)
-                .filter(Evaluation.probability.isnot(None))
-                .filter(Evaluation.severity.isnot(None))
-            )
-            rows = [(cat, p, s) for cat, p, s in q.all()]
+            groups = _aggregate_orm(sess, project_id)
         except Exception:
-            # Raw SQL fallback
-            rows = sess.execute("""
-                SELECT rr.category, e.probability, e.severity
-                FROM evaluations e
-                JOIN risks rr ON rr.id = e.risk_id
-                WHERE e.probability IS NOT NULL AND e.severity IS NOT NULL
-            """).fetchall()
-
-        p_all: List[float] = []
-        s_all: List[float] = []
-        by_cat_p: Dict[str, List[float]] = defaultdict(list)
-        by_cat_s: Dict[str, List[float]] = defaultdict(list)
-
-        for cat, p, s in rows:
-            if p is not None:
-                p_all.append(float(p))
-                if cat:
-                    by_cat_p[str(cat)].append(float(p))
-            if s is not None:
-                s_all.append(float(s))
-                if cat:
-                    by_cat_s[str(cat)].append(float(s))
-
-        g_p = self._safe_mean(p_all)
-        g_s = self._safe_mean(s_all)
-        self.global_p = round(g_p, self.round_to) if g_p is not None else 3.0
-        self.global_s = round(g_s, self.round_to) if g_s is not None else 3.0
-
-        # kategori bazlı Bayes harmanı
-        self.cat_p.clear()
-        self.cat_s.clear()
-
-        for cat, arr in by_cat_p.items():
-            local_mean = self._safe_mean(arr)
-            if local_mean is None:
-                continue
-            val = self._bayes_blend(local_mean, len(arr), self.global_p)
-            self.cat_p[cat] = round(val, self.round_to)
+            groups = _aggregate_raw(sess, project_id)
+
+        hist_p: Dict[int, Counter] = defaultdict(Counter)
+        hist_s: Dict[int, Counter] = defaultdict(Counter)
+        label_risks: Dict[str, set] = defaultdict(set)
+        if project_id:
+            hist, labels = _project_histograms(sess, project_id)
+            for rid, p, s, n in hist:
+                if p is not None:
+                    hist_p[int(rid)][p] += int(n)
+                if s is not None:
+                    hist_s[int(rid)][s] += int(n)
+            for rid, name in labels:
+                label_risks[name].add(int(rid))
+        self.risk_hist_p, self.risk_hist_s = dict(hist_p), dict(hist_s)
+        self.label_risks = dict(label_risks)
+
+        self._reset_sums()
+        for cat, n, sum_p, sum_s in groups:
+            self._add_group(cat, n, sum_p, sum_s)
 
-        for cat, arr in by_cat_s.items():
-            local_mean = self._safe_mean(arr)
-            if local_mean is None:
-                continue
-            val = self._bayes_blend(local_mean, len(arr), self.global_s)
-            self.cat_s[cat] = round(val, self.round_to)
-
-        self.stats = FitStats(
-            global_p=self.global_p,
-            global_s=self.global_s,
-            n_all_p=len(p_all),
-            n_all_s=len(s_all),
-            n_by_cat_p={k: len(v) for k, v in by_cat_p.items()},
-            n_by_cat_s={k: len(v) for k, v in by_cat_s.items()},
-        )
-
-        # Excel/JSON öncel değerleri varsa uygula (override)
         self._load_priors_if_any()
+        self._recompute()
+        self.data_version = version
 
     # --------- Tahmin ---------
+    def mode_for(self, categories: List[str]) -> Optional[Dict[str, Optional[int]]]:
+        """
+        Verilen kategorilerdeki geçmiş değerlendirmelerin en sık P ve S değeri
+        (proje kapsamlı fit gerektirir). Bir risk birden çok seçili etiketle
+        eşleşse de her değerlendirmesi bir kez sayılır. Veri yoksa None.
+        """
+        rids: set = set()
+        for cat in categories or []:
+            rids |= self.label_risks.get(cat) or set()
+        hp: Counter = Counter()
+        hs: Counter = Counter()
+        for rid in rids:
+            hp.update(self.risk_hist_p.get(rid) or {})
+            hs.update(self.risk_hist_s.get(rid) or {})
+        if not hp and not hs:
+            return None
+        return {"p": _mode(hp), "s": _mode(hs)}
+
     def suggest(self, category: Optional[str]) -> Dict[str, object]:
         """
         Kategori verilirse kategoriye özgü Bayes harman + makale heuristikleri uygular.
@@ -234,32 +399,233 @@ class PSEstimator:
           "source": "category|global"
         }
         """
-        # Global default
-        base_p = self.global_p
-        base_s = self.global_s
-        n_cat_p = 0
-        n_cat_s = 0
-        src = "global"
-
-        if category:
-            # kategori için Bayes sonuçları varsa onları al
-            if category in self.cat_p:
-                base_p = self.cat_p[category]
-                n_cat_p = self.stats.n_by_cat_p.get(category, 0)
-                src = "category"
-            if category in self.cat_s:
-                base_s = self.cat_s[category]
-                n_cat_s = self.stats.n_by_cat_s.get(category, 0)
-                src = "category"
-
-        # Makale tabanlı küçük heuristik ayarı
-        p_adj, s_adj, applied = _apply_paper_rules(category, base_p, base_s)
-
-        return {
-            "p": round(p_adj, self.round_to),
-            "s": round(s_adj, self.round_to),
-            "n_cat": (n_cat_p, n_cat_s),
-            "n_all": (self.stats.n_all_p, self.stats.n_all_s),
-            "applied_rules": applied,
-            "source": src
-        }
+        return self.suggest_many([category])[0]
+
+    def suggest_many(self, categories: List[Optional[str]]) -> List[Dict[str, object]]:
+        """
+        suggest()'in toplu hali: her kategori için aynı yapıda sonuç, girdi sırasıyla.
+        Tekil kategoriler bir kez çözülür; çarpan/sıkıştırma/yuvarlama NumPy ile
+        tek geçişte yapılır (toplu değerlendirme ve içe aktarma ekranları için).
+        """
+        cats = [c or None for c in categories]
+        if not cats:
+            return []
+        uniq = list(dict.fromkeys(cats))
+        pos = {c: i for i, c in enumerate(uniq)}
+
+        # Anlık görüntü: artımlı güncelleme sözlükleri değiştirse de tutarlı okunur
+        cat_p, cat_s, stats = self.cat_p, self.cat_s, self.stats
+        n = len(uniq)
+        base = np.empty((n, 2), dtype=np.float64)
+        muls = np.empty((n, 2), dtype=np.float64)
+        n_cat: List[Tuple[int, int]] = []
+        sources: List[str] = []
+        rules: List[Tuple[str, ...]] = []
+        for i, cat in enumerate(uniq):
+            bp, bs = self.global_p, self.global_s
+            np_, ns_ = 0, 0
+            src = "global"
+            if cat:
+                # kategori için Bayes sonuçları varsa onları al
+                if cat in cat_p:
+                    bp, np_, src = cat_p[cat], stats.n_by_cat_p.get(cat, 0), "category"
+                if cat in cat_s:
+                    bs, ns_, src = cat_s[cat], stats.n_by_cat_s.get(cat, 0), "category"
+            pm, sm, applied = _paper_rule_multipliers(cat)
+            base[i] = (bp, bs)
+            muls[i] = (pm, sm)
+            n_cat.append((np_, ns_))
+            sources.append(src)
+            rules.append(applied)
+
+        # Makale tabanlı küçük heuristik ayarı + 1–5 sıkıştırma
+        adj = np.round(np.clip(base * muls, 1.0, 5.0), self.round_to)
+        n_all = (stats.n_all_p, stats.n_all_s)
+
+        resolved = [
+            {
+                "p": float(adj[i, 0]),
+                "s": float(adj[i, 1]),
+                "n_cat": n_cat[i],
+                "n_all": n_all,
+                "applied_rules": list(rules[i]),
+                "source": sources[i],
+            }
+            for i in range(n)
+        ]
+        return [dict(resolved[pos[c]], applied_rules=list(resolved[pos[c]]["applied_rules"])) for c in cats]
+
+
+# -----------------------------
+#  Süreç geneli paylaşılan model
+# -----------------------------
+# Her istekte PSEstimator().fit() tüm evaluations tablosunu tarıyordu.
+# Paylaşılan örnek bir kez fit edilir; Evaluation ekleme/silme olayları
+# commit sonrası koşan toplamlara işlenir. Başka bir süreç (ör. ikinci
+# gunicorn worker'ı) tabloyu değiştirdiyse (max(id), count) sürümü tutmaz
+# ve model yeniden fit edilir.
+_shared: Optional[PSEstimator] = None
+_shared_dirty: bool = False
+_shared_lock = threading.RLock()
+_PENDING_KEY = "ps_estimator_pending"
+
+# Proje bazlı modeller: (project_id, max(evaluation.id), count) -> PSEstimator
+PROJECT_CACHE_SIZE = int(os.getenv("PS_PROJECT_CACHE_SIZE", "32"))
+_project_cache: "OrderedDict[Tuple[int, int, int], PSEstimator]" = OrderedDict()
+
+
+def _db_version(session, project_id: Optional[int] = None) -> Tuple[int, int]:
+    """evaluations tablosunun ucuz sürüm damgası: (max(id), count) — opsiyonel proje kapsamlı."""
+    q = session.query(func.max(Evaluation.id), func.count(Evaluation.id))
+    if project_id:
+        q = q.join(Risk, Risk.id == Evaluation.risk_id).filter(Risk.project_id == project_id)
+    max_id, cnt = q.one()
+    return int(max_id or 0), int(cnt or 0)
+
+
+def get_shared_estimator(session=None) -> PSEstimator:
+    """
+    Süreç geneli PSEstimator. Veri sürümü DB'nin gerisindeyse
+    (ya da kategori/değer düzenlemesi nedeniyle kirliyse) yeniden fit eder.
+    """
+    global _shared, _shared_dirty
+    sess = session or db.session
+    version = _db_version(sess)
+    with _shared_lock:
+        if _shared is None or _shared_dirty or _shared.data_version != version:
+            est = PSEstimator(alpha=5.0)
+            est.fit(sess)
+            _shared, _shared_dirty = est, False
+        return _shared
+
+
+def get_project_estimator(project_id: Optional[int], session=None) -> PSEstimator:
+    """
+    Proje kapsamlı PSEstimator; (project_id, max(evaluation.id), count) anahtarlı
+    sınırlı LRU'dan servis edilir. Sürüm değiştiyse proje yeniden fit edilir.
+    project_id yoksa süreç geneli model döner.
+    """
+    if not project_id:
+        return get_shared_estimator(session)
+    sess = session or db.session
+    pid = int(project_id)
+    key = (pid,) + _db_version(sess, pid)
+    with _shared_lock:
+        est = _project_cache.get(key)
+        if est is not None:
+            _project_cache.move_to_end(key)
+            return est
+
+    est = PSEstimator(alpha=5.0)
+    est.fit(sess, project_id=pid)
+    with _shared_lock:
+        # aynı projenin eski sürümlerini at
+        for old in [k for k in _project_cache if k[0] == pid]:
+            del _project_cache[old]
+        _project_cache[key] = est
+        while len(_project_cache) > PROJECT_CACHE_SIZE:
+            _project_cache.popitem(last=False)
+    return est
+
+
+def invalidate_shared_estimator() -> None:
+    """Bir sonraki çağrıda (global ve proje bazlı) tam fit zorlar."""
+    global _shared_dirty
+    with _shared_lock:
+        _shared_dirty = True
+        _project_cache.clear()
+
+
+def _apply_pending(entries) -> None:
+    """Commit edilmiş değişiklikleri paylaşılan modele işler."""
+    global _shared_dirty
+    with _shared_lock:
+        kinds = {e[0] for e in entries}
+        if kinds & {"dirty", "refs"}:
+            # kategori/değer düzenlemesi: proje modellerinin frekansları da bayat
+            _project_cache.clear()
+        if "dirty" in kinds:
+            # düzenleme nadir: delta yerine bir sonraki çağrıda tam fit
+            _shared_dirty = True
+            return
+        est = _shared
+        if est is None or est.data_version is None:
+            return
+        max_id, cnt = est.data_version
+        changed = False
+        for kind, eval_id, cat, p, s in entries:
+            if kind == "refs":
+                continue
+            if kind == "insert":
+                if eval_id is not None and eval_id <= max_id:
+                    continue  # eşzamanlı bir fit bu satırı zaten saydı
+                max_id, cnt = max(max_id, int(eval_id or 0)), cnt + 1
+                sign = 1
+            else:  # delete — silinen satır max(id) ise sürüm tutmaz, sonraki çağrı fit eder
+                cnt, sign = cnt - 1, -1
+            if p is not None and s is not None:
+                est._add(cat, p, s, sign)
+                changed = True
+        if changed:
+            est._recompute()
+        est.data_version = (max_id, cnt)
+
+
+def _queue(target, entry) -> None:
+    sess = object_session(target)
+    if sess is not None:
+        sess.info.setdefault(_PENDING_KEY, []).append(entry)
+
+
+def _risk_category(connection, target) -> Optional[str]:
+    sess = object_session(target)
+    if sess is not None:
+        risk = sess.identity_map.get(sess.identity_key(Risk, target.risk_id))
+        if risk is not None:
+            return risk.category
+    return connection.execute(
+        select(Risk.category).where(Risk.id == target.risk_id)
+    ).scalar()
+
+
+@event.listens_for(Evaluation, "after_insert")
+def _ps_evaluation_after_insert(mapper, connection, target):
+    _queue(target, ("insert", target.id, _risk_category(connection, target),
+                    target.probability, target.severity))
+
+
+@event.listens_for(Evaluation, "after_delete")
+def _ps_evaluation_after_delete(mapper, connection, target):
+    _queue(target, ("delete", target.id, _risk_category(connection, target),
+                    target.probability, target.severity))
+
+
+@event.listens_for(Evaluation, "after_update")
+def _ps_evaluation_after_update(mapper, connection, target):
+    if any(get_history(target, k).has_changes() for k in ("risk_id", "probability", "severity")):
+        _queue(target, ("dirty", None, None, None, None))
+
+
+@event.listens_for(Risk, "after_update")
+def _ps_risk_after_update(mapper, connection, target):
+    if any(get_history(target, k).has_changes() for k in ("category", "project_id")):
+        _queue(target, ("dirty", None, None, None, None))
+
+
+@event.listens_for(RiskCategoryRef, "after_insert")
+@event.listens_for(RiskCategoryRef, "after_update")
+@event.listens_for(RiskCategoryRef, "after_delete")
+def _ps_category_ref_changed(mapper, connection, target):
+    _queue(target, ("refs", None, None, None, None))
+
+
+@event.listens_for(Session, "after_commit")
+def _ps_after_commit(session):
+    entries = session.info.pop(_PENDING_KEY, None)
+    if entries:
+        _apply_pending(entries)
+
+
+@event.listens_for(Session, "after_rollback")
+def _ps_after_rollback(session):
+    session.info.pop(_PENDING_KEY, None)
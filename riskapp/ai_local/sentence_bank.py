@@ -1,8 +1,10 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
-from typing import Dict, List, Tuple, Iterable, Optional
+from typing import Any, Dict, List, Tuple, Iterable, Optional, Sequence
 import os, json, re, unicodedata, random
 
+from .keymatch import KeywordMatcher
+
 # =========================
 #  Basit metin normalizasyonu
 # =========================
@@ -16,10 +18,6 @@ def _norm(s: str) -> str:
     s = re.sub(r"\s+", " ", s)
     return s
 
-def _any_in(text: str, keys: Iterable[str]) -> bool:
-    t = _norm(text)
-    return any(_norm(k) in t for k in keys)
-
 # =========================
 #  Kategori alias'ları (geniş)
 # =========================
@@ -245,6 +243,43 @@ def _merge_external():
     except Exception:
         # sessiz düş — uygulamayı engelleme
         pass
+    finally:
+        _rebuild_tables()
+
+# =========================
+#  Önceden derlenmiş eşleşme tabloları
+#  Alias / PHRASES anahtarları / eşanlamlılar import'ta bir kez normalize edilip
+#  tek regex'e derlenir; _merge_external() sonunda yeniden kurulur.
+# =========================
+# ek: bazı eşanlamlı minik haritalar (kanonik PHRASES anahtarı -> başlık ipuçları)
+SYNONYMS: Dict[str, List[str]] = {
+    "vinc": ["kran","kaldirma","rigging","barge vinc","duba vinc"],
+    "beton": ["dokum","concrete"],
+    "kalip": ["kalip/iskelet","formwork","scaffold"],
+    "donati": ["rebar","hasir"],
+    "sozlesme": ["contract"],
+    "hakedis": ["progress payment","interim payment"],
+    "tedarik": ["procurement","satin alma","satinalma"],
+    "altyuklenici": ["tasaron","tasaron"],
+    "tasarim": ["design","revizyon"],
+    "sartname": ["spec","specification"],
+    "deprem": ["sismik","earthquake"],
+    "yangin": ["patlama","fire","explosion"],
+    "hava": ["ruzgar","yagis","firtina","weather"],
+    "zemin": ["geoteknik","soft soil","yumusak zemin"],
+}
+
+_ALIAS_MATCHER: Optional[KeywordMatcher] = None  # kategori -> alias'lar
+_KEY_MATCHER: Optional[KeywordMatcher] = None    # ("p", PHRASES anahtarı) / ("s", eşanlamlı kanonik)
+
+
+def _rebuild_tables() -> None:
+    """CATEGORY_ALIASES / PHRASES / SYNONYMS değiştiğinde eşleyicileri yeniden kurar."""
+    global _ALIAS_MATCHER, _KEY_MATCHER
+    keysets: Dict[Tuple[str, str], List[str]] = {("p", kw): [kw] for kw in PHRASES}
+    keysets.update({("s", canon): syns for canon, syns in SYNONYMS.items()})
+    _ALIAS_MATCHER = KeywordMatcher(CATEGORY_ALIASES, normalize=_norm)
+    _KEY_MATCHER = KeywordMatcher(keysets, normalize=_norm)
 
 _merge_external()
 
@@ -254,35 +289,14 @@ _merge_external()
 def _collect_keys_from_title(title: str) -> List[str]:
     """
     Başlıktan yakalanan anahtarlar (PHRASES anahtarlarına göre).
-    'kaldırma planı' gibi bileşikler için basit içerir kontrolü kullanıyoruz.
+    'kaldırma planı' gibi bileşikler için basit içerir kontrolü kullanıyoruz;
+    PHRASES anahtarları önce, ardından eşanlamlılardan gelen kanonikler.
     """
-    t = _norm(title)
-    hits = []
-    for kw in PHRASES.keys():
-        if _norm(kw) in t:
-            hits.append(kw)
-    # ek: bazı eşanlamlı minik haritalar
-    synonyms = {
-        "vinc": ["kran","kaldirma","rigging","barge vinc","duba vinc"],
-        "beton": ["dokum","concrete"],
-        "kalip": ["kalip/iskelet","formwork","scaffold"],
-        "donati": ["rebar","hasir"],
-        "sozlesme": ["contract"],
-        "hakedis": ["progress payment","interim payment"],
-        "tedarik": ["procurement","satin alma","satinalma"],
-        "altyuklenici": ["tasaron","tasaron"],
-        "tasarim": ["design","revizyon"],
-        "sartname": ["spec","specification"],
-        "deprem": ["sismik","earthquake"],
-        "yangin": ["patlama","fire","explosion"],
-        "hava": ["ruzgar","yagis","firtina","weather"],
-        "zemin": ["geoteknik","soft soil","yumusak zemin"],
-    }
-    for canon, syns in synonyms.items():
-        if canon in hits: 
-            continue
-        if _any_in(t, syns):
-            hits.append(canon)
+    hits: List[str] = []
+    syn_hits: List[str] = []
+    for tag, kw in _KEY_MATCHER.match(title):
+        (hits if tag == "p" else syn_hits).append(kw)
+    hits.extend(canon for canon in syn_hits if canon not in hits)
     return hits
 
 def _weighted_sample(pool: List[str], k: int, rnd: random.Random) -> List[str]:
@@ -296,6 +310,50 @@ def _weighted_sample(pool: List[str], k: int, rnd: random.Random) -> List[str]:
     rnd.shuffle(items)
     return items[:k]
 
+# Başlıktan anahtar çıkmazsa kategori adına göre genel cümleler (ilk eşleşen işaret)
+_FALLBACK_POOLS: List[Tuple[Tuple[str, ...], List[str]]] = [
+    (("İNŞAAT", "UYGULAMA"), [
+        "Uygulama kaynaklı kalite/ilerleme riski; kontrol listeleri ve saha denetimi sıkılaştırılsın.",
+        "Operasyonel duruşları azaltmak için kritik faaliyetler için ön koşul kontrolü yapılsın."
+    ]),
+    (("ÇEVRESEL",), [
+        "Çevresel izin/koşul/afet etkileri program ve önlemlerle yönetilmelidir.",
+        "Atık/emisyon/gürültü eşikleri için izleme ve raporlama periyotları netleştirilsin."
+    ]),
+    (("DİZAYN", "TASARIM"), [
+        "Tasarım veri/şartname belirsizliği; RFI ve onay süreçleriyle daraltılsın.",
+        "Revizyon kontrolü ve disiplinler arası koordinasyon toplantıları düzenli işletilmeli."
+    ]),
+    (("FİNANS",), [
+        "Finansal oynaklık; nakit akışı ve maliyet kontrol mekanizmalarıyla dengelenmelidir.",
+        "Likidite tamponu ve sözleşmesel fiyat farkı/hedge mekanizmaları değerlendirilmeli."
+    ]),
+    (("GEOTEKNİK",), [
+        "Zemin belirsizliği; ek araştırma ve tetik değerli izlemeyle kontrol altına alınsın.",
+        "Taşıma gücü ve oturma riskine karşı etaplama ve iyileştirme seçenekleri değerlendirilmeli."
+    ]),
+    (("POLİTİK",), [
+        "Politik/mevzuat etkileri için alternatif senaryo ve sözleşme korumaları gerekir.",
+        "Gümrük ve düzenleme değişiklikleri için bildirim ve uyarlama prosedürleri belirlenmeli."
+    ]),
+    (("SÖZLEŞME",), [
+        "Sözleşme/onay süreçleri netleştirilmeli, SLA ve değişiklik yönetimi uygulanmalı.",
+        "Claim ve değişiklik kayıtları sistematik tutulmalı; kapsam netliği sağlanmalı."
+    ]),
+    (("TEDARİK", "ALTYÜKLENİCİ"), [
+        "Tedarik/altyüklenici riskleri; alternatif kaynak ve teslim KPI’larıyla yönetilsin.",
+        "Kritik malzemelerde dual-sourcing ve kalite kabul kriterleri sözleşmeye bağlanmalı."
+    ]),
+    (("YÖNETSEL",), [
+        "Yönetim/koordinasyon riskleri; RACI ve düzenli raporlama ile iyileştirilsin.",
+        "Karar kayıtları ve iletişim planı olmadan işe başlanmamalı."
+    ]),
+]
+_FALLBACK_DEFAULT: List[str] = [
+    "Risk, ilgili süreç kontrolleri ve net sorumluluklarla yönetilmelidir.",
+    "Ön koşullar, kalite kontrolleri ve sahiplik atamaları netleştirilsin."
+]
+
 # =========================
 #  Public API
 # =========================
@@ -304,87 +362,66 @@ def normalize_category_by_title(title: str, fallback: str) -> str:
     Başlıktaki ipuçlarına göre kanonik kategori öner.
     Eşleşme yoksa fallback (ya da 'GENEL').
     """
-    t = _norm(title)
-    for canon, keys in CATEGORY_ALIASES.items():
-        if _any_in(t, keys):
-            return canon
-    return fallback or "GENEL"
+    return _ALIAS_MATCHER.first(title) or fallback or "GENEL"
 
-def one_liner(title: str, category: str, num: int = 1, seed: Optional[int] = None) -> str | List[str]:
+def normalize_categories(titles: Iterable[str], fallbacks: Optional[Sequence[str]] = None) -> List[str]:
     """
-    Başlık + kategoriye göre 1 ya da N adet kısa öneri cümlesi döndürür.
-    - num=1 -> string (geriye dönük uyum)
-    - num>1 -> List[str]
+    normalize_category_by_title'ın toplu hali (ör. binlerce satırlık içe aktarma).
+    fallbacks verilirse titles ile aynı sırada satır başına fallback'tir.
+    Aynı normalize başlık yalnızca bir kez taranır.
     """
-    rnd = random.Random(seed)
-    title_norm = _norm(title)
-    cat_upper = (category or "").upper()
+    memo: Dict[str, Optional[str]] = {}
+    out: List[str] = []
+    for i, title in enumerate(titles):
+        t = _norm(title)
+        if t not in memo:
+            memo[t] = _ALIAS_MATCHER.first(t, normalized=True)
+        fb = fallbacks[i] if fallbacks is not None else ""
+        out.append(memo[t] or fb or "GENEL")
+    return out
 
-    # 1) Başlıktan anahtarları topla
-    keys = _collect_keys_from_title(title_norm)
+def _fallback_pool(category: str) -> List[str]:
+    cat_upper = (category or "").upper()
+    for marks, pool in _FALLBACK_POOLS:
+        if any(m in cat_upper for m in marks):
+            return pool
+    return _FALLBACK_DEFAULT
 
-    # 2) Havuzu oluştur
+def _pick(keys: List[str], category: str, num: int, rnd: random.Random) -> str | List[str]:
     pool: List[str] = []
     for k in keys:
         pool.extend(PHRASES.get(k, []))
-
-    # 3) Havuz boşsa kategori tabanlı fallback üret
     if not pool:
-        if "İNŞAAT" in cat_upper or "UYGULAMA" in cat_upper:
-            pool = [
-                "Uygulama kaynaklı kalite/ilerleme riski; kontrol listeleri ve saha denetimi sıkılaştırılsın.",
-                "Operasyonel duruşları azaltmak için kritik faaliyetler için ön koşul kontrolü yapılsın."
-            ]
-        elif "ÇEVRESEL" in cat_upper:
-            pool = [
-                "Çevresel izin/koşul/afet etkileri program ve önlemlerle yönetilmelidir.",
-                "Atık/emisyon/gürültü eşikleri için izleme ve raporlama periyotları netleştirilsin."
-            ]
-        elif "DİZAYN" in cat_upper or "TASARIM" in cat_upper:
-            pool = [
-                "Tasarım veri/şartname belirsizliği; RFI ve onay süreçleriyle daraltılsın.",
-                "Revizyon kontrolü ve disiplinler arası koordinasyon toplantıları düzenli işletilmeli."
-            ]
-        elif "FİNANS" in cat_upper:
-            pool = [
-                "Finansal oynaklık; nakit akışı ve maliyet kontrol mekanizmalarıyla dengelenmelidir.",
-                "Likidite tamponu ve sözleşmesel fiyat farkı/hedge mekanizmaları değerlendirilmeli."
-            ]
-        elif "GEOTEKNİK" in cat_upper:
-            pool = [
-                "Zemin belirsizliği; ek araştırma ve tetik değerli izlemeyle kontrol altına alınsın.",
-                "Taşıma gücü ve oturma riskine karşı etaplama ve iyileştirme seçenekleri değerlendirilmeli."
-            ]
-        elif "POLİTİK" in cat_upper:
-            pool = [
-                "Politik/mevzuat etkileri için alternatif senaryo ve sözleşme korumaları gerekir.",
-                "Gümrük ve düzenleme değişiklikleri için bildirim ve uyarlama prosedürleri belirlenmeli."
-            ]
-        elif "SÖZLEŞME" in cat_upper:
-            pool = [
-                "Sözleşme/onay süreçleri netleştirilmeli, SLA ve değişiklik yönetimi uygulanmalı.",
-                "Claim ve değişiklik kayıtları sistematik tutulmalı; kapsam netliği sağlanmalı."
-            ]
-        elif "TEDARİK" in cat_upper or "ALTYÜKLENİCİ" in cat_upper:
-            pool = [
-                "Tedarik/altyüklenici riskleri; alternatif kaynak ve teslim KPI’larıyla yönetilsin.",
-                "Kritik malzemelerde dual-sourcing ve kalite kabul kriterleri sözleşmeye bağlanmalı."
-            ]
-        elif "YÖNETSEL" in cat_upper:
-            pool = [
-                "Yönetim/koordinasyon riskleri; RACI ve düzenli raporlama ile iyileştirilsin.",
-                "Karar kayıtları ve iletişim planı olmadan işe başlanmamalı."
-            ]
-        else:
-            pool = [
-                "Risk, ilgili süreç kontrolleri ve net sorumluluklarla yönetilmelidir.",
-                "Ön koşullar, kalite kontrolleri ve sahiplik atamaları netleştirilsin."
-            ]
-
-    # 4) num kadar seç ve döndür
-    k = max(1, int(num))
-    picked = _weighted_sample(pool, k, rnd)
-
+        pool = _fallback_pool(category)
+    picked = _weighted_sample(pool, max(1, int(num)), rnd)
     if num == 1:
         return picked[0]
     return picked
+
+def one_liner(title: str, category: str, num: int = 1, seed: Optional[int] = None) -> str | List[str]:
+    """
+    Başlık + kategoriye göre 1 ya da N adet kısa öneri cümlesi döndürür.
+    - num=1 -> string (geriye dönük uyum)
+    - num>1 -> List[str]
+    """
+    return _pick(_collect_keys_from_title(title), category, num, random.Random(seed))
+
+def one_liners(rows: Iterable[Any], num: int = 1, seed: Optional[int] = None) -> List[str | List[str]]:
+    """
+    one_liner'ın toplu hali. rows: (başlık, kategori) çiftleri ya da
+    {"title", "category"} sözlükleri. Tek RNG kullanılır (seed ile tekrarlanabilir);
+    aynı normalize başlığın anahtarları bir kez çıkarılır.
+    """
+    rnd = random.Random(seed)
+    memo: Dict[str, List[str]] = {}
+    out: List[str | List[str]] = []
+    for row in rows:
+        if isinstance(row, dict):
+            title, category = row.get("title") or "", row.get("category") or ""
+        else:
+            title, category = row
+        t = _norm(title)
+        if t not in memo:
+            memo[t] = _collect_keys_from_title(t)
+        out.append(_pick(memo[t], category, num, rnd))
+    return out
@@ -3,106 +3,865 @@ from __future__ import annotations
 
 import os
 import json
+import time
+import shutil
+import contextlib
 import numpy as np
-from typing import Dict, Tuple, Optional, TYPE_CHECKING, Any
+import scipy.sparse as sp
+from collections.abc import Mapping, MutableMapping, Sequence
+from typing import Dict, Tuple, Optional, TYPE_CHECKING, Any, Iterator, List
+
+try:
+    import fcntl  # POSIX dosya kilidi (Windows'ta yok)
+except Exception:
+    fcntl = None
 
 # Sadece tip kontrolü sırasında import (runtime'da import ETMEZ -> dairesel import olmaz)
 if TYPE_CHECKING:
-    from .engine import EmbIndex  # pragma: no cover
+    from .engine import EmbIndex, LocalEncoder  # pragma: no cover
 
 DATA_DIR = os.getenv("AI_DATA_DIR", "ai_data")
 
-# Dosya adları (engine ile uyumlu + eski adla geriye dönük uyum)
-NEW_VEC_NAME = "embeddings.npy"
-OLD_VEC_NAME = "emb.npy"
-META_NAME    = "meta.json"
+FORMAT_VERSION = 2
+
+# Sürümlü yayın: her kurulum/sıkıştırma versions/<ad>/ altına yazılır, ardından
+# CURRENT (içinde sürüm adı) atomik rename ile yeni sürüme çevrilir.
+CURRENT_NAME     = "CURRENT"
+VERSIONS_DIRNAME = "versions"
+KEEP_VERSIONS    = int(os.getenv("AI_KEEP_VERSIONS", "2"))  # CURRENT dışında tutulacak eski sürüm sayısı
+
+# v2 dosya adları
+HEADER_NAME       = "index_header.json"  # {format, kind, dim, count, dtype, labels[]}
+DENSE_VEC_NAME    = "vectors.npy"        # (N, dim) float32, L2-normlu — mmap_mode="r" ile açılır
+SPARSE_VEC_NAME   = "vectors.npz"        # (N, dim) CSR float32, L2-normlu (TF-IDF)
+IDS_NAME          = "ids.npy"            # (N,) int64
+LABEL_CODES_NAME  = "label_codes.npy"    # (N,) int32 -> header["labels"][kod]
+TEXT_OFFSETS_NAME = "text_offsets.npy"   # (N+1,) int64 -> texts.bin içindeki bayt aralıkları
+TEXT_BLOB_NAME    = "texts.bin"          # UTF-8 metinler art arda
+EXTRA_NAME        = "meta_extra.json"    # {id: {source, tags, ...}} — yalnızca ek alanı olanlar
+QUANT_VEC_NAME    = "vectors_q.npy"      # (N, dim) float16 | int8 — header["quant"] (AI_QUANT) varsa
+QUANT_SCALES_NAME = "vector_scales.npy"  # (N,) float32 — yalnızca int8
+
+# Artımlı güncelleme (delta segmenti) — sıkıştırmada ana dosyalara katlanır
+DELTA_IDS_NAME    = "delta_ids.npy"        # (M,) int64
+DELTA_DENSE_NAME  = "delta_vectors.npy"    # (M, dim) float32, L2-normlu
+DELTA_SPARSE_NAME = "delta_vectors.npz"    # (M, dim) CSR
+DELTA_ROWS_NAME   = "delta_rows.json"      # [{text, label, ...}] (M)
+TOMBSTONES_NAME   = "tombstones.npy"       # ana dosyada geçersiz id'ler
+LOCK_NAME         = "index.lock"           # kök dizinde (tüm sürümler için tek yazıcı kilidi)
+DELTA_LOCK_NAME   = "delta.lock"           # sürüm dizininde: delta yazımı özel, okuması paylaşımlı kilit
+
+WRITE_CHUNK = 8192  # yoğun vektörler bu kadar satırlık dilimlerle normlanıp yazılır
+
+# Eski (v1) dosya adları — yalnızca göç (migration) sırasında okunur
+NEW_VEC_NAME        = "embeddings.npy"
+OLD_VEC_NAME        = "emb.npy"
+LEGACY_SPARSE_NAME  = "embeddings.npz"
+META_NAME           = "meta.json"
+
+# Encoder durumu (TF-IDF fallback'te sorgular indeks uzayında kodlansın diye)
+ENCODER_NAME     = "encoder.json"      # {backend, model_name, dim, params}
+TFIDF_VOCAB_NAME = "tfidf_vocab.json"  # [terim0, terim1, ...]  (sütun sırası)
+TFIDF_IDF_NAME   = "tfidf_idf.npy"     # (dim,) float64
+
+
+# -------------------------------
+#  Metin blob'u üzerinde tembel görünümler
+# -------------------------------
+class TextBlob(Sequence):
+    """texts.bin + text_offsets.npy: i. metin talep edildiğinde çözülür."""
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self._blob = blob
+        self._off = offsets
+
+    def __len__(self) -> int:
+        return max(int(self._off.shape[0]) - 1, 0)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        a, b = int(self._off[i]), int(self._off[i + 1])
+        return bytes(self._blob[a:b]).decode("utf-8")
+
+
+class MetaStore(MutableMapping):
+    """
+    {id: {"text", "label", ...}} görünümü. Diskteki satırlar talep anında
+    kurulur; sonradan eklenen/güncellenen kayıtlar bellekte üstüne yazılır.
+    AILocal.meta yerine birebir kullanılabilir.
+    """
+    def __init__(self, ids: np.ndarray, label_codes: np.ndarray, label_names: List[str],
+                 texts: TextBlob, extra: Dict[int, Dict[str, Any]]):
+        self._ids = ids
+        self._order = np.argsort(ids, kind="stable")
+        self._sorted = ids[self._order]
+        self._codes = label_codes
+        self._names = label_names
+        self._texts = texts
+        self._extra = extra
+        self._over: Dict[int, Dict[str, Any]] = {}
+        self._deleted: set = set()
+
+    def _pos(self, key: int) -> Optional[int]:
+        i = int(np.searchsorted(self._sorted, key))
+        if i < self._sorted.shape[0] and int(self._sorted[i]) == key:
+            return int(self._order[i])
+        return None
+
+    def row(self, n: int) -> Dict[str, Any]:
+        rid = int(self._ids[n])
+        d = {"text": self._texts[n], "label": self._names[int(self._codes[n])]}
+        d.update(self._extra.get(rid, {}))
+        return d
+
+    def __getitem__(self, key) -> Dict[str, Any]:
+        key = int(key)
+        if key in self._over:
+            return self._over[key]
+        if key in self._deleted:
+            raise KeyError(key)
+        n = self._pos(key)
+        if n is None:
+            raise KeyError(key)
+        return self.row(n)
+
+    def __setitem__(self, key, value) -> None:
+        key = int(key)
+        self._deleted.discard(key)
+        self._over[key] = value
+
+    def __delitem__(self, key) -> None:
+        key = int(key)
+        if key not in self:
+            raise KeyError(key)
+        self._over.pop(key, None)
+        if self._pos(key) is not None:
+            self._deleted.add(key)
+
+    def __iter__(self) -> Iterator[int]:
+        for rid in self._ids.tolist():
+            if rid not in self._deleted:
+                yield rid
+        for rid in self._over:
+            if self._pos(rid) is None:
+                yield rid
+
+    def __len__(self) -> int:
+        extra_new = sum(1 for rid in self._over if self._pos(rid) is None)
+        return int(self._ids.shape[0]) - len(self._deleted) + extra_new
+
+
+class _Permuted(Sequence):
+    """rows[perm[i]] görünümü: yeniden sıralamada satırlar kopyalanmaz."""
+    def __init__(self, base: Sequence, perm: np.ndarray):
+        self._base = base
+        self._perm = perm
+
+    def __len__(self) -> int:
+        return int(self._perm.shape[0])
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return self._base[int(self._perm[i])]
+
+
+def _replace_with(path: str, write) -> None:
+    """
+    Geçici dosyaya yazıp os.replace ile değiştirir. Eski dosyayı mmap etmiş
+    süreçler eski inode'u okumaya devam eder (yerinde kesme -> SIGBUS olmaz).
+    """
+    tmp = f"{path}.tmp-{os.getpid()}"
+    with open(tmp, "wb") as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+def _save_npy(path: str, arr: np.ndarray) -> None:
+    _replace_with(path, lambda f: np.save(f, arr))
+
+
+def _save_npz(path: str, mat) -> None:
+    _replace_with(path, lambda f: sp.save_npz(f, mat))
+
+
+def _save_json(path: str, obj: Any) -> None:
+    data = json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    _replace_with(path, lambda f: f.write(data))
+
+
+@contextlib.contextmanager
+def _flock(fh, exclusive: bool) -> Iterator[None]:
+    """Açık dosya üzerinde flock (özel / paylaşımlı); fcntl yoksa kilitsiz."""
+    if fcntl is None:
+        yield
+        return
+    fcntl.flock(fh, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+    try:
+        yield
+    finally:
+        fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def index_token(data_dir: Optional[str] = None) -> Tuple[Optional[str], Optional[int]]:
+    """
+    Yayınlanmış indeksin ucuz imzası: (CURRENT'taki sürüm adı, tombstones.npy mtime).
+    Sürüm değişimi (yeni kurulum / sıkıştırma) ya da başka bir worker'ın yazdığı
+    delta imzayı değiştirir; motor sıcak yeniden yükleme için bunu yoklar.
+    """
+    root = data_dir or DATA_DIR
+    try:
+        with open(os.path.join(root, CURRENT_NAME), "r", encoding="utf-8") as f:
+            name: Optional[str] = f.read().strip() or None
+    except OSError:
+        name = None
+    vdir = os.path.join(root, VERSIONS_DIRNAME, name) if name else root
+    try:
+        ts: Optional[int] = os.stat(os.path.join(vdir, TOMBSTONES_NAME)).st_mtime_ns
+    except OSError:
+        ts = None
+    return name, ts
+
+
+def _open_blob(path: str) -> np.ndarray:
+    # boş dosya mmap edilemez
+    if os.path.getsize(path) == 0:
+        return np.empty(0, dtype=np.uint8)
+    return np.memmap(path, dtype=np.uint8, mode="r")
 
 
 class Storage:
     """
-    Embedding vektörlerini ve metayı basit dosyalara yazar/okur:
+    Embedding vektörlerini ve metayı v2 biçiminde yazar/okur:
 
       ai_data/
-        - embeddings.npy  -> (N, dim) float32   (yeni)
-        - emb.npy         -> (N, dim) float32   (eski; okunur ve kaydederken de güncellenir)
-        - meta.json       -> (yeni) { id: {text, label, ...}, ... }
-                             (eski) { ids:[], texts:[], labels:[], dim:int, use_faiss:bool }
+        - index_header.json -> {format: 2, kind: dense|sparse, dim, count, dtype, labels: [...]}
+        - vectors.npy       -> (N, dim) float32, L2-normlu; mmap ile açılır (worker'lar page cache paylaşır).
+                               Satırlar etikete göre gruplu: her etiket bitişik bir dilimdir
+        - vectors.npz       -> (N, dim) CSR float32 (TF-IDF seyrek indeks; vectors.npy yerine)
+        - vectors_q.npy (+ vector_scales.npy) -> AI_QUANT=float16|int8 ise sıkıştırılmış kopya (aday taraması)
+        - ids.npy / label_codes.npy / text_offsets.npy -> kompakt diziler
+        - texts.bin         -> UTF-8 metin blob'u
+        - meta_extra.json   -> yalnızca ek alanı olan kayıtlar (paper_rule source/tags vb.)
+        - delta_*, tombstones.npy -> artımlı güncellemeler (compact() ile ana dosyalara katlanır)
+        - bm25.npz + bm25_vocab.json -> Türkçe katlanmış BM25 ters indeks (lexical.BM25Index)
+        - encoder.json      -> hangi encoder ile kurulduğu
+        - tfidf_vocab.json + tfidf_idf.npy -> TF-IDF modunda fit edilmiş sözlük ve IDF
+
+    Yukarıdaki dosyalar bir sürüm dizinindedir: ai_data/versions/<ad>/. Kök
+    dizindeki CURRENT dosyası yayınlanmış sürümün adını tutar. Tam kurulum ve
+    compact() yeni bir dizine yazar, CURRENT'ı atomik rename ile değiştirir;
+    okuyan worker hiçbir zaman yarım yazılmış/karışık dosya görmez. Delta
+    dosyaları yayınlanmış sürümün içinde, kilit altında güncellenir; okuyucu
+    yalnızca sürümün delta.lock'unu paylaşımlı alır (index.lock'a dokunmaz).
+    CURRENT yoksa dosyalar kök dizinden okunur (sürümlemeden önceki düzen).
+
+    Eski biçim (embeddings.npy / emb.npy / embeddings.npz + meta.json) yalnızca
+    index_header.json yokken okunur ve v2'ye göç ettirilir.
     """
     def __init__(self, data_dir: Optional[str] = None):
-        self.dir = data_dir or DATA_DIR
-        os.makedirs(self.dir, exist_ok=True)
-        self.new_vec_path = os.path.join(self.dir, NEW_VEC_NAME)
-        self.old_vec_path = os.path.join(self.dir, OLD_VEC_NAME)
-        self.meta_path    = os.path.join(self.dir, META_NAME)
+        self.root = data_dir or DATA_DIR
+        os.makedirs(self.root, exist_ok=True)
+        self.current_path = os.path.join(self.root, CURRENT_NAME)
+        self.versions_dir = os.path.join(self.root, VERSIONS_DIRNAME)
+        self.lock_path    = os.path.join(self.root, LOCK_NAME)
+        # eski biçim (her zaman kök dizinde)
+        self.new_vec_path = os.path.join(self.root, NEW_VEC_NAME)
+        self.old_vec_path = os.path.join(self.root, OLD_VEC_NAME)
+        self.legacy_sparse_path = os.path.join(self.root, LEGACY_SPARSE_NAME)
+        self.meta_path    = os.path.join(self.root, META_NAME)
+        self._refresh()
+
+    def _refresh(self) -> None:
+        """CURRENT'ı yeniden okuyup yol alanlarını yayınlanmış sürüme bağlar."""
+        self.version = self.current_version()
+        self._bind(os.path.join(self.versions_dir, self.version) if self.version else self.root)
+
+    def _bind(self, directory: str) -> None:
+        self.dir = directory
+        p = lambda name: os.path.join(self.dir, name)  # noqa: E731
+        self.header_path  = p(HEADER_NAME)
+        self.dense_path   = p(DENSE_VEC_NAME)
+        self.sparse_path  = p(SPARSE_VEC_NAME)
+        self.ids_path     = p(IDS_NAME)
+        self.codes_path   = p(LABEL_CODES_NAME)
+        self.offsets_path = p(TEXT_OFFSETS_NAME)
+        self.blob_path    = p(TEXT_BLOB_NAME)
+        self.extra_path   = p(EXTRA_NAME)
+        self.quant_path   = p(QUANT_VEC_NAME)
+        self.scales_path  = p(QUANT_SCALES_NAME)
+        self.delta_ids_path    = p(DELTA_IDS_NAME)
+        self.delta_dense_path  = p(DELTA_DENSE_NAME)
+        self.delta_sparse_path = p(DELTA_SPARSE_NAME)
+        self.delta_rows_path   = p(DELTA_ROWS_NAME)
+        self.tombstones_path   = p(TOMBSTONES_NAME)
+        self.delta_lock_path   = p(DELTA_LOCK_NAME)
+        # encoder
+        self.encoder_path = p(ENCODER_NAME)
+        self.vocab_path   = p(TFIDF_VOCAB_NAME)
+        self.idf_path     = p(TFIDF_IDF_NAME)
+
+    def has_v2(self) -> bool:
+        return os.path.exists(self.header_path)
+
+    # -------------------- SÜRÜMLER --------------------
+    def current_version(self) -> Optional[str]:
+        try:
+            with open(self.current_path, "r", encoding="utf-8") as f:
+                name = f.read().strip()
+        except OSError:
+            return None
+        return name if name and os.path.isdir(os.path.join(self.versions_dir, name)) else None
+
+    def list_versions(self) -> List[str]:
+        if not os.path.isdir(self.versions_dir):
+            return []
+        return sorted(d for d in os.listdir(self.versions_dir)
+                      if os.path.isdir(os.path.join(self.versions_dir, d)))
+
+    @contextlib.contextmanager
+    def _staging(self):
+        """
+        Yeni sürüm dizini açar ve yolları ona bağlar; blok hatasız biterse
+        CURRENT'ı atomik olarak yeni sürüme çevirir (hata olursa dizin silinir).
+        Kilit altında çağrılmalıdır.
+        """
+        name = time.strftime("v%Y%m%d-%H%M%S") + f"-{time.time_ns() % 1_000_000_000:09d}"
+        path = os.path.join(self.versions_dir, name)
+        os.makedirs(path)
+        prev = self.dir
+        self._bind(path)
+        try:
+            yield name
+        except BaseException:
+            self._bind(prev)
+            shutil.rmtree(path, ignore_errors=True)
+            raise
+        self._publish(name)
+
+    def _publish(self, name: str) -> None:
+        tmp = f"{self.current_path}.tmp-{os.getpid()}"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(name)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.current_path)  # atomik işaretçi değişimi
+        self.version = name
+        self._prune()
+
+    def _prune(self) -> None:
+        """CURRENT + en yeni KEEP_VERSIONS eski sürüm kalır. mmap'li açık dosyalar (POSIX) silinse de geçerlidir."""
+        old = [v for v in self.list_versions() if v != self.version]
+        for name in old[:max(len(old) - KEEP_VERSIONS, 0)]:
+            shutil.rmtree(os.path.join(self.versions_dir, name), ignore_errors=True)
+
+    def _carry_encoder(self, src_dir: str) -> None:
+        """Önceki sürümün encoder dosyalarını yeni sürüme taşır (sıkıştırma/göçte encoder değişmez)."""
+        for name in (ENCODER_NAME, TFIDF_VOCAB_NAME, TFIDF_IDF_NAME):
+            src = os.path.join(src_dir, name)
+            if os.path.exists(src):
+                shutil.copy2(src, os.path.join(self.dir, name))
+
+    def read_header(self) -> Dict[str, Any]:
+        with open(self.header_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    @contextlib.contextmanager
+    def lock(self):
+        """
+        Yazıcılar arası (çoklu worker) özel kilit; fcntl yoksa kilitsiz.
+        Yalnızca yazıcılar alır (index.lock gerekirse oluşturulur); yükleme bu
+        kilidi almaz, uzun bir compact() okuyucuları bekletmez.
+        """
+        with open(self.lock_path, "a") as fh, _flock(fh, exclusive=True):
+            yield
+
+    @contextlib.contextmanager
+    def _delta_write_lock(self):
+        """Delta dosyaları yazılırken özel kilit (self.lock() altında çağrılır)."""
+        with open(self.delta_lock_path, "a") as fh, _flock(fh, exclusive=True):
+            yield
+
+    @contextlib.contextmanager
+    def _delta_read_lock(self):
+        """
+        Delta dosyalarını birlikte (yarım güncelleme görmeden) okumak için
+        paylaşımlı kilit. delta.lock salt okunur açılır; yoksa (önceki sürümlerde
+        yazılmış indeks) kilitsiz okunur. Okuyucu diske hiçbir şey yazmaz.
+        """
+        try:
+            fh = open(self.delta_lock_path, "r")
+        except FileNotFoundError:
+            yield
+            return
+        with fh, _flock(fh, exclusive=False):
+            yield
 
     # -------------------- SAVE --------------------
-    def save_index(self, idx: "EmbIndex", meta: Optional[Dict[int, Dict]] = None, vecs: Optional[np.ndarray] = None) -> None:
+    def save_index(self, idx: "EmbIndex", meta: Optional[Dict[int, Dict]] = None, vecs: Optional[np.ndarray] = None,
+                   encoder: Optional["LocalEncoder"] = None, corpus: Optional[str] = None) -> None:
         """
         İki kullanım da desteklenir:
           - save_index(idx, meta=meta_map)         -> vektörleri idx._X'ten alır
           - save_index(idx, vecs=emb_matrix)       -> metayı idx.{ids,texts,labels} ile oluşturur
+        Satır sırası idx.ids'tir (yoksa meta sırası). encoder verilirse durumu da yazılır.
+        corpus: indekslenen tablolar ('suggestions' | 'risks' | 'both') — artımlı güncelleme okur.
         """
-        # 1) Vektör matrisi
-        V: Optional[np.ndarray] = None
-        if vecs is not None:
-            V = np.asarray(vecs, dtype=np.float32)
-        else:
+        # ids diskten yüklenmiş indekste np.ndarray'dir: doğruluk değeriyle sınanamaz
+        idx_ids: List[int] = list(getattr(idx, "ids", None) if getattr(idx, "ids", None) is not None else [])
+        idx_texts: List[str] = list(getattr(idx, "texts", None) or [])
+        idx_labels: List[str] = list(getattr(idx, "labels", None) or [])
+        V: Any = vecs
+        if V is None and hasattr(idx, "has_changes") and idx.has_changes():
+            # artımlı değişiklikler: ana + delta birleşik yazılır
+            V, idx_ids, idx_texts, idx_labels = idx.merged()
+        elif V is None:
             V = getattr(idx, "_X", None)
-            if V is not None:
-                V = np.asarray(V, dtype=np.float32)
-            else:
-                # FAISS kullanılıyorsa _X olmayabilir; bu durumda vecs parametresi zorunlu
-                raise RuntimeError(
-                    "Vektör matrisi bulunamadı. FAISS ile fit ettiysen 'save_index(idx, vecs=...)' şeklinde çağır."
-                )
-
-        # 2) Meta
-        if meta is None:
-            # idx alanlarından yeni şema üret
-            meta_dict: Dict[int, Dict[str, Any]] = {
-                int(rid): {"text": txt, "label": lab}
-                for rid, txt, lab in zip(getattr(idx, "ids", []), getattr(idx, "texts", []), getattr(idx, "labels", []))
-            }
+
+        # 1) Vektör matrisi (seyrek indekste CSR olarak kalır)
+        if V is None:
+            # FAISS kullanılıyorsa _X olmayabilir; bu durumda vecs parametresi zorunlu
+            raise RuntimeError(
+                "Vektör matrisi bulunamadı. FAISS ile fit ettiysen 'save_index(idx, vecs=...)' şeklinde çağır."
+            )
+        if not sp.issparse(V):
+            V = np.asarray(V, dtype=np.float32)
+
+        # 2) Satır sırası + meta
+        if len(idx_ids) == V.shape[0]:
+            ids = [int(x) for x in idx_ids]
+        elif meta is not None and len(meta) == V.shape[0]:
+            ids = [int(k) for k in meta.keys()]
+            idx_texts, idx_labels = [], []
         else:
-            # zaten yeni şema
-            meta_dict = {int(k): v for k, v in meta.items()}
+            raise ValueError(f"Vektör satır sayısı ({V.shape[0]}) ile id sayısı eşleşmiyor.")
+
+        rows: List[Dict[str, Any]] = []
+        for n, rid in enumerate(ids):
+            m = dict(meta.get(rid) or meta.get(str(rid)) or {}) if meta is not None else {}
+            if "text" not in m:
+                m["text"] = idx_texts[n] if n < len(idx_texts) else ""
+            if "label" not in m:
+                m["label"] = idx_labels[n] if n < len(idx_labels) else ""
+            rows.append(m)
+
+        self.write_index(V, ids, rows, encoder=encoder, corpus=corpus)
+
+    def write_index(self, V: Any, ids: Sequence, rows: Sequence,
+                    encoder: Optional["LocalEncoder"] = None, corpus: Optional[str] = None) -> None:
+        """
+        Vektör matrisi + satırlardan yeni sürüm yayınlar (kilit + staging).
+        V mmap'li bir dosya olabilir, rows tembel bir Sequence olabilir
+        (pipeline.SpooledCorpus): yoğun vektörler dilim dilim yazılır.
+        """
+        with self.lock():
+            self._refresh()
+            prev = self.dir
+            with self._staging():
+                self._write_v2(V, ids, rows, corpus=corpus)
+                if encoder is not None:
+                    self.save_encoder(encoder)
+                else:
+                    self._carry_encoder(prev)
+
+    def _write_v2(self, V: Any, ids: List[int], rows: List[Dict[str, Any]],
+                  corpus: Optional[str] = None, quant: Optional[str] = None) -> None:
+        from .engine import _l2_normalize_sparse, QUANT_MODE  # type: ignore
+
+        quant = QUANT_MODE if quant is None else quant
+
+        # Satırlar etikete göre gruplanır (ilk görülme sırası, grup içi sıra korunur):
+        # her etiket bölümü mmap'te bitişik bir dilim olur -> EmbIndex.partitions()
+        first: Dict[str, int] = {}
+        lab_code = [first.setdefault(str(m.get("label") or ""), len(first)) for m in rows]
+        perm: Optional[np.ndarray] = None
+        if any(a > b for a, b in zip(lab_code, lab_code[1:])):
+            perm = np.argsort(np.asarray(lab_code, dtype=np.int64), kind="stable")
+            ids = [ids[i] for i in perm]
+            rows = _Permuted(rows, perm)
+            if sp.issparse(V):
+                V = V[perm]
+
+        # Başlık en son yazılır: yarım kalan yazımda eski başlık kalmasın
+        if os.path.exists(self.header_path):
+            os.remove(self.header_path)
+
+        kind = "sparse" if sp.issparse(V) else "dense"
+        stale = []
+        if kind == "sparse":
+            quant = ""
+            _save_npz(self.sparse_path, _l2_normalize_sparse(V))
+            stale.append(self.dense_path)
+        else:
+            self._write_dense(V, perm, quant)
+            stale.append(self.sparse_path)
+        if not quant:
+            stale.append(self.quant_path)
+        if quant != "int8":
+            stale.append(self.scales_path)
+        for path in stale:
+            if os.path.exists(path):
+                os.remove(path)
+
+        label_names: List[str] = []
+        label_pos: Dict[str, int] = {}
+        codes = np.empty(len(rows), dtype=np.int32)
+        offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        extra: Dict[str, Dict[str, Any]] = {}
+        blob_tmp = f"{self.blob_path}.tmp-{os.getpid()}"
+        with open(blob_tmp, "wb") as blob:
+            for n, (rid, m) in enumerate(zip(ids, rows)):
+                lab = str(m.get("label") or "")
+                if lab not in label_pos:
+                    label_pos[lab] = len(label_names)
+                    label_names.append(lab)
+                codes[n] = label_pos[lab]
+                data = str(m.get("text") or "").encode("utf-8")
+                blob.write(data)
+                offsets[n + 1] = offsets[n] + len(data)
+                rest = {k: v for k, v in m.items() if k not in ("text", "label")}
+                if rest:
+                    extra[str(rid)] = rest
+        os.replace(blob_tmp, self.blob_path)
 
-        # 3) Yaz
-        np.save(self.new_vec_path, V.astype(np.float32))
-        # Geriye dönük uyumluluk için eski ada da yaz
+        _save_npy(self.ids_path, np.asarray(ids, dtype=np.int64))
+        _save_npy(self.codes_path, codes)
+        _save_npy(self.offsets_path, offsets)
+        _save_json(self.extra_path, extra)
+
+        # Sözcüksel (BM25) indeks: aynı satır sırasıyla, sürümle birlikte yayınlanır
+        from .lexical import BM25Index  # type: ignore
+        BM25Index.build(str(m.get("text") or "") for m in rows).save(self.dir)
+
+        header = {
+            "format": FORMAT_VERSION,
+            "kind": kind,
+            "dim": int(V.shape[1]),
+            "count": int(V.shape[0]),
+            "dtype": "float32",
+            "normalized": True,
+            "labels": label_names,
+        }
+        if quant:
+            header["quant"] = quant
+        if corpus:
+            header["corpus"] = corpus
+        open(self.delta_lock_path, "a").close()  # okuyucular delta'yı paylaşımlı kilitle okur
+        _save_json(self.header_path, header)
+
+    def _write_dense(self, V: Any, perm: Optional[np.ndarray], quant: str) -> None:
+        """
+        Normlanmış float32 (+ varsa sıkıştırılmış) matrisi WRITE_CHUNK satırlık
+        dilimlerle yazar: V (ör. mmap) hiçbir zaman bütünüyle belleğe alınmaz.
+        """
+        from .engine import _l2_normalize, quantize_rows  # type: ignore
+
+        n, dim = int(V.shape[0]), int(V.shape[1])
+        qdtype = {"float16": np.float16, "int8": np.int8}.get(quant)
+        tmp = f"{self.dense_path}.tmp-{os.getpid()}"
+        qtmp = f"{self.quant_path}.tmp-{os.getpid()}"
+        out = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=(n, dim))
+        outq = np.lib.format.open_memmap(qtmp, mode="w+", dtype=qdtype, shape=(n, dim)) if qdtype else None
+        scales = np.empty(n, dtype=np.float32) if quant == "int8" else None
         try:
-            np.save(self.old_vec_path, V.astype(np.float32))
-        except Exception:
-            pass
+            for a in range(0, n, WRITE_CHUNK):
+                b = min(a + WRITE_CHUNK, n)
+                rows = V[perm[a:b]] if perm is not None else V[a:b]
+                block = _l2_normalize(np.asarray(rows, dtype=np.float32)).astype(np.float32)
+                out[a:b] = block
+                if outq is not None:
+                    q, sc = quantize_rows(block, quant)
+                    outq[a:b] = q
+                    if scales is not None:
+                        scales[a:b] = sc
+            out.flush()
+            del out
+            os.replace(tmp, self.dense_path)
+            if outq is not None:
+                outq.flush()
+                del outq
+                os.replace(qtmp, self.quant_path)
+            if scales is not None:
+                _save_npy(self.scales_path, scales)
+        finally:
+            for path in (tmp, qtmp):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    # -------------------- DELTA (artımlı) --------------------
+    def read_delta(self) -> Optional[Dict[str, Any]]:
+        """Diskteki delta segmenti: {ids, X, rows, tombstones} — yoksa None."""
+        has_ts = os.path.exists(self.tombstones_path)
+        has_rows = os.path.exists(self.delta_ids_path)
+        if not (has_ts or has_rows):
+            return None
+        tombstones = set(np.load(self.tombstones_path).tolist()) if has_ts else set()
+        ids: List[int] = []
+        X: Any = None
+        rows: List[Dict[str, Any]] = []
+        if has_rows:
+            ids = [int(x) for x in np.load(self.delta_ids_path).tolist()]
+            if os.path.exists(self.delta_sparse_path):
+                X = sp.load_npz(self.delta_sparse_path).tocsr()
+            elif os.path.exists(self.delta_dense_path):
+                X = np.load(self.delta_dense_path)
+            with open(self.delta_rows_path, "r", encoding="utf-8") as f:
+                rows = json.load(f) or []
+        return {"ids": ids, "X": X, "rows": rows, "tombstones": tombstones}
+
+    def apply_changes(self, X: Any, ids: List[int], rows: List[Dict[str, Any]],
+                      deleted: List[int] = ()) -> int:
+        """
+        Artımlı değişiklikleri delta segmentine yazar (ana dosyalara dokunmaz).
+        X: ids satırlarının L2-normlu vektörleri. Başka worker'ların yazdıklarıyla
+        kilit altında birleştirilir. Dönen: delta'daki satır sayısı.
+        """
+        from .engine import _l2_normalize, _l2_normalize_sparse  # type: ignore
+
+        ids = [int(x) for x in ids]
+        changed = set(ids) | {int(x) for x in deleted}
+        with self.lock():
+            self._refresh()  # başka bir worker bu arada yeni sürüm yayınlamış olabilir
+            base_ids = set(np.load(self.ids_path).tolist())
+            cur = self.read_delta() or {"ids": [], "X": None, "rows": [], "tombstones": set()}
+
+            keep = [i for i, rid in enumerate(cur["ids"]) if rid not in changed]
+            parts = [cur["X"][keep]] if keep and cur["X"] is not None else []
+            d_ids = [cur["ids"][i] for i in keep]
+            d_rows = [cur["rows"][i] for i in keep]
+            if ids:
+                parts.append(_l2_normalize_sparse(X) if sp.issparse(X)
+                             else _l2_normalize(np.asarray(X, dtype=np.float32)))
+                d_ids += ids
+                d_rows += list(rows)
+            tombstones = cur["tombstones"] | (changed & base_ids)
+
+            with self._delta_write_lock():
+                self._write_delta(parts, d_ids, d_rows, tombstones)
+            return len(d_ids)
+
+    def _write_delta(self, parts: List[Any], d_ids: List[int], d_rows: List[Dict[str, Any]],
+                     tombstones: set) -> None:
+        """Delta segmenti dosyalarını yazar (satır yoksa siler); _delta_write_lock altında."""
+        if d_ids:
+            if sp.issparse(parts[0]):
+                _save_npz(self.delta_sparse_path, sp.vstack(parts, format="csr"))
+            else:
+                _save_npy(self.delta_dense_path, np.vstack(parts).astype(np.float32))
+            _save_npy(self.delta_ids_path, np.asarray(d_ids, dtype=np.int64))
+            _save_json(self.delta_rows_path, d_rows)
+        else:
+            for path in (self.delta_ids_path, self.delta_dense_path,
+                         self.delta_sparse_path, self.delta_rows_path):
+                if os.path.exists(path):
+                    os.remove(path)
+        _save_npy(self.tombstones_path, np.asarray(sorted(tombstones), dtype=np.int64))
+
+    def compact(self) -> int:
+        """
+        Delta segmentini ana dosyalara katlar: ölü satırlar atılır, delta eklenir,
+        yeni bir sürüm olarak yazılıp yayınlanır (yeniden encode YOK). Dönen: yeni kayıt sayısı.
+        """
+        with self.lock():
+            self._refresh()
+            delta = self.read_delta()
+            if delta is None:
+                return int(self.read_header().get("count", 0))
+            header = self.read_header()
+            idx, meta = self._load_v2(apply_delta=False)
+            dead = delta["tombstones"] | set(delta["ids"])
+            alive = [i for i, rid in enumerate(idx.ids.tolist()) if rid not in dead]
+
+            V: Any = idx._X[alive]
+            ids = [int(idx.ids[i]) for i in alive]
+            rows = [meta.row(i) for i in alive]
+            if delta["ids"]:
+                X = delta["X"]
+                V = sp.vstack([V, X], format="csr") if sp.issparse(V) else np.vstack([np.asarray(V), X])
+                ids += delta["ids"]
+                rows += delta["rows"]
+
+            prev = self.dir
+            with self._staging():
+                self._write_v2(V, ids, rows, corpus=header.get("corpus"))
+                self._carry_encoder(prev)
+            return len(ids)
+
+    # -------------------- ENCODER --------------------
+    def save_encoder(self, enc: "LocalEncoder") -> None:
+        """Encoder türünü ve (TF-IDF ise) fit edilmiş sözlük + IDF'i yazar."""
+        info: Dict[str, Any] = {"backend": enc.backend, "model_name": enc.model_name}
+        state = enc.tfidf_state() if enc.backend == "tfidf" else None
+        if state is not None:
+            terms, idf = state
+            with open(self.vocab_path, "w", encoding="utf-8") as f:
+                json.dump(terms, f, ensure_ascii=False)
+            np.save(self.idf_path, idf)
+            info["dim"] = len(terms)
+        with open(self.encoder_path, "w", encoding="utf-8") as f:
+            json.dump(info, f, ensure_ascii=False)
+
+    def encoder_info(self) -> Dict[str, Any]:
+        """encoder.json içeriği ({backend, model_name, dim}); yoksa boş."""
+        if not os.path.exists(self.encoder_path):
+            return {}
+        with open(self.encoder_path, "r", encoding="utf-8") as f:
+            return json.load(f) or {}
+
+    def load_encoder(self, model_name: Optional[str] = None) -> "LocalEncoder":
+        """
+        İndeksi kuran encoder'ı geri kurar. TF-IDF ile kurulduysa SBERT yüklenmez ve
+        kaydedilmiş sözlük + IDF yüklenir. encoder.json yoksa (eski indeks) varsayılan encoder.
+        """
+        from .engine import LocalEncoder, MODEL_NAME  # type: ignore
 
-        with open(self.meta_path, "w", encoding="utf-8") as f:
-            json.dump(meta_dict, f, ensure_ascii=False, indent=2)
+        info = self.encoder_info()
+        backend = info.get("backend")
+        enc = LocalEncoder(model_name or info.get("model_name") or MODEL_NAME,
+                           backend="tfidf" if backend == "tfidf" else None)
+        if backend == "tfidf" and os.path.exists(self.vocab_path) and os.path.exists(self.idf_path):
+            with open(self.vocab_path, "r", encoding="utf-8") as f:
+                terms = json.load(f)
+            enc.set_tfidf_state(terms, np.load(self.idf_path))
+        return enc
 
     # -------------------- LOAD --------------------
-    def load_index(self) -> Tuple["EmbIndex", Dict[int, Dict]]:
+    def load_index(self) -> Tuple["EmbIndex", Mapping]:
         """
         İndeksi ve meta haritasını döndürür:
-          return idx, meta_map  # meta_map: {id: {...}}
-        Hem yeni hem eski meta formatını tanır.
+          return idx, meta_map  # meta_map: {id: {...}} (MetaStore)
+        Salt okunur: v2 yoksa eski dosyalar diske yazılmadan bellekte okunur.
+        Kalıcı göç için: python train_ai.py --migrate (migrate_legacy).
         """
+        if not self.has_v2():
+            return self._load_legacy()
+        return self._load_v2()
+
+    def _load_legacy(self) -> Tuple["EmbIndex", Dict[int, Dict[str, Any]]]:
+        from .engine import EmbIndex, QUANT_MODE  # type: ignore
+
+        V, ids, rows = self._read_legacy()
+        if sp.issparse(V):
+            idx = EmbIndex(dim=V.shape[1], sparse=True)
+        else:
+            use_faiss = bool(int(os.getenv("USE_FAISS", "0")) == 1)
+            idx = EmbIndex(dim=V.shape[1], use_faiss=use_faiss, quant=QUANT_MODE)
+        idx.fit(V, ids, [r.get("text", "") for r in rows], [r.get("label", "") for r in rows])
+        return idx, {rid: r for rid, r in zip(ids, rows)}
+
+    def _load_v2(self, apply_delta: bool = True) -> Tuple["EmbIndex", MetaStore]:
         # Dairesel importu kırmak için GECİKMELİ import.
         from .engine import EmbIndex  # type: ignore
 
+        with open(self.header_path, "r", encoding="utf-8") as f:
+            header = json.load(f)
+        if int(header.get("format", 0)) != FORMAT_VERSION:
+            raise ValueError(f"Desteklenmeyen indeks biçimi: {header.get('format')}")
+
+        ids = np.load(self.ids_path)
+        codes = np.load(self.codes_path)
+        offsets = np.load(self.offsets_path)
+        texts = TextBlob(_open_blob(self.blob_path), offsets)
+        label_names = list(header.get("labels") or [])
+        extra: Dict[int, Dict[str, Any]] = {}
+        if os.path.exists(self.extra_path):
+            with open(self.extra_path, "r", encoding="utf-8") as f:
+                extra = {int(k): v for k, v in (json.load(f) or {}).items()}
+        meta = MetaStore(ids, codes, label_names, texts, extra)
+
+        dim, count = int(header["dim"]), int(header["count"])
+        quantized = None
+        if header.get("kind") == "sparse":
+            V = sp.load_npz(self.sparse_path).tocsr()
+            idx = EmbIndex(dim=dim, sparse=True)
+        else:
+            # kopyasız: tüm worker'lar aynı sayfaları paylaşır
+            V = np.load(self.dense_path, mmap_mode="r")
+            use_faiss = bool(int(os.getenv("USE_FAISS", "0")) == 1)
+            quant = header.get("quant")
+            idx = EmbIndex(dim=dim, use_faiss=use_faiss, quant=quant)
+            if quant:
+                # taramada yalnızca sıkıştırılmış sayfalar okunur; float32 yalnızca yeniden sıralamada
+                scales = np.load(self.scales_path) if quant == "int8" else None
+                quantized = (np.load(self.quant_path, mmap_mode="r"), scales)
+        if V.shape != (count, dim) or ids.shape[0] != count:
+            raise ValueError(f"İndeks başlığı ile dosyalar uyuşmuyor: {V.shape} vs ({count}, {dim})")
+
+        idx.load_normalized(V, ids, texts, [label_names[int(c)] for c in codes], quantized=quantized)
+
+        delta = None
+        if apply_delta:
+            with self._delta_read_lock():  # delta dosyaları birlikte yazılır; yarım güncelleme okunmasın
+                delta = self.read_delta()
+        if delta is not None:
+            rows = delta["rows"]
+            idx.apply_changes(delta["X"], delta["ids"],
+                              [str(r.get("text", "")) for r in rows],
+                              [str(r.get("label", "")) for r in rows],
+                              deleted=sorted(delta["tombstones"]), normalized=True)
+            for rid in delta["tombstones"]:
+                meta.pop(rid, None)
+            for rid, row in zip(delta["ids"], rows):
+                meta[rid] = row
+        return idx, meta
+
+    def load_lexical(self, idx: "EmbIndex"):
+        """
+        BM25 indeksini yükler ve idx'in satırlarına bağlar (delta/ölü satırlar dahil).
+        Dosya yoksa (eski sürüm) idx metinlerinden bellekte kurulur.
+        """
+        from .lexical import BM25Index  # type: ignore
+
+        lex = BM25Index.load(self.dir)
+        if lex is None or lex.n_docs != len(idx.ids):
+            lex = BM25Index.build(idx.texts)
+        lex.bind(idx.ids, idx.labels)
+        delta = idx._delta
+        if idx._dead or delta is not None:
+            d_ids, d_texts, d_labels = (delta[1], delta[2], delta[3]) if delta is not None else ([], [], [])
+            lex.apply_changes(d_ids, d_texts, d_labels, deleted=idx._dead)
+        return lex
+
+    # -------------------- MIGRATION (v1 -> v2) --------------------
+    def migrate_legacy(self) -> int:
+        """
+        Eski embeddings.npy / emb.npy / embeddings.npz + meta.json dosyalarını okuyup
+        v2 biçiminde yazar. Eski dosyalara dokunmaz (v2 başlığı varken bir daha okunmazlar).
+        Açık komutla çalışır (train_ai.py --migrate); yükleme yolu diske yazmaz.
+        Dönen: taşınan kayıt sayısı.
+        """
+        V, ids, rows = self._read_legacy()
+        with self.lock():
+            self._refresh()
+            if self.has_v2():
+                return int(self.read_header().get("count", 0))  # başka worker göç ettirdi
+            prev = self.dir
+            with self._staging():
+                self._write_v2(V, ids, rows)
+                self._carry_encoder(prev)
+        return len(ids)
+
+    def _read_legacy(self) -> Tuple[Any, List[int], List[Dict[str, Any]]]:
+        """Eski vektör + meta dosyaları -> (V, ids, rows); satırlar V ile hizalı."""
         # Vektör dosyasını bul
-        if os.path.exists(self.new_vec_path):
+        if os.path.exists(self.legacy_sparse_path):
+            vec_path = self.legacy_sparse_path
+        elif os.path.exists(self.new_vec_path):
             vec_path = self.new_vec_path
         elif os.path.exists(self.old_vec_path):
             vec_path = self.old_vec_path
         else:
             raise FileNotFoundError(
-                f"AI indeks vektör dosyası bulunamadı: {self.new_vec_path} veya {self.old_vec_path}"
+                f"AI indeks vektör dosyası bulunamadı: {self.header_path}, {self.new_vec_path} veya {self.old_vec_path}"
             )
 
         if not os.path.exists(self.meta_path):
             raise FileNotFoundError(f"AI indeks meta dosyası bulunamadı: {self.meta_path}")
 
-        # Yüklemeler
-        V = np.load(vec_path).astype(np.float32)
+        if vec_path == self.legacy_sparse_path:
+            V: Any = sp.load_npz(vec_path).tocsr()
+        else:
+            V = np.load(vec_path).astype(np.float32)
         with open(self.meta_path, "r", encoding="utf-8") as f:
             meta_any = json.load(f)
 
@@ -112,40 +871,16 @@ class Storage:
             ids = [int(x) for x in meta_any.get("ids", [])]
             texts = list(meta_any.get("texts", []))
             labels = list(meta_any.get("labels", []))
-            use_faiss = bool(meta_any.get("use_faiss", False))
             dim_meta = int(meta_any.get("dim", 0))
             if dim_meta and V.shape[1] != dim_meta:
                 raise ValueError(f"Vektör boyutu uyuşmuyor: V.shape[1]={V.shape[1]} meta.dim={dim_meta}")
-            meta_map: Dict[int, Dict] = {int(rid): {"text": t, "label": lab} for rid, t, lab in zip(ids, texts, labels)}
+            rows = [{"text": t, "label": lab} for t, lab in zip(texts, labels)]
         else:
             # YENİ ŞEMA: { "123": {"text": "...", "label": "...", ...}, ... }
-            meta_map = {int(k): v for k, v in meta_any.items()}
-            # list'leri idx'e verebilmek için çıkart
-            ids   = sorted(meta_map.keys())
-            texts = [str(meta_map[i].get("text", "")) for i in ids]
-            labels= [str(meta_map[i].get("label", "")) for i in ids]
-            # use_faiss bilgisini meta'dan alamayabiliriz; env'e bırak
-            use_faiss = bool(int(os.getenv("USE_FAISS", "0")) == 1)
-
-        # EmbIndex kur
-        dim = V.shape[1]
-        idx = EmbIndex(dim=dim, use_faiss=use_faiss)
-        # fit sırasında hem FAISS hem sklearn tarafı düzgün çalışsın diye:
-        # - sklearn: _X set + fit
-        # - faiss:   add + ayrıca _X set (kaydedebilmek için)
-        setattr(idx, "ids", ids)
-        setattr(idx, "texts", texts)
-        setattr(idx, "labels", labels)
-
-        try:
-            if getattr(idx, "use_faiss", False):
-                idx.index.add(V.astype(np.float32))  # FAISS
-                setattr(idx, "_X", V.astype(np.float32))  # kaydetme uyumluluğu
-            else:
-                setattr(idx, "_X", V.astype(np.float32))
-                idx.index.fit(getattr(idx, "_X"))
-        except Exception:
-            # Her halükârda _X setli olsun
-            setattr(idx, "_X", V.astype(np.float32))
+            # Satırlar dosyadaki (yazım) sırasıyla hizalıdır
+            ids = [int(k) for k in meta_any.keys()]
+            rows = [dict(v) for v in meta_any.values()]
 
-        return idx, meta_map
+        if len(ids) != V.shape[0]:
+            raise ValueError(f"Vektör satır sayısı ({V.shape[0]}) ile meta kayıt sayısı ({len(ids)}) uyuşmuyor.")
+        return V, ids, rows
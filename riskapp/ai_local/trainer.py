@@ -1,12 +1,16 @@
 # riskapp/ai_local/trainer.py
 from __future__ import annotations
 
-from typing import List, Tuple, Dict, Set
+import hashlib
+import shutil
+import tempfile
+from typing import Any, Iterator, List, Optional, Tuple, Dict, Set
 
 # Proje içi relative importlar
 from ..models import db, Suggestion, Risk  # type: ignore
-from .engine import LocalEncoder, EmbIndex
+from .engine import MODEL_NAME, LocalEncoder, reset_engine
 from .storage import Storage
+from .pipeline import BUILD_CHUNK, EncodePipeline, ProgressFn, SpooledCorpus
 
 # (opsiyonel) Makale bazlı bilgi kartlarını korpusa eklemek için:
 try:
@@ -18,10 +22,51 @@ import os
 
 ID_OFFSET = 1_000_000  # Risk ve Suggestion id'leri çakışmasın diye
 
+# Son build_index çağrısının kodlama raporu: {rows, hits, misses, encoded, encode_seconds, ...}
+LAST_BUILD_STATS: Dict[str, Any] = {}
+
+
+def iter_corpus(kind: str = "suggestions", min_len: int = 5,
+                chunk: int = BUILD_CHUNK) -> Iterator[Tuple[int, str, str]]:
+    """
+    Korpusu veritabanından akış halinde (yield_per) okur; ORM nesnesi
+    kurulmaz, yalnızca gereken sütunlar çekilir. Tekrar edenler (aynı
+    text + label) atlanır — bunun için yalnızca 16 baytlık özetler tutulur.
+
+    Yields
+    ------
+    (id:int, text:str, label:str) — fetch_corpus ile aynı şema ve sıra.
+    """
+    seen: Set[bytes] = set()
+
+    def fresh(txt: str, lab: str) -> bool:
+        key = hashlib.blake2b(f"{txt}\0{lab}".encode("utf-8"), digest_size=16).digest()
+        if key in seen:
+            return False
+        seen.add(key)
+        return True
+
+    if kind in ("suggestions", "both"):
+        q = (db.session.query(Suggestion.id, Suggestion.text, Suggestion.category)
+             .order_by(Suggestion.id).yield_per(chunk))
+        for sid, text, cat in q:
+            txt = (text or "").strip()
+            if len(txt) >= min_len and fresh(txt, cat or ""):
+                yield int(sid), txt, cat or ""
+
+    if kind in ("risks", "both"):
+        q = (db.session.query(Risk.id, Risk.title, Risk.description, Risk.category)
+             .order_by(Risk.id).yield_per(chunk))
+        for rid, title, desc, cat in q:
+            # Açıklama yoksa başlık kullan
+            txt = (desc or title or "").strip()
+            if len(txt) >= min_len and fresh(txt, cat or ""):
+                yield ID_OFFSET + int(rid), txt, cat or ""
+
 
 def fetch_corpus(kind: str = "suggestions", min_len: int = 5) -> List[Tuple[int, str, str]]:
     """
-    Veritabanından eğitim/indeks korpusunu çeker.
+    Veritabanından eğitim/indeks korpusunu çeker (iter_corpus'un liste hali).
 
     Parameters
     ----------
@@ -37,31 +82,7 @@ def fetch_corpus(kind: str = "suggestions", min_len: int = 5) -> List[Tuple[int,
         text: indekslenecek metin
         label: örn. kategori (isteğe bağlı etiket)
     """
-    rows: List[Tuple[int, str, str]] = []
-
-    if kind in ("suggestions", "both"):
-        for s in Suggestion.query.all():
-            txt = (s.text or "").strip()
-            if len(txt) >= min_len:
-                rows.append((int(s.id), txt, s.category or ""))
-
-    if kind in ("risks", "both"):
-        for r in Risk.query.all():
-            # Açıklama yoksa başlık kullan
-            txt = (r.description or r.title or "").strip()
-            if len(txt) >= min_len:
-                rows.append((ID_OFFSET + int(r.id), txt, r.category or ""))
-
-    # Tekrar edenleri at (aynı text + label)
-    seen: Set[Tuple[str, str]] = set()
-    deduped: List[Tuple[int, str, str]] = []
-    for rid, t, lab in rows:
-        key = (t, lab)
-        if key in seen:
-            continue
-        seen.add(key)
-        deduped.append((rid, t, lab))
-    return deduped
+    return list(iter_corpus(kind, min_len=min_len))
 
 
 def build_index(
@@ -69,64 +90,80 @@ def build_index(
     use_faiss: bool | None = None,
     include_paper_facts: bool = False,
     min_len: int = 5,
+    batch_size: Optional[int] = None,
+    threads: Optional[int] = None,
+    progress: Optional[ProgressFn] = None,
 ) -> int:
     """
     Metinleri gömme (embedding) vektörlerine çevirir, indeksi kurar ve diske kaydeder.
+    Korpus DB'den akış halinde okunur ve dilim dilim kodlanır (pipeline.EncodePipeline):
+    vektörler önce geçici bir dosyaya yazılır, tüm matris hiçbir zaman bellekte toplanmaz.
 
     Parameters
     ----------
     kind : {'suggestions', 'risks', 'both'}
         Korpus kaynağı.
     use_faiss : bool | None
-        FAISS destekliyse True yaparak hızlı ANN indeksi kurabilirsiniz.
-        None ise env: USE_FAISS=1 okunur.
+        Geriye uyumluluk için. FAISS indeksi yüklemede (Storage.load_index)
+        env: USE_FAISS=1 ile kurulur; kurulumda kullanılmaz.
     include_paper_facts : bool
         True ise, makale özet/kural kartları (DEFAULT_PAPER_FACTS) da indekse eklenir.
     min_len : int
         Bu uzunluğun altındaki metinler filtrelenir.
+    batch_size : int | None
+        SBERT ileri geçiş grubu (None: env AI_ENCODE_BATCH).
+    threads : int | None
+        Eşzamanlı kodlanan dilim sayısı (None: env AI_ENCODE_THREADS).
+    progress : callable | None
+        progress(aşama, yapılan, toplam) — aşama "read" | "encode".
 
     Returns
     -------
     int
         İndekse eklenen kayıt adedi.
     """
-    if use_faiss is None:
-        use_faiss = bool(int(os.getenv("USE_FAISS", "0")) == 1)
-
-    corpus = fetch_corpus(kind, min_len=min_len)
-
-    # İstenirse makale bilgilerini da ekle (paper_rule olarak)
-    if include_paper_facts and DEFAULT_PAPER_FACTS:
-        for f in DEFAULT_PAPER_FACTS:
-            fid = int(f.get("id", 0)) or 0
-            text = str(f.get("text", "")).strip()
-            if not text:
-                continue
-            label = str(f.get("label", "paper_rule"))
-            corpus.append((fid, text, label))
-
-    if not corpus:
-        raise RuntimeError("Korpus boş. Önce öneri veya risk ekleyin (ya da include_paper_facts=True deneyin).")
-
-    ids   = [rid for rid, _, _ in corpus]
-    texts = [t   for _, t, _ in corpus]
-    labs  = [c   for _, _, c in corpus]
-
-    # 1) Encode
-    encoder = LocalEncoder()
-    X = encoder.encode(texts)  # shape: (N, dim)
-    dim = X.shape[1]
-
-    # 2) Index
-    index = EmbIndex(dim=dim, use_faiss=use_faiss)
-    index.fit(X, ids, texts, labs)
-
-    # 3) Persist — yeni storage imzasıyla UYUMLU:
-    #    - meta haritasını (yeni şema) yaz
-    #    - vektörleri vecs=X ile yaz
-    meta_map: Dict[int, Dict[str, str]] = {
-        int(rid): {"text": t, "label": lab} for rid, t, lab in corpus
-    }
-    Storage().save_index(index, meta=meta_map, vecs=X)
-
-    return len(ids)
+    st = Storage()
+    spool = tempfile.mkdtemp(prefix=".build-", dir=st.root)  # aynı dosya sistemi: mmap + hızlı yazım
+    try:
+        # 1) Oku — DB'den akış halinde, metinler diske
+        corpus = SpooledCorpus(spool)
+        for rid, txt, lab in iter_corpus(kind, min_len=min_len):
+            corpus.append(rid, txt, lab)
+            if progress is not None and len(corpus) % BUILD_CHUNK == 0:
+                progress("read", len(corpus), None)
+
+        # İstenirse makale bilgilerini da ekle (paper_rule olarak)
+        if include_paper_facts and DEFAULT_PAPER_FACTS:
+            for f in DEFAULT_PAPER_FACTS:
+                fid = int(f.get("id", 0)) or 0
+                text = str(f.get("text", "")).strip()
+                if not text:
+                    continue
+                corpus.append(fid, text, str(f.get("label", "paper_rule")))
+        corpus.close()
+        if progress is not None:
+            progress("read", len(corpus), len(corpus))
+
+        if not len(corpus):
+            raise RuntimeError("Korpus boş. Önce öneri veya risk ekleyin (ya da include_paper_facts=True deneyin).")
+
+        # 2) Encode — TF-IDF modunda CSR olarak kalır; SBERT'te yalnızca
+        #    önbellekte olmayan (yeni/değişen) metinler kodlanır
+        # Paylaşılan encoder servisi (AI_ENCODER_SOCKET) varsa model bu süreçte yüklenmez
+        from .encoder_service import connect_encoder
+        encoder = connect_encoder(MODEL_NAME) or LocalEncoder()
+        pipe = EncodePipeline(encoder, batch_size=batch_size, threads=threads, progress=progress)
+        V = pipe.run(corpus)
+        LAST_BUILD_STATS.clear()
+        LAST_BUILD_STATS.update(pipe.stats, backend=encoder.backend)
+
+        # 3) Persist — yeni sürüm olarak yayınla (yoğun vektörler dilim dilim normlanır)
+        st.write_index(V, corpus.ids, corpus, encoder=encoder, corpus=kind)
+        n = len(corpus)
+        del V, corpus
+    finally:
+        shutil.rmtree(spool, ignore_errors=True)
+
+    # Bu süreçteki paylaşılan motor yeni indeksi diskten okusun
+    reset_engine()
+    return n
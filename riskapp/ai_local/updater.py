@@ -0,0 +1,266 @@
+# riskapp/ai_local/updater.py
+# -*- coding: utf-8 -*-
+"""
+Artımlı AI indeks güncellemesi.
+
+Suggestion / Risk ekleme-güncelleme-silme olayları commit sonrası süreç
+kuyruğuna düşer. Arka plan thread'i yalnızca değişen kayıtları encode eder:
+  - paylaşılan motorun (engine.get_engine) indeksine anında uygulanır
+  - diskte delta segmentine yazılır (Storage.apply_changes)
+  - belirli aralıkla / delta büyüdüğünde ana dosyalara katlanır (Storage.compact)
+Tam yeniden kurulum (train_ai.py -> trainer.build_index) yalnızca encoder
+değiştiğinde gerekir. Kimlikler fetch_corpus ile aynıdır (Risk: ID_OFFSET + id).
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from sqlalchemy.orm.attributes import get_history
+
+from ..models import db, Suggestion, Risk  # type: ignore
+from .engine import DATA_DIR, get_engine
+from .storage import Storage, index_token
+from .emb_cache import encode_with_cache
+from .trainer import ID_OFFSET
+
+MIN_LEN = 5  # fetch_corpus ile aynı alt sınır
+
+# (tür, id) -> "upsert" | "delete";  tür: "s" (Suggestion) / "r" (Risk)
+_pending: Dict[Tuple[str, int], str] = {}
+_pending_lock = threading.Lock()
+_wakeup = threading.Event()
+_updater: Optional["IndexUpdater"] = None
+_PENDING_KEY = "ai_index_pending"
+
+_WATCHED = {
+    "s": ("text", "category"),
+    "r": ("title", "description", "category"),
+}
+
+
+# -------------------------------
+#  ORM olayları -> kuyruk
+# -------------------------------
+def _queue(target, kind: str, op: str) -> None:
+    if _updater is None:
+        return  # güncelleyici çalışmıyor (script/seed): kuyruk büyümesin
+    sess = object_session(target)
+    if sess is not None and target.id is not None:
+        sess.info.setdefault(_PENDING_KEY, {})[(kind, int(target.id))] = op
+
+
+def _on_insert(kind):
+    def handler(mapper, connection, target):
+        _queue(target, kind, "upsert")
+    return handler
+
+
+def _on_update(kind):
+    def handler(mapper, connection, target):
+        if any(get_history(target, k).has_changes() for k in _WATCHED[kind]):
+            _queue(target, kind, "upsert")
+    return handler
+
+
+def _on_delete(kind):
+    def handler(mapper, connection, target):
+        _queue(target, kind, "delete")
+    return handler
+
+
+for _model, _kind in ((Suggestion, "s"), (Risk, "r")):
+    event.listen(_model, "after_insert", _on_insert(_kind))
+    event.listen(_model, "after_update", _on_update(_kind))
+    event.listen(_model, "after_delete", _on_delete(_kind))
+
+
+@event.listens_for(Session, "after_commit")
+def _index_after_commit(session):
+    changes = session.info.pop(_PENDING_KEY, None)
+    if changes:
+        with _pending_lock:
+            _pending.update(changes)
+        _wakeup.set()
+
+
+@event.listens_for(Session, "after_rollback")
+def _index_after_rollback(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+# -------------------------------
+#  Değişen kayıtların korpus satırları
+# -------------------------------
+def _collect(batch: Dict[Tuple[str, int], str], corpus: str):
+    """
+    -> (upserts: [(id, text, label)], deletes: [id])
+    Metni kısalan/boşalan ya da artık bulunmayan kayıtlar silinir.
+    """
+    want_s = corpus in ("suggestions", "both")
+    want_r = corpus in ("risks", "both")
+    s_ids = [i for (k, i), op in batch.items() if k == "s" and op == "upsert" and want_s]
+    r_ids = [i for (k, i), op in batch.items() if k == "r" and op == "upsert" and want_r]
+
+    upserts: List[Tuple[int, str, str]] = []
+    found = set()
+    if s_ids:
+        for sid, text, cat in (db.session.query(Suggestion.id, Suggestion.text, Suggestion.category)
+                               .filter(Suggestion.id.in_(s_ids))):
+            txt = (text or "").strip()
+            if len(txt) >= MIN_LEN:
+                upserts.append((int(sid), txt, cat or ""))
+                found.add(("s", int(sid)))
+    if r_ids:
+        for rid, title, desc, cat in (db.session.query(Risk.id, Risk.title, Risk.description, Risk.category)
+                                      .filter(Risk.id.in_(r_ids))):
+            # Açıklama yoksa başlık kullan
+            txt = (desc or title or "").strip()
+            if len(txt) >= MIN_LEN:
+                upserts.append((ID_OFFSET + int(rid), txt, cat or ""))
+                found.add(("r", int(rid)))
+
+    deletes = [
+        (ID_OFFSET + i if k == "r" else i)
+        for (k, i) in batch
+        if (k, i) not in found and ((k == "s" and want_s) or (k == "r" and want_r))
+    ]
+    return upserts, deletes
+
+
+def _index_corpus(st: Storage, idx) -> str:
+    """İndeksin hangi tablolardan kurulduğu (başlıkta yoksa id aralığından çıkarılır)."""
+    try:
+        corpus = st.read_header().get("corpus")
+    except Exception:
+        corpus = None
+    if corpus:
+        return corpus
+    has_risks = any(int(x) >= ID_OFFSET for x in idx.ids)
+    return "both" if has_risks else "suggestions"
+
+
+# -------------------------------
+#  Arka plan güncelleyici
+# -------------------------------
+class IndexUpdater:
+    """
+    interval         : kuyruğun en geç işlenme aralığı (sn)
+    compact_interval : delta varken ana dosyalara katlama aralığı (sn)
+    compact_max      : delta bu satır sayısını aşınca hemen katla
+    """
+    def __init__(self, app, data_dir: str = DATA_DIR, interval: float = 5.0,
+                 compact_interval: float = 6 * 3600, compact_max: int = 5000):
+        self.app = app
+        self.data_dir = data_dir
+        self.interval = float(interval)
+        self.compact_interval = float(compact_interval)
+        self.compact_max = int(compact_max)
+        self._last_compact = time.time()
+        self._delta_rows = 0
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()  # thread ile flush_index_updates() aynı anda çalışmasın
+        self.stats = {"batches": 0, "upserts": 0, "deletes": 0, "compactions": 0, "last_error": None}
+
+    def start(self) -> "IndexUpdater":
+        self._thread = threading.Thread(target=self._run, name="ai-index-updater", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        while True:
+            _wakeup.wait(self.interval)
+            _wakeup.clear()
+            try:
+                self.process_pending()
+                self.maybe_compact()
+            except Exception as exc:  # thread ölmesin
+                self.stats["last_error"] = str(exc)
+                self.app.logger.exception("AI indeks artımlı güncelleme hatası: %s", exc)
+
+    def process_pending(self) -> int:
+        """Kuyruktaki değişiklikleri işler; işlenen kayıt sayısını döner."""
+        with self._lock:
+            return self._process()
+
+    def _process(self) -> int:
+        with _pending_lock:
+            batch = dict(_pending)
+            _pending.clear()
+        if not batch:
+            return 0
+
+        st = Storage(self.data_dir)
+        eng = get_engine(self.data_dir)
+        if eng.idx is None or not st.has_v2():
+            return 0  # henüz indeks yok: ilk kurulum train_ai.py ile
+
+        with self.app.app_context():
+            upserts, deletes = _collect(batch, _index_corpus(st, eng.idx))
+            db.session.remove()
+        if not upserts and not deletes:
+            return 0
+
+        ids = [rid for rid, _, _ in upserts]
+        texts = [t for _, t, _ in upserts]
+        labels = [lab for _, _, lab in upserts]
+        X = encode_with_cache(eng.enc, texts, sparse=eng.idx.sparse, data_dir=self.data_dir)[0] if upserts else None
+
+        # 1) bu worker'ın motoru (anında)
+        eng.idx.apply_changes(X, ids, texts, labels, deleted=deletes)
+        if eng.lex is not None:
+            eng.lex.apply_changes(ids, texts, labels, deleted=deletes)
+        for rid in deletes:
+            eng.meta.pop(rid, None)
+        for rid, t, lab in upserts:
+            eng.meta[rid] = {"text": t, "label": lab}
+        eng.invalidate_cache()
+
+        # 2) disk (diğer worker'lar / yeniden başlatma için)
+        rows = [{"text": t, "label": lab} for t, lab in zip(texts, labels)]
+        self._delta_rows = st.apply_changes(X, ids, rows, deleted=deletes)
+        eng.version = index_token(self.data_dir)  # kendi yazdığımız delta yeniden yükleme tetiklemesin
+
+        self.stats["batches"] += 1
+        self.stats["upserts"] += len(upserts)
+        self.stats["deletes"] += len(deletes)
+        return len(upserts) + len(deletes)
+
+    def maybe_compact(self, force: bool = False) -> bool:
+        st = Storage(self.data_dir)
+        if st.read_delta() is None:
+            self._last_compact = time.time()
+            return False
+        due = (time.time() - self._last_compact) >= self.compact_interval
+        if not (force or due or self._delta_rows >= self.compact_max):
+            return False
+        st.compact()
+        self._last_compact = time.time()
+        self._delta_rows = 0
+        self.stats["compactions"] += 1
+        return True
+
+
+def start_index_updater(app, data_dir: str = DATA_DIR) -> IndexUpdater:
+    """create_app() çağırır: worker başına tek güncelleyici thread."""
+    global _updater
+    if _updater is None:
+        _updater = IndexUpdater(
+            app,
+            data_dir=data_dir,
+            interval=float(os.getenv("AI_UPDATE_INTERVAL", "5")),
+            compact_interval=float(os.getenv("AI_COMPACT_INTERVAL", str(6 * 3600))),
+            compact_max=int(os.getenv("AI_COMPACT_MAX_DELTA", "5000")),
+        ).start()
+    return _updater
+
+
+def flush_index_updates() -> int:
+    """Kuyruğu beklemeden işler (script/yönetim komutları için)."""
+    if _updater is None:
+        return 0
+    return _updater.process_pending()
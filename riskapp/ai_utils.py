@@ -3,21 +3,12 @@ from __future__ import annotations
 from typing import Any, Dict, List
 
 # Paketten doğrudan (absolute) import
-from riskapp.ai_local.engine import AILocal
+from riskapp.ai_local.engine import AILocal, get_engine
 
-# Tek bir yerel motor örneğini cache’le
-_engine_singleton: AILocal | None = None
 
 def _get_local() -> AILocal:
-    global _engine_singleton
-    if _engine_singleton is not None:
-        return _engine_singleton
-    try:
-        _engine_singleton = AILocal.load_or_create()  # engine.py içinde olmalı
-    except Exception:
-        # Güvenli fallback: boş indeksli basit motor
-        _engine_singleton = AILocal()
-    return _engine_singleton
+    """Worker geneli, kilitle korunan tek yerel motor (engine.get_engine)."""
+    return get_engine()
 
 
 def ai_complete(prompt: str, *, max_tokens: int = 256, **kwargs) -> str:
@@ -14,7 +14,6 @@ from decimal import Decimal, InvalidOperation
 from sqlalchemy import desc
 from functools import wraps
 from sqlalchemy import text, or_, func
-from collections import Counter
 import csv
 from io import StringIO
 import io, csv as _csv, os, re, json
@@ -24,7 +23,7 @@ from collections import defaultdict
 from flask import current_app
 from flask import request, redirect, url_for, flash, current_app
 from .models import db, Risk, Comment
-from .ai_local.commenter import make_ai_risk_comment
+from .ai_local.commenter import make_ai_risk_comment, KEYSETS as _AI_KEYSETS, KEY_MATCHER
 from io import BytesIO
 try:
     from .models import CostItem, CostTemplate
@@ -80,8 +79,9 @@ from urllib.parse import urlparse, quote
 from dotenv import load_dotenv
 load_dotenv()  # proje kökündeki .env dosyasını okur
 
-from riskapp.ai_local.ps_estimator import PSEstimator
-from riskapp.ai_local.engine import AILocal
+from riskapp.ai_local.ps_estimator import PSEstimator, get_shared_estimator, get_project_estimator
+from riskapp.ai_local.engine import AILocal, warmup_engine, engine_status
+from riskapp.ai_local.updater import start_index_updater
 from riskapp.models import db, Risk, Mitigation   
 
 from sqlalchemy.exc import IntegrityError
@@ -93,10 +93,13 @@ from riskapp.models import (
      db, Risk, Evaluation, Comment, Suggestion,
      Account, ProjectInfo, RiskCategory, RiskCategoryRef,
      CostItem, AutoAIResult,
-     ps_grade_code, ps_grade_label, ps_priority_label
+     ps_grade_code, ps_grade_label, ps_priority_label,
+     backfill_risk_last_eval, backfill_risk_ps_histogram
 )
 
 from riskapp.seeder import seed_if_empty
+from riskapp.scoring import project_scores
+from riskapp.consensus import consensus_for_risks, risk_consensus
 from riskapp.ai_utils import ai_complete, ai_json, best_match
 
 # === AI P/S & RAG için ek importlar ===
@@ -321,6 +324,28 @@ def ensure_schema():
         db.session.execute(text("ALTER TABLE risks ADD COLUMN ref_code TEXT"))
         changed = True
 
+    # ✅ risks.last_* (son değerlendirme özeti — denormalize)
+    # Kolonlar ilk kez eklendiğinde evaluations tablosundan doldurulur.
+    last_eval_cols = {
+        "last_eval_id": "INTEGER",
+        "last_p": "INTEGER",
+        "last_s": "INTEGER",
+        "last_score": "FLOAT",
+        "grade_code": "TEXT",
+    }
+    needs_last_eval_backfill = False
+    for col, typ in last_eval_cols.items():
+        if not has_col("risks", col):
+            db.session.execute(text(f"ALTER TABLE risks ADD COLUMN {col} {typ}"))
+            needs_last_eval_backfill = True
+            changed = True
+    db.session.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_risks_grade_code ON risks(grade_code)"
+    ))
+    if needs_last_eval_backfill:
+        db.session.commit()
+        backfill_risk_last_eval(db.session)
+
     # ✅ risk_categories.icon
     # Kategori Yönetimi ekranında seçilen Material Icon adını kalıcı tutar.
     # Eski SQLite veritabanlarında kolon yoksa otomatik eklenir.
@@ -575,10 +600,6 @@ def _normalize(s: str) -> str:
     })
     return s.translate(tr_map).lower()
 
-def _any_in(text: str, keywords) -> bool:
-    t = _normalize(text)
-    return any(k in t for k in keywords)
-
 def _unique(seq):
     seen = set()
     out = []
@@ -590,87 +611,6 @@ def _unique(seq):
     return out
 
 
-# Kategori anahtar kümeleri (normalize edilmiş aramayla eşleşir)
-KEYSETS = {
-    "insaat": [
-        "beton","kalip","donati","dokum","vibrator","santiye","saha",
-        "betonarme","formwork","rebar","pour","scaffold"
-    ],
-    "satinalma": [
-        "satinalma","tedarik","malzeme","lojistik","irsaliye","siparis",
-        "po","rfq","tedarikci","nakliye","sevkiyat","warehouse","supply"
-    ],
-    "sozlesme": [
-        "sozlesme","legal","hukuk","onay","izin","reg","regulasyon",
-        "idari sartname","teknik sartname","claim","variation","vo"
-    ],
-    "isg_cevre": [
-        "isg","is guvenligi","kaza","ramak kala","cevre","emisyon","atik",
-        "toz","gurultu","ppe","acil durum","ced","emission","waste","noise","spill"
-    ],
-    "geoteknik": [
-        "zemin","geoteknik","kazi","iksa","zayif zemin","oturma","sev","sev stabilitesi",
-        "cpt","spt","sonder","forekazik","ankraj"
-    ],
-    "kalite": [
-        "kalite","denetim","tetkik","audit","muayene","itp","tutanak","numune",
-        "slump","ndt","wps","pqr","kalibrasyon","inspection","hold point"
-    ],
-    "pmo": [
-        "politik","organizasyonel","paydas","stakeholder","iletisim plani",
-        "raporlama","kpi","koordinasyon","komite"
-    ],
-    "planlama": [
-        "planlama","program","zaman cizelgesi","kritik yol","cpm",
-        "ms project","primavera","p6","gant","delay","erteleme",
-        "hava","ruzgar","yagis","sicaklik","weather","wind","rain","temperature","storm"
-    ],
-    "mep_elektrik": [
-        "elektrik","og","ag","trafo","scada","pano","kablo","tray","aydinlatma",
-        "topraklama","kesici","jenerator","ups","megger","loop test","komisyoning","commissioning"
-    ],
-    "mep_mekanik": [
-        "mekanik","hvac","chiller","kazan","pompa","yangin","sprinkler","tesisat",
-        "borulama","pnid","basinc testi","hidrostatik","duct","valf","esanjör","esanjör"
-    ],
-    "marine": [
-        "deniz","marine","rihtim","iskele","kazik","celik kazik","dolfen","samandira",
-        "batimetri","akinti","dalga","romorkor","barge","vinc barge","mendirek","dalgakiran","kran"
-    ],
-    "tasarim": [
-        "tasarim","cizim","revizyon","ifc","shop drawing","shopdrawing","statik",
-        "mimari","clash","detay","kesit","rfi"
-    ],
-    "teknik_ofis": [
-        "teknik ofis","metraj","hakedis","atasman","boq","kesif","birim fiyat",
-        "poz","revize kesif","maliyet analizi","progress"
-    ],
-    "finans": [
-        "finans","butce","nakit akisi","cash flow","fatura","tahsilat","teminat",
-        "kesinti","avans","kur riski","maliyet","capex","opex"
-    ],
-    "makine_bakim": [
-        "ekipman","makine","bakim","ariza","yedek parca","operator","vinc",
-        "excavator","loader","forklift","servis","periyodik kontrol","rigging","lifting plan","winch"
-    ],
-    "bim_bt": [
-        "bim","model","revit","navisworks","ifc dosyasi","clash detection",
-        "veri tabani","sunucu","yedekleme","network","cad","gis"
-    ],
-    "izin_ruhsat": [
-        "ruhsat","belediye","imar","fenni mesul","tutanak","resmi yazi","dilekce",
-        "trafik kesme izni","enkaz izin","izin sureci"
-    ],
-    "laboratuvar": [
-        "laboratuvar","numune","slump","karot","cekme testi","basinc testi",
-        "agrega","granulometri","ndt","ultrasonik test"
-    ],
-    "depo": [
-        "depo","ambar","stok","stok sayim","emniyet stogu","raf",
-        "malzeme teslim","giris cikis","stok devir","ambar fisi"
-    ],
-}
-
 # Kategori -> aksiyon şablonları (metin, due_gun)
 ACTION_TEMPLATES = {
     "insaat": [
@@ -761,13 +701,13 @@ ACTION_TEMPLATES = {
     ],
 }
 
+# Anahtar kümeleri commenter ile ortak: eşleşme tek derlenmiş regex ile (KEY_MATCHER),
+# burada yalnızca şablonu olan anahtarlar kullanılır
+KEYSETS = {k: v for k, v in _AI_KEYSETS.items() if k in ACTION_TEMPLATES}
+
 def _match_keys(text: str):
-    """Metni KEYSETS'e gore tarar, eslesen anahtar listesi dondurur."""
-    hits = []
-    for key, kw in KEYSETS.items():
-        if _any_in(text, kw):
-            hits.append(key)
-    return hits
+    """Metni KEYSETS'e gore tek geciste tarar, eslesen anahtar listesi dondurur."""
+    return [k for k in KEY_MATCHER.match(text) if k in KEYSETS]
 
 def _dept_raci_defaults(cat_lower: str):
     """
@@ -864,106 +804,93 @@ def _propose_actions(risk: "Risk"):
 
     return _unique(actions)
 
-def _kpis_default(cat_lower: str):
-    cat_lower = _normalize(cat_lower)
-
-    common = [
+# Ortak KPI'lar + ilk eslesen anahtarin KPI'lari (sira onceliktir)
+KPI_COMMON = [
         "Uygunsuzluk (NCR) sayisi = 0 / ay",
         "Rework saatleri ≤ toplam isçilik saatinin %2’si",
-    ]
-
-    if "beton" in cat_lower or "kalip" in cat_lower or "donati" in cat_lower or _any_in(cat_lower, KEYSETS["insaat"]):
-        return common + [
-            "Beton basinç testi basarisizlik orani ≤ %1",
-            "Slump/sicaklik tolerans disi orani ≤ %2",
-        ]
-    if _any_in(cat_lower, KEYSETS["satinalma"]):
-        return common + [
-            "OTD (On-Time Delivery) ≥ %95",
-            "Emniyet stogu altina dusus olay sayisi = 0 / ay",
-        ]
-    if _any_in(cat_lower, KEYSETS["sozlesme"]):
-        return common + [
-            "Kritik izin/onay gecikmesi = 0",
-            "Sozlesme ihlal/NCR sayisi = 0",
-        ]
-    if _any_in(cat_lower, KEYSETS["isg_cevre"]):
-        return common + [
-            "Toz/gurultu limit asimlari = 0",
-            "Atik bertaraf uygunsuzlugu = 0",
-        ]
-    if _any_in(cat_lower, KEYSETS["geoteknik"]):
-        return common + [
-            "Sev stabilitesi ihlal (trigger asimi) = 0",
-            "Zemin parametre guncelleme gecikmesi = 0",
-        ]
-    if _any_in(cat_lower, KEYSETS["kalite"]):
-        return common + [
-            "NCR kapama ort. suresi ≤ 10 gun",
-            "ITP adim uyum orani ≥ %98",
-        ]
-    if _any_in(cat_lower, KEYSETS["planlama"]):
-        return common + [
-            "Kritik faaliyet gecikme orani ≤ %3",
-            "Gantt/P6 haftalik guncelleme tamamlama orani = %100",
-        ]
-    if _any_in(cat_lower, KEYSETS["mep_elektrik"]):
-        return common + [
-            "Izolasyon (megger) test basari orani ≥ %99",
-            "T&C (elektrik) punch sayisi ≤ 5 / alan",
-        ]
-    if _any_in(cat_lower, KEYSETS["mep_mekanik"]):
-        return common + [
-            "Hidrostatik/basinç test basari orani ≥ %99",
-            "HVAC balancing sapma ≤ %5",
-        ]
-    if _any_in(cat_lower, KEYSETS["marine"]):
-        return common + [
-            "Metocean pencere disi calisma olayi = 0",
-            "Barge/rigging plan uygunsuzlugu = 0",
-        ]
-    if _any_in(cat_lower, KEYSETS["tasarim"]):
-        return common + [
-            "RFI ort. kapanma suresi ≤ 7 gun",
-            "Shop drawing onay zamaninda tamamlama ≥ %95",
-        ]
-    if _any_in(cat_lower, KEYSETS["teknik_ofis"]):
-        return common + [
-            "Metraj–BOQ fark orani ≤ %1",
-            "Hak edis teslim gecikmesi = 0",
-        ]
-    if _any_in(cat_lower, KEYSETS["finans"]):
-        return common + [
-            "Nakit akis sapma (plan vs gercek) ≤ %5",
-            "Fatura gecikme orani ≤ %2",
-        ]
-    if _any_in(cat_lower, KEYSETS["makine_bakim"]):
-        return common + [
-            "MTBF artisi (aylik) ≥ %5",
-            "Planli bakim gerceklesme orani ≥ %95",
-        ]
-    if _any_in(cat_lower, KEYSETS["bim_bt"]):
-        return common + [
-            "Clash sayisi (kritik) ≤ X/hafta (hedef belirlenmeli)",
-            "Model versiyonlari yedekleme uyumu = %100",
-        ]
-    if _any_in(cat_lower, KEYSETS["izin_ruhsat"]):
-        return common + [
-            "Kritik izin gecikmesi = 0",
-            "Resmi yazisma SLA uyum orani ≥ %95",
-        ]
-    if _any_in(cat_lower, KEYSETS["laboratuvar"]):
-        return common + [
-            "Numune izlenebilirlik (traceability) hatasi = 0",
-            "Kalibrasyon gecikmesi = 0",
-        ]
-    if _any_in(cat_lower, KEYSETS["depo"]):
-        return common + [
-            "Stok sayim uyumsuzluk orani ≤ %1",
-            "Lot/seri izlenebilirlik hatasi = 0",
-        ]
+]
+
+KPI_TEMPLATES = [
+    ("insaat", [
+        "Beton basinç testi basarisizlik orani ≤ %1",
+        "Slump/sicaklik tolerans disi orani ≤ %2",
+    ]),
+    ("satinalma", [
+        "OTD (On-Time Delivery) ≥ %95",
+        "Emniyet stogu altina dusus olay sayisi = 0 / ay",
+    ]),
+    ("sozlesme", [
+        "Kritik izin/onay gecikmesi = 0",
+        "Sozlesme ihlal/NCR sayisi = 0",
+    ]),
+    ("isg_cevre", [
+        "Toz/gurultu limit asimlari = 0",
+        "Atik bertaraf uygunsuzlugu = 0",
+    ]),
+    ("geoteknik", [
+        "Sev stabilitesi ihlal (trigger asimi) = 0",
+        "Zemin parametre guncelleme gecikmesi = 0",
+    ]),
+    ("kalite", [
+        "NCR kapama ort. suresi ≤ 10 gun",
+        "ITP adim uyum orani ≥ %98",
+    ]),
+    ("planlama", [
+        "Kritik faaliyet gecikme orani ≤ %3",
+        "Gantt/P6 haftalik guncelleme tamamlama orani = %100",
+    ]),
+    ("mep_elektrik", [
+        "Izolasyon (megger) test basari orani ≥ %99",
+        "T&C (elektrik) punch sayisi ≤ 5 / alan",
+    ]),
+    ("mep_mekanik", [
+        "Hidrostatik/basinç test basari orani ≥ %99",
+        "HVAC balancing sapma ≤ %5",
+    ]),
+    ("marine", [
+        "Metocean pencere disi calisma olayi = 0",
+        "Barge/rigging plan uygunsuzlugu = 0",
+    ]),
+    ("tasarim", [
+        "RFI ort. kapanma suresi ≤ 7 gun",
+        "Shop drawing onay zamaninda tamamlama ≥ %95",
+    ]),
+    ("teknik_ofis", [
+        "Metraj–BOQ fark orani ≤ %1",
+        "Hak edis teslim gecikmesi = 0",
+    ]),
+    ("finans", [
+        "Nakit akis sapma (plan vs gercek) ≤ %5",
+        "Fatura gecikme orani ≤ %2",
+    ]),
+    ("makine_bakim", [
+        "MTBF artisi (aylik) ≥ %5",
+        "Planli bakim gerceklesme orani ≥ %95",
+    ]),
+    ("bim_bt", [
+        "Clash sayisi (kritik) ≤ X/hafta (hedef belirlenmeli)",
+        "Model versiyonlari yedekleme uyumu = %100",
+    ]),
+    ("izin_ruhsat", [
+        "Kritik izin gecikmesi = 0",
+        "Resmi yazisma SLA uyum orani ≥ %95",
+    ]),
+    ("laboratuvar", [
+        "Numune izlenebilirlik (traceability) hatasi = 0",
+        "Kalibrasyon gecikmesi = 0",
+    ]),
+    ("depo", [
+        "Stok sayim uyumsuzluk orani ≤ %1",
+        "Lot/seri izlenebilirlik hatasi = 0",
+    ]),
+]
 
-    return common
+def _kpis_default(cat_lower: str):
+    found = KEY_MATCHER.scan(cat_lower or "")
+    for key, kpis in KPI_TEMPLATES:
+        if key in found:
+            return KPI_COMMON + kpis
+    return list(KPI_COMMON)
 
 
     
@@ -1121,6 +1048,16 @@ def create_app():
         if uri.startswith("sqlite:"):
             ensure_schema()
 
+        # Konsensüs histogramı yeni oluşturulduysa mevcut değerlendirmelerden doldur
+        try:
+            hist_empty = db.session.execute(text("SELECT 1 FROM risk_ps_histogram LIMIT 1")).first() is None
+            has_evals = db.session.execute(text("SELECT 1 FROM evaluations LIMIT 1")).first() is not None
+            if hist_empty and has_evals:
+                backfill_risk_ps_histogram(db.session)
+        except Exception as e:
+            db.session.rollback()
+            app.logger.warning("Konsensüs histogramı doldurulamadı: %s", e)
+
         # Seed (istersen env ile kapat)
         if os.environ.get("SKIP_SEED") != "1":
             try:
@@ -1145,6 +1082,15 @@ def create_app():
     with app.app_context():
         bootstrap_db()
 
+    # Lokal AI motorunu worker açılışında ısıt (AI_WARMUP: 1=arka plan, sync=bekle, 0=kapalı)
+    _warm = (os.getenv("AI_WARMUP", "1") or "").strip().lower()
+    if _warm in ("1", "true", "yes", "sync"):
+        warmup_engine(background=(_warm != "sync"))
+
+    # Suggestion/Risk değişikliklerini indekse artımlı işle (AI_INCREMENTAL=0 ile kapatılır)
+    if (os.getenv("AI_INCREMENTAL", "1") or "").strip().lower() in ("1", "true", "yes"):
+        start_index_updater(app)
+
     def _sync_mitigations(risk: "Risk") -> None:
         """
         Formdan gelen mitigasyon/önlem satırlarını al,
@@ -1321,7 +1267,7 @@ def create_app():
     @app.before_request
     def require_login():
         # Giriş gerektirmeyen endpoint'ler (endpoint adları)
-        allowed = {"static", "login", "setup_step1", "forgot_password", "health"}
+        allowed = {"static", "login", "setup_step1", "forgot_password", "health", "health_ai"}
         ep = (request.endpoint or "")
 
         # (Opsiyonel) Herkese açık bırakmak istediğin API endpoint'leri (endpoint adları)
@@ -1488,17 +1434,17 @@ def create_app():
         # Eski: ortalama P/S kullanıyordu, o yüzden hücreler kayıyordu.
         # Yeni: HER RİSK İÇİN SON Evaluation (en büyük id) alınır,
         #       P ve S direkt o kayıttan okunur, key = "P-S".
-        matrix = defaultdict(int)
-
-        for r in risks:
-            evals = sorted(r.evaluations or [], key=lambda e: e.id)
-            if not evals:
-                continue
-
-            last = evals[-1]
-            p = last.probability or 0
-            s = last.severity or 0
+        # Son P/S, Risk.last_p / last_s kolonlarında tutulduğu için
+        # matris evaluations yüklemeden tek GROUP BY ile sayılır.
+        mq = (
+            db.session.query(Risk.last_p, Risk.last_s, func.count(Risk.id))
+            .filter(Risk.last_p.isnot(None), Risk.last_s.isnot(None))
+        )
+        if pid:
+            mq = mq.filter(Risk.project_id == pid)
 
+        matrix = defaultdict(int)
+        for p, s, cnt in mq.group_by(Risk.last_p, Risk.last_s).all():
             # P veya S yoksa matrise sokma
             if not p or not s:
                 continue
@@ -1508,7 +1454,7 @@ def create_app():
             s = max(1, min(5, int(s)))
 
             key = f"{p}-{s}"
-            matrix[key] += 1
+            matrix[key] += int(cnt)
 
         # Jinja'ya sade dict gitsin
         matrix = dict(matrix)
@@ -1542,7 +1488,8 @@ def create_app():
                     sc = float(sc) if sc is not None else None
                 except Exception:
                     sc = None
-            if sc is None:
+            # last_eval_id yoksa hiç değerlendirme yok; ortalama için sorgu atma
+            if sc is None and r.last_eval_id is not None:
                 try:
                     p2, s2 = r.avg_prob(), r.avg_sev()
                     if p2 and s2:
@@ -1796,17 +1743,16 @@ def create_app():
 
             # satırlar
             for idx, r in enumerate(items, 1):
-                # --- SON değerlendirme P/S ---
-                last_eval = None
-                if r.evaluations:
-                    last_eval = sorted(r.evaluations, key=lambda e: e.id)[-1]
-
-                if last_eval and last_eval.probability is not None and last_eval.severity is not None:
-                    p_val = float(last_eval.probability)
-                    s_val = float(last_eval.severity)
-                else:
+                # --- SON değerlendirme P/S (Risk.last_p / last_s) ---
+                if r.last_p is not None and r.last_s is not None:
+                    p_val = float(r.last_p)
+                    s_val = float(r.last_s)
+                elif r.last_eval_id is not None:
+                    # son değerlendirmede P/S eksik: tüm değerlendirmelerin ortalaması
                     p_val = r.avg_prob()
                     s_val = r.avg_sev()
+                else:
+                    p_val = s_val = None
 
                 # --- RPN: score() varsa onu kullan, yoksa P×S ---
                 sc = None
@@ -2625,25 +2571,9 @@ def create_app():
             )
 
         # Hücreye tıklama filtresi: SON değerlendirmedeki P/S
+        # (Risk.last_p / last_s denormalize kolonları; join gerekmez)
         if p and s:
-            latest_eval_sub = (
-                db.session.query(
-                    Evaluation.risk_id,
-                    func.max(Evaluation.id).label("max_id")
-                )
-                .group_by(Evaluation.risk_id)
-                .subquery()
-            )
-
-            query = (
-                query
-                .join(latest_eval_sub, latest_eval_sub.c.risk_id == Risk.id)
-                .join(Evaluation, Evaluation.id == latest_eval_sub.c.max_id)
-                .filter(
-                    Evaluation.probability == p,
-                    Evaluation.severity == s,
-                )
-            )
+            query = query.filter(Risk.last_p == p, Risk.last_s == s)
 
         risks = query.order_by(Risk.updated_at.desc()).all()
 
@@ -2672,11 +2602,93 @@ def create_app():
             # Decimal -> float (template'te rahat formatlamak için)
             cost_map = {rid: float(total) for (rid, total) in rows}
 
-        return render_template("risk_select.html", risks=risks, q=q, cost_map=cost_map)
+        # Konsensüs rozetleri (risk_ps_histogram, tek sorgu)
+        consensus_map = consensus_for_risks(risk_ids) if risk_ids else {}
+
+        return render_template(
+            "risk_select.html",
+            risks=risks,
+            q=q,
+            cost_map=cost_map,
+            consensus_map=consensus_map,
+        )
 
     # -------------------------------------------------
     #  Risk Sil (Admin)
     # -------------------------------------------------
+    # -------------------------------------------------
+    #  Konsensüs durumu (toplu) — liste rozetleri için
+    # -------------------------------------------------
+    @app.get("/api/risks/consensus")
+    def api_risks_consensus():
+        """
+        ?ids=1,2,3 -> { "1": {p, s, count, total, reached}, ... }
+        Tek sorguyla risk_ps_histogram'dan okunur; aktif projeye kilitlidir.
+        """
+        raw = (request.args.get("ids") or "").strip()
+        try:
+            ids = [int(x) for x in raw.split(",") if x.strip()]
+        except ValueError:
+            return jsonify({"error": "ids tam sayı listesi olmalı"}), 400
+
+        threshold = int(current_app.config.get("CONSENSUS_THRESHOLD", 30))
+        data = consensus_for_risks(ids, threshold, project_id=_get_active_project_id())
+        return jsonify({
+            "threshold": threshold,
+            "items": {str(rid): info for rid, info in data.items()},
+        })
+
+    # -------------------------------------------------
+    #  Toplu P/S önerisi — bulk değerlendirme / içe aktarma için
+    # -------------------------------------------------
+    @app.route("/api/ps/suggest", methods=["GET", "POST"])
+    def api_ps_suggest():
+        """
+        Birçok kategori ya da risk için tek geçişte P/S ipucu (PSEstimator.suggest_many).
+          ?categories=A,B     veya JSON {"categories": [...]}
+          ?risk_ids=1,2,3     veya JSON {"risk_ids": [...]}
+          ?scope=project      -> aktif projedeki tüm riskler
+        Model aktif projenin önbellekli PSEstimator'ıdır.
+        """
+        payload = request.get_json(silent=True) or {}
+        pid = _get_active_project_id()
+
+        def _list_arg(name):
+            val = payload.get(name)
+            if val is None:
+                raw = (request.args.get(name) or "").strip()
+                val = [x.strip() for x in raw.split(",") if x.strip()] if raw else None
+            return val
+
+        categories = _list_arg("categories")
+        risk_ids = _list_arg("risk_ids")
+        scope = (payload.get("scope") or request.args.get("scope") or "").strip().lower()
+
+        rows = None  # [(risk_id, category)]
+        if risk_ids is not None or scope == "project":
+            if not pid:
+                return jsonify({"error": "Aktif proje yok."}), 400
+            q = db.session.query(Risk.id, Risk.category).filter(Risk.project_id == pid)
+            if risk_ids is not None:
+                try:
+                    ids = sorted({int(x) for x in risk_ids})
+                except (TypeError, ValueError):
+                    return jsonify({"error": "risk_ids tam sayı listesi olmalı"}), 400
+                q = q.filter(Risk.id.in_(ids))
+            rows = q.order_by(Risk.id.asc()).all()
+            categories = [cat for _, cat in rows]
+        elif not isinstance(categories, list):
+            return jsonify({"error": "categories, risk_ids veya scope=project gerekli"}), 400
+
+        est = get_project_estimator(pid, db.session)
+        hints = est.suggest_many([str(c) if c else None for c in categories])
+
+        if rows is not None:
+            items = [{"risk_id": rid, "category": cat, **h} for (rid, cat), h in zip(rows, hints)]
+        else:
+            items = [{"category": cat, **h} for cat, h in zip(categories, hints)]
+        return jsonify({"project_id": pid, "count": len(items), "items": items})
+
     @app.route("/risks/<int:risk_id>/delete", methods=["POST"])
     @role_required("admin")
     def risk_delete(risk_id):
@@ -2807,17 +2819,9 @@ def create_app():
             sugg = []
 
         # ========= Konsensüs =========
+        # risk_ps_histogram: Evaluation ekleme/silmede güncellenir, tarama yok.
         threshold = int(current_app.config.get("CONSENSUS_THRESHOLD", 30))
-        pair_counts = {}
-        for e in (r.evaluations or []):
-            pair = (e.probability, e.severity)
-            pair_counts[pair] = pair_counts.get(pair, 0) + 1
-
-        consensus = None
-        if pair_counts:
-            (p_val, s_val), cnt = max(pair_counts.items(), key=lambda kv: kv[1])
-            if cnt >= threshold:
-                consensus = {"p": p_val, "s": s_val, "count": cnt}
+        consensus = risk_consensus(r.id, threshold)
 
         # ========= Geçmiş değerlendirmeler / ortalama =========
         # ADIM 4H.5 — risk_detail ve Auto-AI aynı "son değerlendirme"
@@ -2847,30 +2851,18 @@ def create_app():
                     use_avg = True
 
         # ========= Sistemin önerdiği P/S =========
+        # Proje kapsamlı PSEstimator (LRU önbellekli) — risk_auto_ai ile aynı model
         ps_reco = None
-        if cats_sel:
-            rows = (
-                db.session.query(Evaluation.probability, Evaluation.severity)
-                .join(Risk, Risk.id == Evaluation.risk_id)
-                .outerjoin(RiskCategoryRef, RiskCategoryRef.risk_id == Risk.id)
-                .filter(
-                    Risk.project_id == project_id,  # ✅ projeye kilitle
-                    or_(
-                        RiskCategoryRef.name.in_(cats_sel),
-                        Risk.category.in_(cats_sel)
-                    )
-                )
-                .all()
-            )
-            probs = [p for (p, s) in rows if p is not None]
-            sevs  = [s for (p, s) in rows if s is not None]
-            if probs or sevs:
-                p_mode = Counter(probs).most_common(1)
-                s_mode = Counter(sevs).most_common(1)
-                ps_reco = {
-                    "p": p_mode[0][0] if p_mode else None,
-                    "s": s_mode[0][0] if s_mode else None
-                }
+        bulk_ps_hints = {}
+        try:
+            ps_model = get_project_estimator(project_id, db.session)
+            if cats_sel:
+                ps_reco = ps_model.mode_for(cats_sel)
+            if bulk_risks:
+                hints = ps_model.suggest_many([br.category for br in bulk_risks])
+                bulk_ps_hints = {br.id: h for br, h in zip(bulk_risks, hints)}
+        except Exception as exc:
+            current_app.logger.warning("ps_reco hesaplanamadı (risk=%s): %s", r.id, exc)
 
         # ========= ✅ Bu riske bağlı maliyetler =========
         risk_costs = (
@@ -2954,6 +2946,7 @@ def create_app():
             consensus=consensus,
             threshold=threshold,
             ps_reco=ps_reco,
+            bulk_ps_hints=bulk_ps_hints,
             categories=cats,
             eval_history=eval_history,
             avg_p=avg_p,
@@ -3116,8 +3109,7 @@ def create_app():
         ps_hint = None
         ps_hint_text = "PSEstimator önerisi üretilemedi."
         try:
-            ps_model = PSEstimator(alpha=5.0)
-            ps_model.fit(db.session)
+            ps_model = get_project_estimator(project_id, db.session)
             ps_hint = ps_model.suggest(r.category or None)
             if isinstance(ps_hint, dict):
                 hp = ps_hint.get("p")
@@ -3837,6 +3829,12 @@ KARAR KURALLARI
     def health():
         return {"ok": True}, 200
 
+    @app.get("/health/ai")
+    def health_ai():
+        """Lokal AI motoru hazır mı + yükleme süresi (worker başına)."""
+        st = engine_status()
+        return {"ok": bool(st.get("ready")), **st}, (200 if st.get("ready") else 503)
+
 
 
     # -------------------------------------------------
@@ -3918,16 +3916,21 @@ KARAR KURALLARI
             "score_sum": 0.0,
         }
 
+        # Son Evaluation kayıtları (değerlendiren bilgisi için) tek sorguda
+        last_eval_ids = [r.last_eval_id for r in risks if r.last_eval_id is not None]
+        last_evals = {}
+        if last_eval_ids:
+            last_evals = {
+                e.id: e
+                for e in Evaluation.query.filter(Evaluation.id.in_(last_eval_ids)).all()
+            }
+
         for r in risks:
-            # Her risk için en son Evaluation kaydını kullan.
-            evals = sorted(
-                (r.evaluations or []),
-                key=lambda e: (getattr(e, "id", 0) or 0)
-            )
-            last_eval = evals[-1] if evals else None
+            # Her risk için en son Evaluation kaydını kullan (Risk.last_* kolonları).
+            last_eval = last_evals.get(r.last_eval_id)
 
-            probability = getattr(last_eval, "probability", None) if last_eval else None
-            severity = getattr(last_eval, "severity", None) if last_eval else None
+            probability = r.last_p
+            severity = r.last_s
 
             # Güvenli şekilde 1..5 aralığına al.
             try:
@@ -4308,6 +4311,9 @@ KARAR KURALLARI
             "none": "acceptable",
         }
 
+        # Proje geneli grade (ps_grade_code(avg_rpn)) — tek sorgu + NumPy
+        scores = project_scores(pid)
+
         # --- Satırlar ---
         rows = []
         for r in risks:
@@ -4321,7 +4327,7 @@ KARAR KURALLARI
                         break
                     yy, mm = _next_ym(yy, mm)
 
-            g = _gmap.get((r.grade() or "none").lower(), "acceptable")
+            g = _gmap.get((scores.grade_of(r.id) or "none").lower(), "acceptable")
             rows.append({
                 "risk": r,
                 "active": active,               # tabloda bar çizdirme
@@ -5949,8 +5955,7 @@ KARAR KURALLARI
         rpn_ai = None
         numeric_line = ""
         try:
-            ps = PSEstimator(alpha=5.0)
-            ps.fit(db.session)
+            ps = get_shared_estimator(db.session)
             hint = ps.suggest(r.category or None)
         except Exception as e:
             current_app.logger.exception("PSEstimator hata verdi: %s", e)
@@ -6484,6 +6489,7 @@ KARAR KURALLARI
             query = query.filter(Risk.status == status)
 
         rows = query.order_by(Risk.updated_at.desc()).all()
+        scores = project_scores(pid)
 
         def first_day(ym: str | None) -> str | None:
             return f"{ym}-01" if ym else None
@@ -6513,7 +6519,7 @@ KARAR KURALLARI
 
             # risk seviyesi → className
             _gmap = {"high": "critical", "medium": "moderate", "low": "low", "none": "acceptable"}
-            gname = _gmap.get((r.grade() or "none").lower(), "acceptable")
+            gname = _gmap.get((scores.grade_of(r.id) or "none").lower(), "acceptable")
 
             events.append({
                 "id": r.id,
@@ -6526,7 +6532,7 @@ KARAR KURALLARI
                     "category": r.category,
                     "status": r.status,
                     "responsible": r.responsible,
-                    "rpn": r.avg_rpn(),
+                    "rpn": scores.avg_rpn_of(r.id),
                     "start_month": r.start_month,
                     "end_month": r.end_month,
                 }
@@ -6921,17 +6927,16 @@ KARAR KURALLARI
             key = (r.category or "GENEL RİSKLER").strip()
             counters[key] += 1
 
-            # SON değerlendirme P/S
-            last_eval = None
-            if r.evaluations:
-                last_eval = sorted(r.evaluations, key=lambda e: e.id)[-1]
-
-            if last_eval and last_eval.probability is not None and last_eval.severity is not None:
-                p_val = float(last_eval.probability)
-                s_val = float(last_eval.severity)
-            else:
+            # SON değerlendirme P/S (Risk.last_p / last_s)
+            if r.last_p is not None and r.last_s is not None:
+                p_val = float(r.last_p)
+                s_val = float(r.last_s)
+            elif r.last_eval_id is not None:
+                # son değerlendirmede P/S eksik: tüm değerlendirmelerin ortalaması
                 p_val = r.avg_prob()
                 s_val = r.avg_sev()
+            else:
+                p_val = s_val = None
 
             # RPN: r.score()
             sc = None
@@ -7789,27 +7794,25 @@ KARAR KURALLARI
             except Exception:
                 pass
 
-            # 2) Son evaluation üzerinden P x S
+            # 2) Son evaluation üzerinden P x S (Risk.last_p / last_s)
             try:
-                evals = sorted(r.evaluations or [], key=lambda e: e.id)
-                if evals:
-                    last_eval = evals[-1]
-                    p = float(last_eval.probability or 0)
-                    s = float(last_eval.severity or 0)
-                    if p and s:
-                        return p * s
-            except Exception:
-                pass
-
-            # 3) Ortalama P x S fallback
-            try:
-                p = float(r.avg_prob() or 0)
-                s = float(r.avg_sev() or 0)
+                p = float(r.last_p or 0)
+                s = float(r.last_s or 0)
                 if p and s:
                     return p * s
             except Exception:
                 pass
 
+            # 3) Ortalama P x S fallback (hiç değerlendirme yoksa sorgu atma)
+            if r.last_eval_id is not None:
+                try:
+                    p = float(r.avg_prob() or 0)
+                    s = float(r.avg_sev() or 0)
+                    if p and s:
+                        return p * s
+                except Exception:
+                    pass
+
             return 0.0
 
         # -------------------------------------------------
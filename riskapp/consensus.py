@@ -0,0 +1,81 @@
+# riskapp/consensus.py
+# -*- coding: utf-8 -*-
+"""
+Konsensüs okumaları (risk_ps_histogram üzerinden).
+
+Histogram, Evaluation ekleme/silme olaylarıyla güncel tutulduğu için
+mod P/S ve oy sayısı r.evaluations taranmadan okunur. Bir risk için en fazla
+25 satır (5×5) vardır; toplu sorgu liste sayfalarında tek seferde yapılır.
+"""
+from __future__ import annotations
+
+from typing import Dict, Iterable, Optional, Any
+
+from flask import current_app
+
+from .models import db, Risk, RiskPSHistogram
+
+
+def _threshold(threshold: Optional[int]) -> int:
+    if threshold is not None:
+        return int(threshold)
+    try:
+        return int(current_app.config.get("CONSENSUS_THRESHOLD", 30))
+    except RuntimeError:
+        # uygulama bağlamı dışında (script/test) varsayılan eşik
+        return 30
+
+
+def consensus_for_risks(risk_ids: Iterable[int], threshold: Optional[int] = None,
+                        project_id: Optional[int] = None) -> Dict[int, Dict[str, Any]]:
+    """
+    Birden çok risk için konsensüs durumu — TEK sorgu.
+
+    Dönen yapı: { risk_id: {"p", "s", "count", "total", "reached"} }
+      - p, s    : en çok verilen (P, S) çifti (eşitlikte küçük P, sonra küçük S)
+      - count   : bu çiftin oy sayısı
+      - total   : riskin toplam değerlendirme sayısı
+      - reached : count >= eşik
+    Değerlendirmesi olmayan riskler sözlükte yer almaz.
+    project_id verilirse yalnızca o projenin riskleri döner.
+    """
+    ids = sorted({int(x) for x in risk_ids if x is not None})
+    if not ids:
+        return {}
+    thr = _threshold(threshold)
+
+    q = (
+        db.session.query(RiskPSHistogram.risk_id, RiskPSHistogram.p,
+                         RiskPSHistogram.s, RiskPSHistogram.count)
+        .filter(RiskPSHistogram.risk_id.in_(ids), RiskPSHistogram.count > 0)
+    )
+    if project_id:
+        q = q.join(Risk, Risk.id == RiskPSHistogram.risk_id).filter(Risk.project_id == project_id)
+    rows = (
+        q.order_by(RiskPSHistogram.risk_id, RiskPSHistogram.count.desc(),
+                   RiskPSHistogram.p, RiskPSHistogram.s)
+        .all()
+    )
+
+    out: Dict[int, Dict[str, Any]] = {}
+    for rid, p, s, cnt in rows:
+        cur = out.get(rid)
+        if cur is None:
+            # sıralama gereği riskin ilk satırı mod çifttir
+            out[rid] = {"p": p, "s": s, "count": int(cnt), "total": int(cnt), "reached": False}
+        else:
+            cur["total"] += int(cnt)
+    for cur in out.values():
+        cur["reached"] = cur["count"] >= thr
+    return out
+
+
+def risk_consensus(risk_id: int, threshold: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """
+    Tek risk için konsensüs: eşik aşıldıysa {"p", "s", "count"}, yoksa None.
+    risk_detail şablonunun beklediği biçimdedir.
+    """
+    info = consensus_for_risks([risk_id], threshold).get(int(risk_id))
+    if not info or not info["reached"]:
+        return None
+    return {"p": info["p"], "s": info["s"], "count": info["count"]}
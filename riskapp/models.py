@@ -3,7 +3,9 @@ from datetime import datetime
 from decimal import Decimal, InvalidOperation
 
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import event  # ✅ eklendi
+from sqlalchemy import event, func, text  # ✅ eklendi
+from sqlalchemy.orm import object_session
+from sqlalchemy.orm.attributes import get_history, set_committed_value
 
 db = SQLAlchemy()
 
@@ -88,6 +90,45 @@ def _to_decimal(v, default="0"):
         return Decimal(default)
 
 
+# -------------------------------------------------
+# Son değerlendirme özeti (Risk.last_* kolonları için)
+# -------------------------------------------------
+def _parse_rpn_avg(comment):
+    """Yorumdaki 'RPN ort: 12.50)' değerini float döner; yoksa None."""
+    if not comment or "RPN ort:" not in comment:
+        return None
+    try:
+        chunk = comment.split("RPN ort:")[1].strip()
+        return float(chunk.split(")")[0].strip())
+    except Exception:
+        return None
+
+
+def _last_eval_summary(eval_id, probability, severity, comment):
+    """
+    Son Evaluation satırından Risk.last_* kolonlarının değerlerini üretir.
+    Skor kuralı Risk.score() ile aynıdır: P×S, yorumda 'RPN ort:' varsa o değer.
+    """
+    if eval_id is None:
+        return {"last_eval_id": None, "last_p": None, "last_s": None,
+                "last_score": None, "grade_code": None}
+
+    score = None
+    if probability and severity:
+        score = float(probability * severity)
+        rpn_avg = _parse_rpn_avg(comment)
+        if rpn_avg is not None:
+            score = rpn_avg
+
+    return {
+        "last_eval_id": int(eval_id),
+        "last_p": probability,
+        "last_s": severity,
+        "last_score": score,
+        "grade_code": ps_grade_code(score),
+    }
+
+
 # --------------------------------
 # Kategori (RiskCategory)
 # --------------------------------
@@ -165,6 +206,15 @@ class Risk(db.Model):
     # Çoklu proje desteği
     project_id  = db.Column(db.Integer, index=True)         # ProjectInfo.id ile eşleştirilir (FK opsiyonel)
 
+    # --- Son değerlendirme özeti (denormalize) ---
+    # Evaluation after_insert / after_delete olaylarıyla güncel tutulur;
+    # liste sayfaları ve 5×5 matris evaluations yüklemeden skor okur.
+    last_eval_id = db.Column(db.Integer, nullable=True)
+    last_p       = db.Column(db.Integer, nullable=True)
+    last_s       = db.Column(db.Integer, nullable=True)
+    last_score   = db.Column(db.Float, nullable=True)      # score() ile aynı kural
+    grade_code   = db.Column(db.String(16), nullable=True, index=True)  # ps_grade_code(last_score)
+
     created_at  = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at  = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -248,34 +298,19 @@ class Risk(db.Model):
         - P×S hesapla
         - Eğer yorumda 'RPN ort:' varsa, oradaki değeri parse edip onu kullan
         Böylece liste sayfası ve detay sayfasındaki skor HER ZAMAN aynı olur.
-        """
-        if not self.evaluations:
-            return None
 
-        # risk_detail.html'deki gibi id'ye göre son kayıt
-        last = sorted(
-            self.evaluations,
-            key=lambda e: e.id
-        )[-1]
+        Değer denormalize last_score kolonundan okunur; evaluations yüklenmez.
+        """
+        if self.last_eval_id is not None:
+            return self.last_score
 
-        p = last.probability or 0
-        s = last.severity or 0
-        if not p or not s:
+        # Henüz flush edilmemiş (bellekteki) değerlendirmeler için eski yol.
+        # Koleksiyon yüklenmemişse sorgu atmayız: last_eval_id None => değerlendirme yok.
+        evals = self.__dict__.get("evaluations")
+        if not evals:
             return None
-
-        rpn = p * s
-
-        # Eğer AI yorumunda "RPN ort:" geçiyorsa, o değeri kullan
-        if last.comment and "RPN ort:" in last.comment:
-            try:
-                chunk = last.comment.split("RPN ort:")[1].strip()
-                num = chunk.split(")")[0].strip()
-                rpn = float(num)
-            except Exception:
-                # Parse edemezsek P×S ile devam ediyoruz
-                pass
-
-        return rpn
+        last = sorted(evals, key=lambda e: e.id or 0)[-1]
+        return _last_eval_summary(last.id, last.probability, last.severity, last.comment)["last_score"]
 
     # ---------- GERİYE UYUMLULUK: "RPN" adları P×S'yi temsil ediyor ----------
     def last_rpn(self):
@@ -290,7 +325,7 @@ class Risk(db.Model):
         Eski API ismiyle ortalama P×S.
         Tablolarda/raporlarda "RPN" gösterimi kullanan yerleri kırmamak için isim değişmedi.
         """
-        vals = [e.rpn() for e in self.evaluations if e.rpn() is not None]
+        vals = [v for v in (e.rpn() for e in self.evaluations) if v is not None]
         return round(sum(vals) / len(vals), 2) if vals else None
 
     def score_band(self):
@@ -298,7 +333,7 @@ class Risk(db.Model):
         UI için geriye uyumlu 3 bantlı görünüm.
         Eşik kaynağı merkezi P×S sınıflandırmasıdır.
         """
-        code = ps_grade_code(self.score())
+        code = self.grade_code if self.last_eval_id is not None else ps_grade_code(self.score())
         if code is None:
             return None
         if code in ("acceptable", "low"):
@@ -354,12 +389,17 @@ class Mitigation(db.Model):
 class Evaluation(db.Model):
     __tablename__ = "evaluations"
 
+    # risk_id / probability / severity: active_history=True -> süresi dolmuş (expired)
+    # nesnede atama yapılınca eski değer yüklenir; histogram güncellemesi eski
+    # (risk, P, S) çiftini get_history ile görebilsin.
     id        = db.Column(db.Integer, primary_key=True)
-    risk_id   = db.Column(db.Integer, db.ForeignKey("risks.id"), nullable=False, index=True)
+    risk_id   = db.column_property(
+        db.Column(db.Integer, db.ForeignKey("risks.id"), nullable=False, index=True),
+        active_history=True)
     evaluator = db.Column(db.String(120), nullable=True)
 
-    probability = db.Column(db.Integer, nullable=False)  # 1..5
-    severity    = db.Column(db.Integer, nullable=False)  # 1..5
+    probability = db.column_property(db.Column(db.Integer, nullable=False), active_history=True)  # 1..5
+    severity    = db.column_property(db.Column(db.Integer, nullable=False), active_history=True)  # 1..5
     detection   = db.Column(db.Integer, nullable=True)   # 1..5 (ARTIK KULLANILMIYOR)
     comment     = db.Column(db.Text, nullable=True)
     created_at  = db.Column(db.DateTime, default=datetime.utcnow)
@@ -377,6 +417,168 @@ class Evaluation(db.Model):
         return f"<Eval risk={self.risk_id} P={self.probability} S={self.severity}>"
 
 
+# --------------------------------
+# Risk başına (P, S) çifti histogramı (konsensüs için)
+# --------------------------------
+class RiskPSHistogram(db.Model):
+    """
+    Her risk için (probability, severity) çiftinin kaç kez verildiğini tutar.
+    Evaluation ekleme/silme olaylarıyla aynı transaction içinde güncellenir;
+    konsensüs (mod P/S ve oy sayısı) r.evaluations taranmadan okunur.
+    """
+    __tablename__ = "risk_ps_histogram"
+
+    risk_id = db.Column(db.Integer, db.ForeignKey("risks.id", ondelete="CASCADE"), primary_key=True)
+    p       = db.Column(db.Integer, primary_key=True)
+    s       = db.Column(db.Integer, primary_key=True)
+    count   = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self) -> str:
+        return f"<RiskPSHistogram risk={self.risk_id} P={self.p} S={self.s} n={self.count}>"
+
+
+def _bump_ps_histogram(connection, risk_id, p, s, delta):
+    """
+    risk_ps_histogram satırını atomik olarak delta kadar artırır/azaltır.
+    Artışta tek INSERT ... ON CONFLICT (SQLite >= 3.24 / PostgreSQL): iki eş
+    zamanlı ilk oy aynı satırı eklemeye çalışsa da birincil anahtar ihlali olmaz.
+    Sayaç 0'a inen satır silinir.
+    """
+    if risk_id is None or p is None or s is None:
+        return
+    params = {"rid": risk_id, "p": p, "s": s, "d": delta}
+    if delta > 0:
+        connection.execute(text(
+            "INSERT INTO risk_ps_histogram (risk_id, p, s, count) VALUES (:rid, :p, :s, :d) "
+            "ON CONFLICT (risk_id, p, s) DO UPDATE SET count = risk_ps_histogram.count + excluded.count"
+        ), params)
+    elif delta < 0:
+        connection.execute(text(
+            "UPDATE risk_ps_histogram SET count = count + :d "
+            "WHERE risk_id = :rid AND p = :p AND s = :s"
+        ), params)
+        connection.execute(text(
+            "DELETE FROM risk_ps_histogram "
+            "WHERE risk_id = :rid AND p = :p AND s = :s AND count <= 0"
+        ), params)
+
+
+# ✅ Risk.last_* kolonlarını Evaluation değişimlerinde güncel tut
+def _refresh_risk_last_eval(connection, risk_id, sess=None):
+    """
+    Riskin en büyük id'li Evaluation kaydını okuyup risks.last_* kolonlarını yazar.
+    Flush içinde çalıştığı için ORM yerine aynı connection kullanılır.
+    """
+    if risk_id is None:
+        return
+    row = connection.execute(text(
+        "SELECT id, probability, severity, comment FROM evaluations "
+        "WHERE risk_id = :rid ORDER BY id DESC LIMIT 1"
+    ), {"rid": risk_id}).first()
+    values = _last_eval_summary(*row) if row else _last_eval_summary(None, None, None, None)
+
+    connection.execute(text(
+        "UPDATE risks SET last_eval_id = :last_eval_id, last_p = :last_p, last_s = :last_s, "
+        "last_score = :last_score, grade_code = :grade_code WHERE id = :rid"
+    ), {**values, "rid": risk_id})
+
+    # Session'daki Risk nesnesi de bayat kalmasın (ek UPDATE üretmeden)
+    if sess is not None:
+        risk = sess.identity_map.get(sess.identity_key(Risk, risk_id))
+        if risk is not None:
+            for key, val in values.items():
+                set_committed_value(risk, key, val)
+
+
+@event.listens_for(Evaluation, "after_insert")
+def _evaluation_after_insert(mapper, connection, target):
+    _bump_ps_histogram(connection, target.risk_id, target.probability, target.severity, +1)
+    _refresh_risk_last_eval(connection, target.risk_id, object_session(target))
+
+
+@event.listens_for(Evaluation, "after_delete")
+def _evaluation_after_delete(mapper, connection, target):
+    _bump_ps_histogram(connection, target.risk_id, target.probability, target.severity, -1)
+    _refresh_risk_last_eval(connection, target.risk_id, object_session(target))
+
+
+def _old_value(target, key):
+    """Flush öncesi değer (değişmediyse mevcut değer)."""
+    hist = get_history(target, key)
+    if hist.deleted:
+        return hist.deleted[0]
+    return getattr(target, key)
+
+
+@event.listens_for(Evaluation, "after_update")
+def _evaluation_after_update(mapper, connection, target):
+    watched = ("risk_id", "probability", "severity", "comment")
+    if not any(get_history(target, k).has_changes() for k in watched):
+        return
+    sess = object_session(target)
+
+    old_rid = _old_value(target, "risk_id")
+    old_p, old_s = _old_value(target, "probability"), _old_value(target, "severity")
+    if (old_rid, old_p, old_s) != (target.risk_id, target.probability, target.severity):
+        _bump_ps_histogram(connection, old_rid, old_p, old_s, -1)
+        _bump_ps_histogram(connection, target.risk_id, target.probability, target.severity, +1)
+
+    # Değerlendirme başka riske taşındıysa eski riski de tazele
+    if old_rid != target.risk_id:
+        _refresh_risk_last_eval(connection, old_rid, sess)
+    _refresh_risk_last_eval(connection, target.risk_id, sess)
+
+
+def backfill_risk_last_eval(session=None) -> int:
+    """
+    Tüm risklerin last_* kolonlarını evaluations tablosundan yeniden hesaplar.
+    Tek seferlik geçiş (veya tutarlılık onarımı) içindir; güncellenen risk sayısını döner.
+    """
+    sess = session or db.session
+    latest = (
+        sess.query(Evaluation.risk_id, func.max(Evaluation.id).label("max_id"))
+        .group_by(Evaluation.risk_id)
+        .subquery()
+    )
+    rows = (
+        sess.query(Evaluation.risk_id, Evaluation.id, Evaluation.probability,
+                   Evaluation.severity, Evaluation.comment)
+        .join(latest, latest.c.max_id == Evaluation.id)
+        .all()
+    )
+    by_risk = {rid: _last_eval_summary(eid, p, s, c) for rid, eid, p, s, c in rows}
+    empty = _last_eval_summary(None, None, None, None)
+
+    params = [
+        {**by_risk.get(rid, empty), "rid": rid}
+        for (rid,) in sess.query(Risk.id).all()
+    ]
+    if params:
+        sess.execute(text(
+            "UPDATE risks SET last_eval_id = :last_eval_id, last_p = :last_p, last_s = :last_s, "
+            "last_score = :last_score, grade_code = :grade_code WHERE id = :rid"
+        ), params)
+    sess.commit()
+    return len(params)
+
+
+def backfill_risk_ps_histogram(session=None) -> int:
+    """
+    risk_ps_histogram tablosunu evaluations'tan sıfırdan kurar (tek GROUP BY).
+    Oluşan histogram satırı sayısını döner.
+    """
+    sess = session or db.session
+    sess.execute(text("DELETE FROM risk_ps_histogram"))
+    res = sess.execute(text(
+        "INSERT INTO risk_ps_histogram (risk_id, p, s, count) "
+        "SELECT risk_id, probability, severity, COUNT(*) FROM evaluations "
+        "WHERE probability IS NOT NULL AND severity IS NOT NULL "
+        "GROUP BY risk_id, probability, severity"
+    ))
+    sess.commit()
+    return int(res.rowcount or 0)
+
+
 # --------------------------------
 # Yorum (Comment)
 # --------------------------------
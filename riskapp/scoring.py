@@ -0,0 +1,220 @@
+# riskapp/scoring.py
+# -*- coding: utf-8 -*-
+"""
+Proje geneli P×S metrikleri (NumPy ile vektörel).
+
+Risk.score() / avg_rpn() / grade() / score_band() nesne nesne çalışır ve her
+çağrıda r.evaluations yüklenir. Binlerce risk ve on binlerce değerlendirme olan
+projelerde dashboard / zaman çizelgesi bu döngülerde vakit kaybeder.
+
+Burada bir projenin tüm değerlendirmeleri TEK kolon-sorgusuyla
+(risk_id, eval_id, probability, severity, comment) çekilir ve metrikler
+dizi işlemleriyle hesaplanır. Kurallar models.py ile birebir aynıdır:
+  - last_score : son (en büyük id) değerlendirmenin P×S'i; yorumda
+                 'RPN ort:' varsa o değer (Risk.score())
+  - avg_rpn    : tüm değerlendirmelerin P×S ortalaması, 2 hane (Risk.avg_rpn())
+  - grade      : ps_grade_code(avg_rpn)                     (Risk.grade())
+  - band       : last_score'un 3 bantlı görünümü            (Risk.score_band())
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Dict, Optional, Any
+
+import numpy as np
+
+from .models import (
+    db, Risk, Evaluation,
+    PS_CRITICAL_MIN, PS_MODERATE_MIN, PS_LOW_MIN,
+    _parse_rpn_avg,
+)
+
+
+# -------------------------------------------------
+# Vektörel sınıflandırma yardımcıları
+# -------------------------------------------------
+def ps_grade_codes(scores: np.ndarray) -> np.ndarray:
+    """
+    ps_grade_code()'un dizi karşılığı.
+    NaN -> None, diğerleri: critical / moderate / low / acceptable
+    """
+    x = np.asarray(scores, dtype=np.float64)
+    out = np.select(
+        [x >= PS_CRITICAL_MIN, x >= PS_MODERATE_MIN, x >= PS_LOW_MIN],
+        ["critical", "moderate", "low"],
+        default="acceptable",
+    ).astype(object)
+    out[np.isnan(x)] = None
+    return out
+
+
+def score_bands(scores: np.ndarray) -> np.ndarray:
+    """
+    Risk.score_band()'un dizi karşılığı: low / mid / high (NaN -> None).
+    """
+    x = np.asarray(scores, dtype=np.float64)
+    out = np.select(
+        [x >= PS_CRITICAL_MIN, x >= PS_MODERATE_MIN],
+        ["high", "mid"],
+        default="low",
+    ).astype(object)
+    out[np.isnan(x)] = None
+    return out
+
+
+def _nan_to_none(v: float) -> Optional[float]:
+    return None if np.isnan(v) else float(v)
+
+
+# -------------------------------------------------
+# Sonuç yapısı
+# -------------------------------------------------
+@dataclass
+class ProjectScores:
+    """
+    Değerlendirmesi olan riskler için hizalı diziler (risk_ids artan sırada).
+    Değerlendirmesi olmayan riskler dizilerde yer almaz; get() None döner.
+    """
+    risk_ids: np.ndarray      # (R,) int64
+    n_evals: np.ndarray       # (R,) int64
+    last_eval_id: np.ndarray  # (R,) int64
+    last_p: np.ndarray        # (R,) float64 (NaN = yok)
+    last_s: np.ndarray        # (R,) float64
+    last_score: np.ndarray    # (R,) float64
+    avg_rpn: np.ndarray       # (R,) float64
+    grade: np.ndarray         # (R,) object  ps_grade_code(avg_rpn)
+    band: np.ndarray          # (R,) object  score_band(last_score)
+    matrix: Dict[str, int]    # {"P-S": adet}  — son değerlendirmeye göre 5×5
+
+    @classmethod
+    def empty(cls) -> "ProjectScores":
+        e_i = np.empty(0, dtype=np.int64)
+        e_f = np.empty(0, dtype=np.float64)
+        e_o = np.empty(0, dtype=object)
+        return cls(e_i, e_i, e_i, e_f, e_f, e_f, e_f, e_o, e_o, {})
+
+    def __len__(self) -> int:
+        return int(self.risk_ids.shape[0])
+
+    def _pos(self, risk_id: int) -> Optional[int]:
+        i = int(np.searchsorted(self.risk_ids, risk_id))
+        if i < len(self) and int(self.risk_ids[i]) == int(risk_id):
+            return i
+        return None
+
+    def get(self, risk_id: int) -> Optional[Dict[str, Any]]:
+        """Tek risk için metrik sözlüğü; değerlendirme yoksa None."""
+        i = self._pos(risk_id)
+        if i is None:
+            return None
+        return {
+            "n_evals": int(self.n_evals[i]),
+            "last_eval_id": int(self.last_eval_id[i]),
+            "last_p": _nan_to_none(self.last_p[i]),
+            "last_s": _nan_to_none(self.last_s[i]),
+            "last_score": _nan_to_none(self.last_score[i]),
+            "avg_rpn": _nan_to_none(self.avg_rpn[i]),
+            "grade": self.grade[i],
+            "band": self.band[i],
+        }
+
+    def grade_of(self, risk_id: int) -> Optional[str]:
+        i = self._pos(risk_id)
+        return None if i is None else self.grade[i]
+
+    def avg_rpn_of(self, risk_id: int) -> Optional[float]:
+        i = self._pos(risk_id)
+        return None if i is None else _nan_to_none(self.avg_rpn[i])
+
+
+# -------------------------------------------------
+# Veri çekme + hesap
+# -------------------------------------------------
+def fetch_eval_rows(project_id: Optional[int] = None, session=None):
+    """
+    Projenin tüm değerlendirmelerini TEK kolon sorgusuyla döndürür:
+      [(risk_id, eval_id, probability, severity, comment), ...]
+    project_id None ise tüm riskler.
+    """
+    sess = session or db.session
+    q = sess.query(
+        Evaluation.risk_id,
+        Evaluation.id,
+        Evaluation.probability,
+        Evaluation.severity,
+        Evaluation.comment,
+    )
+    if project_id:
+        q = q.join(Risk, Risk.id == Evaluation.risk_id).filter(Risk.project_id == project_id)
+    return q.all()
+
+
+def compute_scores(rows) -> ProjectScores:
+    """
+    (risk_id, eval_id, probability, severity, comment) satırlarından
+    ProjectScores üretir. Tüm ara hesaplar NumPy dizileri üzerindedir.
+    """
+    if not rows:
+        return ProjectScores.empty()
+
+    rid = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+    eid = np.fromiter((r[1] for r in rows), dtype=np.int64, count=len(rows))
+    p = np.array([r[2] if r[2] is not None else np.nan for r in rows], dtype=np.float64)
+    s = np.array([r[3] if r[3] is not None else np.nan for r in rows], dtype=np.float64)
+
+    # Risk, sonra eval id'ye göre sırala -> her grubun son elemanı "son değerlendirme"
+    order = np.lexsort((eid, rid))
+    rid, eid, p, s = rid[order], eid[order], p[order], s[order]
+
+    risk_ids, starts, counts = np.unique(rid, return_index=True, return_counts=True)
+    last_idx = starts + counts - 1
+
+    # --- Ortalama P×S (Risk.avg_rpn): None olanlar hariç, 2 hane ---
+    rpn = p * s
+    valid = ~np.isnan(rpn)
+    sums = np.add.reduceat(np.where(valid, rpn, 0.0), starts)
+    n_valid = np.add.reduceat(valid.astype(np.int64), starts)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        avg_rpn = np.where(n_valid > 0, np.round(sums / np.maximum(n_valid, 1), 2), np.nan)
+
+    # --- Son değerlendirme skoru (Risk.score) ---
+    last_p = p[last_idx]
+    last_s = s[last_idx]
+    has_ps = ~np.isnan(last_p) & ~np.isnan(last_s) & (last_p != 0) & (last_s != 0)
+    last_score = np.where(has_ps, last_p * last_s, np.nan)
+
+    # 'RPN ort:' override — yalnızca son satırların yorumları ve sadece P×S'si olanlar
+    comments = [rows[int(order[i])][4] for i in last_idx]
+    for j in np.flatnonzero(has_ps):
+        c = comments[j]
+        if c and "RPN ort:" in c:
+            v = _parse_rpn_avg(c)
+            if v is not None:
+                last_score[j] = v
+
+    # --- 5×5 matris (son P/S, 1..5'e sıkıştırılmış) ---
+    matrix: Dict[str, int] = {}
+    if has_ps.any():
+        pp = np.clip(last_p[has_ps].astype(np.int64), 1, 5)
+        ss = np.clip(last_s[has_ps].astype(np.int64), 1, 5)
+        cells = np.bincount((pp - 1) * 5 + (ss - 1), minlength=25)
+        for k in np.flatnonzero(cells):
+            matrix[f"{k // 5 + 1}-{k % 5 + 1}"] = int(cells[k])
+
+    return ProjectScores(
+        risk_ids=risk_ids,
+        n_evals=counts.astype(np.int64),
+        last_eval_id=eid[last_idx],
+        last_p=last_p,
+        last_s=last_s,
+        last_score=last_score,
+        avg_rpn=avg_rpn,
+        grade=ps_grade_codes(avg_rpn),
+        band=score_bands(last_score),
+        matrix=matrix,
+    )
+
+
+def project_scores(project_id: Optional[int] = None, session=None) -> ProjectScores:
+    """fetch_eval_rows + compute_scores kısayolu."""
+    return compute_scores(fetch_eval_rows(project_id, session=session))
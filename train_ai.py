@@ -1,8 +1,30 @@
 # train_ai.py
+import sys
+
 from riskapp.app import create_app
-from riskapp.ai_local.trainer import build_index
+from riskapp.ai_local.trainer import build_index, LAST_BUILD_STATS
+
+
+def _progress(stage, done, total):
+    if stage == "read":
+        print(f"\rOkunan: {done}", end="" if total is None else "\n", file=sys.stderr, flush=True)
+    else:
+        print(f"\rKodlanan: {done}/{total} ({100 * done // max(total, 1)}%)",
+              end="\n" if done >= total else "", file=sys.stderr, flush=True)
+
+
+if "--migrate" in sys.argv[1:]:
+    # Eski emb.npy/embeddings.npy + meta.json -> sürümlü v2 düzeni (yeniden kodlama yok)
+    from riskapp.ai_local.storage import Storage
+    n = Storage().migrate_legacy()
+    print(f"AI index v2'ye taşındı: {n} kayıt.")
+    sys.exit(0)
 
 app = create_app()
 with app.app_context():
-    n = build_index(kind="both", use_faiss=False)
+    n = build_index(kind="both", use_faiss=False, progress=_progress)
     print(f"AI index hazır: {n} kayıt.")
+    st = LAST_BUILD_STATS
+    print(f"Kodlama: {st.get('hits', 0)} önbellekten, {st.get('misses', 0)} yeni "
+          f"({st.get('encode_seconds', 0):.2f} sn, {st.get('backend')}, "
+          f"{st.get('chunks', 0)} dilim × {st.get('threads', 1)} thread)")